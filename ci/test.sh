@@ -12,3 +12,4 @@ uv sync --extra=test
 uv run ty check python/wpt_interop/
 uv run ruff check
 uv run ruff format --check
+uv run pytest
@@ -0,0 +1,358 @@
+//! Compact in-memory representation of test results.
+//!
+//! Test and subtest names are interned, statuses are stored as single
+//! bytes, and the subtests for all the tests in a run are stored in a
+//! single contiguous array. This uses much less memory than a map of
+//! `Results` when loading whole runs.
+
+use crate::{Results, SubtestStatus, TestScore, TestScores, TestStatus};
+use std::collections::HashMap;
+use std::sync::Arc;
+
+/// Encoded value for a missing expected status
+const NO_STATUS: u8 = u8::MAX;
+
+// These must be in the same order as the enum variants
+const TEST_STATUSES: [TestStatus; 9] = [
+    TestStatus::Pass,
+    TestStatus::Fail,
+    TestStatus::Ok,
+    TestStatus::Error,
+    TestStatus::Timeout,
+    TestStatus::Crash,
+    TestStatus::Assert,
+    TestStatus::PreconditionFailed,
+    TestStatus::Skip,
+];
+
+const SUBTEST_STATUSES: [SubtestStatus; 8] = [
+    SubtestStatus::Pass,
+    SubtestStatus::Fail,
+    SubtestStatus::Error,
+    SubtestStatus::Timeout,
+    SubtestStatus::Assert,
+    SubtestStatus::PreconditionFailed,
+    SubtestStatus::Notrun,
+    SubtestStatus::Skip,
+];
+
+fn encode_test_status(status: Option<TestStatus>) -> u8 {
+    status.map(|status| status as u8).unwrap_or(NO_STATUS)
+}
+
+fn decode_test_status(value: u8) -> Option<TestStatus> {
+    TEST_STATUSES.get(value as usize).copied()
+}
+
+fn encode_subtest_status(status: Option<SubtestStatus>) -> u8 {
+    status.map(|status| status as u8).unwrap_or(NO_STATUS)
+}
+
+fn decode_subtest_status(value: u8) -> Option<SubtestStatus> {
+    SUBTEST_STATUSES.get(value as usize).copied()
+}
+
+/// Interner mapping strings to integer ids.
+///
+/// An interner can be shared between several runs, so that names that
+/// are common to all the runs are only stored once.
+#[derive(Debug, Default)]
+pub struct Interner {
+    ids: HashMap<Arc<str>, u32>,
+    strings: Vec<Arc<str>>,
+}
+
+impl Interner {
+    pub fn new() -> Interner {
+        Default::default()
+    }
+
+    pub fn intern(&mut self, value: &str) -> u32 {
+        if let Some(id) = self.ids.get(value) {
+            return *id;
+        }
+        let id = self.strings.len() as u32;
+        let value: Arc<str> = Arc::from(value);
+        self.strings.push(value.clone());
+        self.ids.insert(value, id);
+        id
+    }
+
+    /// Get the id of a string, if it has been interned.
+    pub fn get(&self, value: &str) -> Option<u32> {
+        self.ids.get(value).copied()
+    }
+
+    /// Get the string corresponding to an id.
+    pub fn resolve(&self, id: u32) -> &str {
+        &self.strings[id as usize]
+    }
+
+    pub fn len(&self) -> usize {
+        self.strings.len()
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.strings.is_empty()
+    }
+}
+
+#[derive(Debug, Clone, Copy)]
+struct TestEntry {
+    name: u32,
+    status: u8,
+    expected: u8,
+    subtests_start: u32,
+    subtests_len: u32,
+}
+
+#[derive(Debug, Clone, Copy)]
+struct SubtestEntry {
+    name: u32,
+    status: u8,
+    expected: u8,
+}
+
+/// Results for a single run
+///
+/// Tests are ordered by the id of their name in the `Interner` used to
+/// load the run.
+#[derive(Debug, Default)]
+pub struct CompactResults {
+    tests: Vec<TestEntry>,
+    subtests: Vec<SubtestEntry>,
+}
+
+impl CompactResults {
+    /// Create compact results from (test id, results) pairs.
+    pub fn new<'a>(
+        interner: &mut Interner,
+        results: impl Iterator<Item = (&'a str, &'a Results)>,
+    ) -> CompactResults {
+        let mut compact = CompactResults::default();
+        for (test_id, test_results) in results {
+            compact.push(interner, test_id, test_results);
+        }
+        compact.sort();
+        compact
+    }
+
+    /// Add the results for a test. `sort` must be called once all the
+    /// results have been added.
+    pub(crate) fn push(&mut self, interner: &mut Interner, test_id: &str, results: &Results) {
+        let subtests_start = self.subtests.len() as u32;
+        self.subtests
+            .extend(results.subtests.iter().map(|subtest| SubtestEntry {
+                name: interner.intern(&subtest.name),
+                status: subtest.status as u8,
+                expected: encode_subtest_status(subtest.expected),
+            }));
+        self.tests.push(TestEntry {
+            name: interner.intern(test_id),
+            status: results.status as u8,
+            expected: encode_test_status(results.expected),
+            subtests_start,
+            subtests_len: results.subtests.len() as u32,
+        });
+    }
+
+    pub(crate) fn sort(&mut self) {
+        self.tests.sort_by_key(|test| test.name);
+        self.tests.shrink_to_fit();
+        self.subtests.shrink_to_fit();
+    }
+
+    pub fn len(&self) -> usize {
+        self.tests.len()
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.tests.is_empty()
+    }
+
+    fn test_ref(&self, entry: &TestEntry) -> TestResultsRef<'_> {
+        let start = entry.subtests_start as usize;
+        TestResultsRef {
+            name: entry.name,
+            status: decode_test_status(entry.status).expect("Invalid test status"),
+            expected: decode_test_status(entry.expected),
+            subtests: &self.subtests[start..start + entry.subtests_len as usize],
+        }
+    }
+
+    /// Get the results for the test with the given name id.
+    pub fn get_id(&self, name: u32) -> Option<TestResultsRef<'_>> {
+        self.tests
+            .binary_search_by_key(&name, |test| test.name)
+            .ok()
+            .map(|idx| self.test_ref(&self.tests[idx]))
+    }
+
+    /// Get the results for a test.
+    pub fn get(&self, interner: &Interner, test_id: &str) -> Option<TestResultsRef<'_>> {
+        interner.get(test_id).and_then(|name| self.get_id(name))
+    }
+
+    pub fn iter(&self) -> impl Iterator<Item = TestResultsRef<'_>> {
+        self.tests.iter().map(|entry| self.test_ref(entry))
+    }
+
+    /// Compute the per-test scores for the run.
+    pub fn test_scores(&self, interner: &Interner) -> TestScores {
+        self.iter()
+            .map(|test| (interner.resolve(test.name).to_string(), test.score()))
+            .collect()
+    }
+}
+
+/// Reference to the results of a single test in `CompactResults`
+#[derive(Debug, Clone, Copy)]
+pub struct TestResultsRef<'a> {
+    /// Interned id of the test name
+    pub name: u32,
+    pub status: TestStatus,
+    pub expected: Option<TestStatus>,
+    subtests: &'a [SubtestEntry],
+}
+
+/// Results of a single subtest in `CompactResults`
+#[derive(Debug, Clone, Copy)]
+pub struct SubtestResultRef {
+    /// Interned id of the subtest name
+    pub name: u32,
+    pub status: SubtestStatus,
+    pub expected: Option<SubtestStatus>,
+}
+
+impl<'a> TestResultsRef<'a> {
+    pub fn subtests(&self) -> impl ExactSizeIterator<Item = SubtestResultRef> + 'a {
+        self.subtests.iter().map(|subtest| SubtestResultRef {
+            name: subtest.name,
+            status: decode_subtest_status(subtest.status).expect("Invalid subtest status"),
+            expected: decode_subtest_status(subtest.expected),
+        })
+    }
+
+    pub fn score(&self) -> TestScore {
+        TestScore::from_statuses(
+            self.status,
+            self.expected,
+            self.subtests()
+                .map(|subtest| (subtest.status, subtest.expected)),
+        )
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::test_util::synthetic_results;
+    use crate::SubtestResult;
+
+    fn assert_round_trip(
+        interner: &Interner,
+        test_id: &str,
+        compact: &CompactResults,
+        results: &Results,
+    ) {
+        let test = compact.get(interner, test_id).expect("Missing test");
+        assert_eq!(interner.resolve(test.name), test_id);
+        assert_eq!(test.status, results.status);
+        assert_eq!(test.expected, results.expected);
+        let subtests = test.subtests().collect::<Vec<_>>();
+        assert_eq!(subtests.len(), results.subtests.len());
+        for (subtest, expected) in subtests.iter().zip(results.subtests.iter()) {
+            assert_eq!(interner.resolve(subtest.name), expected.name);
+            assert_eq!(subtest.status, expected.status);
+            assert_eq!(subtest.expected, expected.expected);
+        }
+        assert_eq!(test.score(), TestScore::from_results(results));
+    }
+
+    #[test]
+    fn status_encoding() {
+        for status in TEST_STATUSES {
+            assert_eq!(
+                decode_test_status(encode_test_status(Some(status))),
+                Some(status)
+            );
+        }
+        assert_eq!(decode_test_status(encode_test_status(None)), None);
+        for status in SUBTEST_STATUSES {
+            assert_eq!(
+                decode_subtest_status(encode_subtest_status(Some(status))),
+                Some(status)
+            );
+        }
+        assert_eq!(decode_subtest_status(encode_subtest_status(None)), None);
+    }
+
+    #[test]
+    fn round_trip() {
+        let mut runs = vec![
+            (
+                "/a/expected.html".to_string(),
+                Results {
+                    status: TestStatus::Ok,
+                    subtests: SUBTEST_STATUSES
+                        .iter()
+                        .enumerate()
+                        .map(|(idx, status)| SubtestResult {
+                            name: format!("subtest {}", idx),
+                            status: *status,
+                            expected: SUBTEST_STATUSES.get(idx + 1).copied(),
+                        })
+                        .collect(),
+                    expected: Some(TestStatus::Error),
+                },
+            ),
+            (
+                "/a/no-subtests.html".to_string(),
+                Results {
+                    status: TestStatus::PreconditionFailed,
+                    subtests: vec![],
+                    expected: None,
+                },
+            ),
+        ];
+        runs.extend((0..100).map(|idx| {
+            (
+                format!("/b/{}/test.html?q={}", idx % 3, idx),
+                synthetic_results(idx),
+            )
+        }));
+
+        let mut interner = Interner::new();
+        // Add the tests in reverse order to check they're sorted by id
+        let compact = CompactResults::new(
+            &mut interner,
+            runs.iter()
+                .rev()
+                .map(|(test_id, results)| (test_id.as_str(), results)),
+        );
+        assert_eq!(compact.len(), runs.len());
+        for (test_id, results) in runs.iter() {
+            assert_round_trip(&interner, test_id, &compact, results);
+        }
+        assert!(compact.get(&interner, "/missing.html").is_none());
+
+        let expected_scores = runs
+            .iter()
+            .map(|(test_id, results)| (test_id.clone(), TestScore::from_results(results)))
+            .collect::<TestScores>();
+        assert_eq!(compact.test_scores(&interner), expected_scores);
+    }
+
+    #[test]
+    fn shared_interner() {
+        let results = synthetic_results(3);
+        let mut interner = Interner::new();
+        let first = CompactResults::new(&mut interner, [("/test.html", &results)].into_iter());
+        let num_names = interner.len();
+        let second = CompactResults::new(&mut interner, [("/test.html", &results)].into_iter());
+        // Names that are common to both runs are only stored once
+        assert_eq!(interner.len(), num_names);
+        assert_round_trip(&interner, "/test.html", &first, &results);
+        assert_round_trip(&interner, "/test.html", &second, &results);
+    }
+}
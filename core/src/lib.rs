@@ -1,10 +1,19 @@
+pub mod compact;
 pub mod metadata;
 pub mod results_cache;
+pub mod score_store;
+#[cfg(test)]
+mod test_util;
+pub mod wptreport;
 
-use serde_derive::Deserialize;
-use std::collections::{BTreeMap, BTreeSet};
+use serde_derive::{Deserialize, Serialize};
+use std::collections::{BTreeMap, BTreeSet, HashMap};
 use std::default::Default;
 use std::fmt::Display;
+use std::fs;
+use std::path::Path;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::thread;
 use thiserror::Error;
 
 pub type Result<T> = std::result::Result<T, Error>;
@@ -17,6 +26,8 @@ pub enum Error {
     #[error(transparent)]
     Git(#[from] git2::Error),
     #[error(transparent)]
+    Io(#[from] std::io::Error),
+    #[error(transparent)]
     SerdeJson(#[from] serde_json::Error),
     #[error(transparent)]
     SerdeYaml(#[from] serde_yaml::Error),
@@ -24,24 +35,113 @@ pub enum Error {
     String(String),
 }
 
-#[derive(Debug, Deserialize)]
+/// Apply `f` to each of `items`, using up to `threads` worker threads.
+///
+/// Each worker calls `init` once, and passes the resulting state to
+/// every call of `f` on that worker; this is used to give each thread
+/// its own repository handle. Items are handed out one at a time, and
+/// the results are in the same order as `items`.
+pub(crate) fn map_parallel_with<T, S, U>(
+    items: &[T],
+    threads: usize,
+    init: impl Fn() -> Result<S> + Sync,
+    f: impl Fn(&mut S, &T) -> Result<U> + Sync,
+) -> Result<Vec<U>>
+where
+    T: Sync,
+    U: Send,
+{
+    let num_workers = threads.min(items.len());
+    if num_workers <= 1 {
+        let mut state = init()?;
+        return items.iter().map(|item| f(&mut state, item)).collect();
+    }
+
+    let next_item = &AtomicUsize::new(0);
+    let init = &init;
+    let f = &f;
+    let completed = thread::scope(|scope| {
+        let workers = (0..num_workers)
+            .map(move |_| {
+                scope.spawn(move || -> Result<Vec<(usize, U)>> {
+                    let mut state = init()?;
+                    let mut completed = Vec::new();
+                    loop {
+                        let idx = next_item.fetch_add(1, Ordering::Relaxed);
+                        if idx >= items.len() {
+                            break;
+                        }
+                        completed.push((idx, f(&mut state, &items[idx])?));
+                    }
+                    Ok(completed)
+                })
+            })
+            .collect::<Vec<_>>();
+        workers
+            .into_iter()
+            .map(|worker| worker.join().expect("Worker thread panicked"))
+            .collect::<Result<Vec<_>>>()
+    })?;
+
+    let mut rv: Vec<Option<U>> = items.iter().map(|_| None).collect();
+    for (idx, value) in completed.into_iter().flatten() {
+        rv[idx] = Some(value);
+    }
+    Ok(rv
+        .into_iter()
+        .map(|value| value.expect("Missing value for item"))
+        .collect())
+}
+
+/// Apply `f` to each of `items`, using up to `threads` worker threads.
+///
+/// The results are in the same order as `items`.
+pub(crate) fn map_parallel<T, U>(
+    items: &[T],
+    threads: usize,
+    f: impl Fn(&T) -> Result<U> + Sync,
+) -> Result<Vec<U>>
+where
+    T: Sync,
+    U: Send,
+{
+    map_parallel_with(items, threads, || Ok(()), |_, item| f(item))
+}
+
+static TEMP_COUNTER: AtomicUsize = AtomicUsize::new(0);
+
+/// Write `data` to `path` by writing a temporary file in the same
+/// directory and renaming it, so that concurrent readers never see a
+/// partially written file.
+pub(crate) fn write_atomic(path: &Path, data: &[u8]) -> Result<()> {
+    let temp_path = path.with_extension(format!(
+        "{}-{}.tmp",
+        std::process::id(),
+        TEMP_COUNTER.fetch_add(1, Ordering::Relaxed)
+    ));
+    fs::write(&temp_path, data)?;
+    fs::rename(&temp_path, path)?;
+    Ok(())
+}
+
+#[derive(Debug, Deserialize, Serialize, Clone)]
 pub struct Results {
     pub status: TestStatus,
     #[serde(default)]
     pub subtests: Vec<SubtestResult>,
-    #[serde(default)]
+    #[serde(default, skip_serializing_if = "Option::is_none")]
     pub expected: Option<TestStatus>,
 }
 
-#[derive(Debug, Deserialize)]
+#[derive(Debug, Deserialize, Serialize, Clone)]
 pub struct SubtestResult {
     pub name: String,
     pub status: SubtestStatus,
-    #[serde(default)]
+    #[serde(default, skip_serializing_if = "Option::is_none")]
     pub expected: Option<SubtestStatus>,
 }
 
-#[derive(Deserialize, PartialEq, Eq, Clone, Debug, Copy, Hash)]
+#[derive(Deserialize, Serialize, PartialEq, Eq, PartialOrd, Ord, Clone, Debug, Copy, Hash)]
 #[serde(rename_all = "SCREAMING_SNAKE_CASE")]
 pub enum TestStatus {
     Pass,
@@ -94,7 +194,7 @@ impl Display for TestStatus {
     }
 }
 
-#[derive(Deserialize, PartialEq, Eq, Clone, Debug, Copy, Hash)]
+#[derive(Deserialize, Serialize, PartialEq, Eq, Clone, Debug, Copy, Hash)]
 #[serde(rename_all = "SCREAMING_SNAKE_CASE")]
 pub enum SubtestStatus {
     Pass,
@@ -144,128 +244,357 @@ impl Display for SubtestStatus {
     }
 }
 
-#[derive(Debug, Default)]
-struct TestScore {
-    passes: u64,
-    total: u64,
+/// Score for a single test in a single run
+#[derive(Debug, Default, Clone, Copy, PartialEq, Eq)]
+pub struct TestScore {
+    pub passes: u64,
+    pub total: u64,
+    pub expected_failures: u64,
+    /// Whether the overall test status was OK
+    pub is_ok: bool,
 }
 
 impl TestScore {
-    fn new(passes: u64, total: u64) -> TestScore {
-        TestScore { passes, total }
+    pub fn new(passes: u64, total: u64, expected_failures: u64, is_ok: bool) -> TestScore {
+        TestScore {
+            passes,
+            total,
+            expected_failures,
+            is_ok,
+        }
+    }
+
+    /// Compute the score for the results of a single test
+    pub fn from_results(test_results: &Results) -> TestScore {
+        TestScore::from_statuses(
+            test_results.status,
+            test_results.expected,
+            test_results
+                .subtests
+                .iter()
+                .map(|subtest| (subtest.status, subtest.expected)),
+        )
+    }
+
+    /// Compute the score for a single test from its status, expected
+    /// status, and the (status, expected status) of each subtest
+    pub fn from_statuses(
+        status: TestStatus,
+        expected: Option<TestStatus>,
+        subtests: impl ExactSizeIterator<Item = (SubtestStatus, Option<SubtestStatus>)>,
+    ) -> TestScore {
+        let test_expected_failure = expected.is_some()
+            && expected != Some(TestStatus::Ok)
+            && expected != Some(TestStatus::Pass);
+        let (test_passes, expected_failures, test_total) = if subtests.len() > 0 {
+            let test_total = subtests.len() as u64;
+            let (test_passes, expected_failures) = subtests
+                .map(|(subtest_status, subtest_expected)| {
+                    if subtest_status == SubtestStatus::Pass {
+                        (1, 0)
+                    } else {
+                        (
+                            0,
+                            if test_expected_failure
+                                || (subtest_expected.is_some()
+                                    && subtest_expected != Some(SubtestStatus::Pass))
+                            {
+                                1
+                            } else {
+                                0
+                            },
+                        )
+                    }
+                })
+                .fold((0, 0), |acc, elem| (acc.0 + elem.0, acc.1 + elem.1));
+            (test_passes, expected_failures, test_total)
+        } else if status == TestStatus::Pass {
+            (1, 0, 1)
+        } else {
+            (0, if test_expected_failure { 1 } else { 0 }, 1)
+        };
+        TestScore::new(
+            test_passes,
+            test_total,
+            expected_failures,
+            status == TestStatus::Ok,
+        )
     }
 }
 
-#[derive(Debug, Default)]
-struct RunScore {
-    category_scores: Vec<f64>,
-    category_expected_failures: Vec<f64>,
-    unexpected_not_ok: BTreeSet<String>,
+/// Mapping from test id to score for a single run
+pub type TestScores = BTreeMap<String, TestScore>;
+
+/// Per-test scores for a set of runs, stored as dense arrays
+///
+/// `passes` and `totals` are the rows of the matrix used for scoring:
+/// row-major runs × tests matrices, with a total of 0 where a run has
+/// no result for a test. `category_mask` is a row-major categories ×
+/// tests matrix, which is 1 where the test is in the category and 0
+/// otherwise. `tests` is sorted.
+#[derive(Debug, Default, Clone)]
+pub struct TestScoreMatrix {
+    pub categories: Vec<String>,
+    pub tests: Vec<String>,
+    pub num_runs: usize,
+    pub passes: Vec<u64>,
+    pub totals: Vec<u64>,
+    pub category_mask: Vec<u8>,
 }
 
-impl RunScore {
-    fn new(size: usize) -> RunScore {
-        RunScore {
-            category_scores: vec![0.; size],
-            category_expected_failures: vec![0.; size],
-            ..Default::default()
+impl TestScoreMatrix {
+    /// Build the matrix for the tests in `tests_by_category`, with one
+    /// row for each element of `runs`.
+    pub fn new<'a>(
+        runs: impl ExactSizeIterator<Item = &'a TestScores>,
+        tests_by_category: &BTreeMap<String, BTreeSet<String>>,
+    ) -> TestScoreMatrix {
+        let index = TestIndex::new(tests_by_category);
+        let mut matrix = ScoreMatrix::new(index.len(), runs.len());
+        for run in runs {
+            let offset = matrix.push_run();
+            for (test_id, test_score) in run.iter() {
+                if let Some(test_idx) = index.ids.get(test_id.as_str()) {
+                    matrix.set(offset + test_idx, test_score);
+                }
+            }
+        }
+
+        let mut category_mask = vec![0; index.tests_by_category.len() * index.len()];
+        for (cat_idx, category_tests) in index.tests_by_category.iter().enumerate() {
+            for test_idx in category_tests {
+                category_mask[cat_idx * index.len() + test_idx] = 1;
+            }
+        }
+
+        TestScoreMatrix {
+            categories: tests_by_category.keys().cloned().collect(),
+            tests: index
+                .tests
+                .iter()
+                .map(|test_id| test_id.to_string())
+                .collect(),
+            num_runs: matrix.num_runs,
+            passes: matrix.passes,
+            totals: matrix.totals,
+            category_mask,
         }
     }
 }
 
-fn score_run<'a>(
-    run: impl Iterator<Item = (&'a str, &'a Results)>,
-    num_categories: usize,
-    categories_by_test: &BTreeMap<&'a str, Vec<usize>>,
-    expected_not_ok: &BTreeSet<String>,
-    test_scores_by_category: &mut [BTreeMap<&'a str, Vec<TestScore>>],
-) -> RunScore {
-    let mut run_score = RunScore::new(num_categories);
-    for (test_id, test_results) in run {
-        if let Some(categories) = categories_by_test.get(test_id) {
-            if test_results.status != TestStatus::Ok && !expected_not_ok.contains(test_id) {
-                run_score.unexpected_not_ok.insert(test_id.into());
-            }
+const FNV_OFFSET_BASIS: u64 = 0xcbf29ce484222325;
+const FNV_PRIME: u64 = 0x100000001b3;
+
+/// Add `items` to a 64-bit FNV-1a hash.
+fn fnv1a_update<'a>(mut hash: u64, items: impl Iterator<Item = &'a str>) -> u64 {
+    for item in items {
+        // Terminate each item with a NUL so that the boundaries between items are included
+        for byte in item.bytes().chain(std::iter::once(0)) {
+            hash ^= byte as u64;
+            hash = hash.wrapping_mul(FNV_PRIME);
+        }
+    }
+    hash
+}
+
+/// Compute a fingerprint for a set of test ids.
+///
+/// This uses 64-bit FNV-1a rather than the std hasher so that the value
+/// is stable between processes and can be stored on disk.
+pub fn tests_fingerprint(tests: &BTreeSet<String>) -> u64 {
+    fnv1a_update(FNV_OFFSET_BASIS, tests.iter().map(|test| test.as_str()))
+}
+
+/// Compute fingerprints for a mapping from category to test ids.
+///
+/// Returns the fingerprint of the tests in each category, and an
+/// overall fingerprint that also depends on the category names.
+pub fn tests_by_category_fingerprints(
+    tests_by_category: &BTreeMap<String, BTreeSet<String>>,
+) -> (BTreeMap<String, u64>, u64) {
+    let by_category = tests_by_category
+        .iter()
+        .map(|(category, tests)| (category.clone(), tests_fingerprint(tests)))
+        .collect::<BTreeMap<_, _>>();
+    let mut hash = FNV_OFFSET_BASIS;
+    for (category, fingerprint) in by_category.iter() {
+        hash = fnv1a_update(
+            hash,
+            [category.as_str(), &format!("{:016x}", fingerprint)].into_iter(),
+        );
+    }
+    (by_category, hash)
+}
+
+/// Compute the per-test scores for a single run
+pub fn score_tests<'a>(run: impl Iterator<Item = (&'a String, &'a Results)>) -> TestScores {
+    run.map(|(test_id, results)| (test_id.clone(), TestScore::from_results(results)))
+        .collect()
+}
 
-            let (test_passes, expected_failures, test_total) = if !test_results.subtests.is_empty()
-            {
-                let (test_passes, expected_failures) = test_results
-                    .subtests
+/// The tests being scored, resolved to dense indexes in sorted order
+struct TestIndex<'a> {
+    ids: HashMap<&'a str, usize>,
+    /// Test id for each index
+    tests: Vec<&'a str>,
+    /// Indexes of the tests in each category
+    tests_by_category: Vec<Vec<usize>>,
+}
+
+impl<'a> TestIndex<'a> {
+    fn new(tests_by_category: &'a BTreeMap<String, BTreeSet<String>>) -> TestIndex<'a> {
+        let tests = tests_by_category
+            .values()
+            .flatten()
+            .map(|test_id| test_id.as_str())
+            .collect::<BTreeSet<_>>()
+            .into_iter()
+            .collect::<Vec<_>>();
+        let ids = tests
+            .iter()
+            .enumerate()
+            .map(|(test_idx, test_id)| (*test_id, test_idx))
+            .collect::<HashMap<_, _>>();
+        let test_idxs_by_category = tests_by_category
+            .values()
+            .map(|category_tests| {
+                category_tests
                     .iter()
-                    .map(|subtest| {
-                        if (subtest.status) == SubtestStatus::Pass {
-                            (1, 0)
-                        } else {
-                            (
-                                0,
-                                if (test_results.expected.is_some()
-                                    && test_results.expected != Some(TestStatus::Ok)
-                                    && test_results.expected != Some(TestStatus::Pass))
-                                    || (subtest.expected.is_some()
-                                        && subtest.expected != Some(SubtestStatus::Pass))
-                                {
-                                    1
-                                } else {
-                                    0
-                                },
-                            )
-                        }
-                    })
-                    .fold((0, 0), |acc, elem| (acc.0 + elem.0, acc.1 + elem.1));
+                    .map(|test_id| ids[test_id.as_str()])
+                    .collect()
+            })
+            .collect();
+        TestIndex {
+            ids,
+            tests,
+            tests_by_category: test_idxs_by_category,
+        }
+    }
+
+    fn len(&self) -> usize {
+        self.tests.len()
+    }
+}
+
+/// Per-test scores for a set of runs
+///
+/// This is stored as a dense matrix with one row per run and one
+/// column per test index. A total of 0 means that the run has no
+/// result for the test.
+struct ScoreMatrix {
+    num_tests: usize,
+    num_runs: usize,
+    passes: Vec<u64>,
+    totals: Vec<u64>,
+    expected_failures: Vec<u64>,
+}
+
+impl ScoreMatrix {
+    fn new(num_tests: usize, runs_hint: usize) -> ScoreMatrix {
+        ScoreMatrix {
+            num_tests,
+            num_runs: 0,
+            passes: Vec::with_capacity(num_tests * runs_hint),
+            totals: Vec::with_capacity(num_tests * runs_hint),
+            expected_failures: Vec::with_capacity(num_tests * runs_hint),
+        }
+    }
+
+    /// Add a row for a new run with no results, returning its offset.
+    fn push_run(&mut self) -> usize {
+        let offset = self.num_runs * self.num_tests;
+        self.num_runs += 1;
+        let len = self.num_runs * self.num_tests;
+        self.passes.resize(len, 0);
+        self.totals.resize(len, 0);
+        self.expected_failures.resize(len, 0);
+        offset
+    }
+
+    /// Set the score at index `idx` in the matrix.
+    fn set(&mut self, idx: usize, test_score: &TestScore) {
+        self.passes[idx] = test_score.passes;
+        self.totals[idx] = test_score.total;
+        self.expected_failures[idx] = test_score.expected_failures;
+    }
+
+    /// Sum of the pass fraction and expected failure fraction over
+    /// `tests` for the run whose row starts at `offset`.
+    fn run_sums(&self, offset: usize, tests: &[usize]) -> (f64, f64) {
+        let mut score = 0.;
+        let mut expected_failures = 0.;
+        for test_idx in tests {
+            let idx = offset + test_idx;
+            let total = self.totals[idx];
+            if total > 0 {
+                score += self.passes[idx] as f64 / total as f64;
+                expected_failures += self.expected_failures[idx] as f64 / total as f64;
+            }
+        }
+        (score, expected_failures)
+    }
+
+    /// For each test, whether any run has a result for it, and the
+    /// minimum score over all the runs if every run has a result.
+    fn test_minimums(&self) -> Vec<(bool, Option<u64>)> {
+        (0..self.num_tests)
+            .map(|test_idx| {
+                let mut seen = 0;
+                let mut min_score = u64::MAX;
+                for run_idx in 0..self.num_runs {
+                    let idx = run_idx * self.num_tests + test_idx;
+                    let total = self.totals[idx];
+                    if total > 0 {
+                        seen += 1;
+                        min_score = min_score
+                            .min((1000. * self.passes[idx] as f64 / total as f64).trunc() as u64);
+                    }
+                }
                 (
-                    test_passes,
-                    expected_failures,
-                    test_results.subtests.len() as u32,
+                    seen > 0,
+                    if seen > 0 && seen == self.num_runs {
+                        Some(min_score)
+                    } else {
+                        None
+                    },
                 )
-            } else {
-                let (is_pass, expected_failure) = if test_results.status == TestStatus::Pass {
-                    (1, 0)
-                } else {
-                    (
-                        0,
-                        if test_results.expected.is_some()
-                            && test_results.expected != Some(TestStatus::Ok)
-                            && test_results.expected != Some(TestStatus::Pass)
-                        {
-                            1
-                        } else {
-                            0
-                        },
-                    )
-                };
-                (is_pass, expected_failure, 1)
-            };
-            for category_idx in categories {
-                let test_scores = &mut test_scores_by_category[*category_idx];
-                let pass_count = test_scores.entry(test_id).or_default();
-                pass_count.push(TestScore::new(test_passes, test_total as u64));
-
-                run_score.category_scores[*category_idx] += test_passes as f64 / test_total as f64;
-                run_score.category_expected_failures[*category_idx] +=
-                    expected_failures as f64 / test_total as f64;
+            })
+            .collect()
+    }
+}
+
+/// Fill in the row of `matrix` starting at `offset` with the scores for
+/// `run`, returning the tests with unexpected non-OK statuses.
+fn score_run<'a>(
+    run: impl Iterator<Item = (&'a str, TestScore)>,
+    index: &TestIndex,
+    expected_not_ok: &BTreeSet<String>,
+    matrix: &mut ScoreMatrix,
+    offset: usize,
+) -> BTreeSet<String> {
+    let mut unexpected_not_ok = BTreeSet::new();
+    for (test_id, test_score) in run {
+        if let Some(test_idx) = index.ids.get(test_id) {
+            if !test_score.is_ok && !expected_not_ok.contains(test_id) {
+                unexpected_not_ok.insert(test_id.into());
             }
+            matrix.set(offset + test_idx, &test_score);
         }
     }
-    run_score
+    unexpected_not_ok
 }
 
-fn interop_score<'a>(
-    test_scores: impl Iterator<Item = &'a Vec<TestScore>>,
-    num_runs: usize,
-) -> u64 {
+/// Interop score for a category, given the per-test minimums for
+/// the tests in the category
+fn interop_score(test_minimums: &[(bool, Option<u64>)], tests: &[usize]) -> u64 {
     let mut interop_score = 0;
     let mut num_test_scores = 0;
-    for test_score in test_scores {
-        num_test_scores += 1;
-        if test_score.len() != num_runs {
-            continue;
+    for test_idx in tests {
+        let (has_score, min_score) = test_minimums[*test_idx];
+        if has_score {
+            num_test_scores += 1;
         }
-        let min_score = test_score
-            .iter()
-            .map(|score| (1000. * score.passes as f64 / score.total as f64).trunc() as u64)
-            .min()
-            .unwrap_or(0);
-        interop_score += min_score
+        interop_score += min_score.unwrap_or(0);
     }
     (interop_score as f64 / num_test_scores as f64).trunc() as u64
 }
@@ -285,75 +614,85 @@ pub fn score_runs<'a>(
     tests_by_category: &BTreeMap<String, BTreeSet<String>>,
     expected_not_ok: &BTreeSet<String>,
 ) -> (RunScores, InteropScore, ExpectedFailureScores) {
-    let mut unexpected_not_ok = BTreeSet::new();
+    score_runs_inner(
+        runs.map(|run| {
+            run.iter()
+                .map(|(test_id, results)| (test_id.as_str(), TestScore::from_results(results)))
+        }),
+        tests_by_category,
+        expected_not_ok,
+    )
+}
+
+/// Compute the Interop scores for a set of runs from per-test scores
+///
+/// This is the same as `score_runs`, but with each run given as a
+/// mapping from test id to the score for that test.
+pub fn score_test_scores<'a>(
+    runs: impl Iterator<Item = &'a TestScores>,
+    tests_by_category: &BTreeMap<String, BTreeSet<String>>,
+    expected_not_ok: &BTreeSet<String>,
+) -> (RunScores, InteropScore, ExpectedFailureScores) {
+    score_runs_inner(
+        runs.map(|run| {
+            run.iter()
+                .map(|(test_id, test_score)| (test_id.as_str(), *test_score))
+        }),
+        tests_by_category,
+        expected_not_ok,
+    )
+}
 
-    // Instead of passing round per-category maps, use a vector with categories at a fixed index
-    let num_categories = tests_by_category.len();
-    let mut categories = Vec::with_capacity(num_categories);
-    let mut test_count_by_category = Vec::with_capacity(num_categories);
-    let mut test_scores_by_category = Vec::with_capacity(num_categories);
+fn score_runs_inner<'a, R: Iterator<Item = (&'a str, TestScore)>>(
+    runs: impl Iterator<Item = R>,
+    tests_by_category: &BTreeMap<String, BTreeSet<String>>,
+    expected_not_ok: &BTreeSet<String>,
+) -> (RunScores, InteropScore, ExpectedFailureScores) {
+    let mut unexpected_not_ok = BTreeSet::new();
 
-    let mut categories_by_test = BTreeMap::new();
+    // Instead of passing round per-category maps, use a vector with categories at a fixed index,
+    // and resolve each test to a fixed index in a matrix of per-test scores
+    let categories = tests_by_category.keys().collect::<Vec<_>>();
+    let index = TestIndex::new(tests_by_category);
+    let mut matrix = ScoreMatrix::new(index.len(), runs.size_hint().0);
 
     let mut scores_by_category = BTreeMap::new();
     let mut interop_by_category = BTreeMap::new();
     let mut expected_failures_by_category = BTreeMap::new();
 
-    for (cat_idx, (category, tests)) in tests_by_category.iter().enumerate() {
-        categories.push(category);
-        test_count_by_category.push(tests.len());
-        test_scores_by_category.push(BTreeMap::new());
-
-        for test_id in tests {
-            categories_by_test
-                .entry(test_id.as_ref())
-                .or_insert_with(Vec::new)
-                .push(cat_idx)
-        }
-        scores_by_category.insert(category.clone(), Vec::with_capacity(runs.size_hint().0));
+    for category in categories.iter() {
+        scores_by_category.insert((*category).clone(), Vec::with_capacity(runs.size_hint().0));
         expected_failures_by_category
-            .insert(category.clone(), Vec::with_capacity(runs.size_hint().0));
-        interop_by_category.insert(category.clone(), 0);
+            .insert((*category).clone(), Vec::with_capacity(runs.size_hint().0));
     }
 
-    let mut run_count = 0;
     for run in runs {
-        run_count += 1;
-        let run_score = score_run(
-            run.iter()
-                .map(|(test_id, results)| (test_id.as_ref(), results)),
-            num_categories,
-            &categories_by_test,
-            expected_not_ok,
-            &mut test_scores_by_category,
-        );
+        let offset = matrix.push_run();
+        unexpected_not_ok.extend(score_run(run, &index, expected_not_ok, &mut matrix, offset));
         for (idx, name) in categories.iter().enumerate() {
+            let tests = &index.tests_by_category[idx];
+            let test_count = tests.len() as f64;
+            let (category_score, category_expected_failures) = matrix.run_sums(offset, tests);
             scores_by_category
                 .get_mut(*name)
                 .expect("Missing category")
-                .push(
-                    (1000. * run_score.category_scores[idx] / test_count_by_category[idx] as f64)
-                        .trunc() as u64,
-                );
+                .push((1000. * category_score / test_count).trunc() as u64);
             expected_failures_by_category
                 .get_mut(*name)
                 .expect("Missing category")
                 .push((
-                    (1000. * run_score.category_expected_failures[idx]
-                        / test_count_by_category[idx] as f64)
-                        .trunc() as u64,
-                    (1000.
-                        * (run_score.category_scores[idx]
-                            / (test_count_by_category[idx] as f64
-                                - run_score.category_expected_failures[idx])))
-                        .trunc() as u64,
+                    (1000. * category_expected_failures / test_count).trunc() as u64,
+                    (1000. * (category_score / (test_count - category_expected_failures))).trunc()
+                        as u64,
                 ));
         }
-        unexpected_not_ok.extend(run_score.unexpected_not_ok)
     }
+    let test_minimums = matrix.test_minimums();
     for (idx, name) in categories.iter().enumerate() {
-        let scores = &test_scores_by_category[idx];
-        interop_by_category.insert((*name).clone(), interop_score(scores.values(), run_count));
+        interop_by_category.insert(
+            (*name).clone(),
+            interop_score(&test_minimums, &index.tests_by_category[idx]),
+        );
     }
     (
         scores_by_category,
@@ -361,3 +700,220 @@ pub fn score_runs<'a>(
         expected_failures_by_category,
     )
 }
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::test_util::{synthetic_results, synthetic_tests, time_best_of};
+
+    /// Scoring using per-category maps of test scores, as before the
+    /// dense matrix was introduced. Used as a reference for the dense
+    /// implementation.
+    fn map_score_test_scores<'a>(
+        runs: impl Iterator<Item = &'a TestScores>,
+        tests_by_category: &BTreeMap<String, BTreeSet<String>>,
+    ) -> (RunScores, InteropScore, ExpectedFailureScores) {
+        let mut categories_by_test: BTreeMap<&str, Vec<usize>> = BTreeMap::new();
+        for (cat_idx, tests) in tests_by_category.values().enumerate() {
+            for test_id in tests {
+                categories_by_test
+                    .entry(test_id.as_str())
+                    .or_default()
+                    .push(cat_idx);
+            }
+        }
+        let mut test_scores_by_category: Vec<BTreeMap<&str, Vec<TestScore>>> =
+            vec![BTreeMap::new(); tests_by_category.len()];
+        let mut scores_by_category = RunScores::new();
+        let mut expected_failures_by_category = ExpectedFailureScores::new();
+        let mut run_count = 0;
+        for run in runs {
+            run_count += 1;
+            let mut category_scores = vec![0.; tests_by_category.len()];
+            let mut category_expected_failures = vec![0.; tests_by_category.len()];
+            for (test_id, test_score) in run.iter() {
+                if let Some(categories) = categories_by_test.get(test_id.as_str()) {
+                    for cat_idx in categories {
+                        test_scores_by_category[*cat_idx]
+                            .entry(test_id.as_str())
+                            .or_default()
+                            .push(*test_score);
+                        category_scores[*cat_idx] +=
+                            test_score.passes as f64 / test_score.total as f64;
+                        category_expected_failures[*cat_idx] +=
+                            test_score.expected_failures as f64 / test_score.total as f64;
+                    }
+                }
+            }
+            for (cat_idx, (category, tests)) in tests_by_category.iter().enumerate() {
+                let test_count = tests.len() as f64;
+                scores_by_category
+                    .entry(category.clone())
+                    .or_default()
+                    .push((1000. * category_scores[cat_idx] / test_count).trunc() as u64);
+                expected_failures_by_category
+                    .entry(category.clone())
+                    .or_default()
+                    .push((
+                        (1000. * category_expected_failures[cat_idx] / test_count).trunc() as u64,
+                        (1000.
+                            * (category_scores[cat_idx]
+                                / (test_count - category_expected_failures[cat_idx])))
+                            .trunc() as u64,
+                    ));
+            }
+        }
+        let mut interop_by_category = InteropScore::new();
+        for (cat_idx, category) in tests_by_category.keys().enumerate() {
+            let mut interop_score = 0;
+            let mut num_test_scores = 0;
+            for test_scores in test_scores_by_category[cat_idx].values() {
+                num_test_scores += 1;
+                if test_scores.len() == run_count {
+                    interop_score += test_scores
+                        .iter()
+                        .map(|score| {
+                            (1000. * score.passes as f64 / score.total as f64).trunc() as u64
+                        })
+                        .min()
+                        .unwrap_or(0);
+                }
+            }
+            interop_by_category.insert(
+                category.clone(),
+                (interop_score as f64 / num_test_scores as f64).trunc() as u64,
+            );
+        }
+        (
+            scores_by_category,
+            interop_by_category,
+            expected_failures_by_category,
+        )
+    }
+
+    /// Synthetic per-test scores for `num_runs` runs, where each run is
+    /// missing some of the tests, and overlapping categories.
+    fn synthetic_scores(
+        num_tests: usize,
+        num_runs: usize,
+    ) -> (Vec<TestScores>, BTreeMap<String, BTreeSet<String>>) {
+        let tests = synthetic_tests(num_tests, 100);
+        let runs = (0..num_runs)
+            .map(|run_idx| {
+                tests
+                    .iter()
+                    .enumerate()
+                    .filter(|(test_idx, _)| (test_idx + run_idx) % 17 != 0)
+                    .map(|(test_idx, test_id)| {
+                        (
+                            test_id.clone(),
+                            TestScore::from_results(&synthetic_results(test_idx * (run_idx + 1))),
+                        )
+                    })
+                    .collect::<TestScores>()
+            })
+            .collect::<Vec<_>>();
+        let tests_by_category = (0..10)
+            .map(|cat_idx| {
+                (
+                    format!("category-{}", cat_idx),
+                    tests
+                        .iter()
+                        .enumerate()
+                        .filter(|(test_idx, _)| test_idx % 10 == cat_idx || test_idx % 23 == 0)
+                        .map(|(_, test_id)| test_id.clone())
+                        .collect::<BTreeSet<_>>(),
+                )
+            })
+            .collect();
+        (runs, tests_by_category)
+    }
+
+    #[test]
+    fn map_parallel_order() {
+        let items = (0..1000).collect::<Vec<usize>>();
+        for threads in [1, 4] {
+            let inits = AtomicUsize::new(0);
+            let doubled = map_parallel_with(
+                &items,
+                threads,
+                || {
+                    inits.fetch_add(1, Ordering::Relaxed);
+                    Ok(())
+                },
+                |_, item| Ok(item * 2),
+            )
+            .unwrap();
+            assert_eq!(
+                doubled,
+                items.iter().map(|item| item * 2).collect::<Vec<_>>()
+            );
+            assert_eq!(inits.load(Ordering::Relaxed), threads);
+        }
+    }
+
+    #[test]
+    fn map_parallel_error() {
+        let items = (0..100).collect::<Vec<usize>>();
+        let result = map_parallel(&items, 4, |item| {
+            if *item == 50 {
+                Err(Error::String("Failed".into()))
+            } else {
+                Ok(*item)
+            }
+        });
+        assert!(matches!(result, Err(Error::String(msg)) if msg == "Failed"));
+    }
+
+    #[test]
+    fn dense_scores_match_map_scores() {
+        let (runs, tests_by_category) = synthetic_scores(2000, 4);
+        let dense = score_test_scores(runs.iter(), &tests_by_category, &BTreeSet::new());
+        let reference = map_score_test_scores(runs.iter(), &tests_by_category);
+        assert_eq!(dense, reference);
+    }
+
+    #[test]
+    fn test_score_matrix_layout() {
+        let (runs, tests_by_category) = synthetic_scores(300, 3);
+        let matrix = TestScoreMatrix::new(runs.iter(), &tests_by_category);
+        let num_tests = matrix.tests.len();
+        assert!(matrix.tests.windows(2).all(|pair| pair[0] < pair[1]));
+        assert_eq!(matrix.num_runs, runs.len());
+        for (run_idx, run) in runs.iter().enumerate() {
+            for (test_idx, test_id) in matrix.tests.iter().enumerate() {
+                let idx = run_idx * num_tests + test_idx;
+                let expected = run
+                    .get(test_id)
+                    .map(|score| (score.passes, score.total))
+                    .unwrap_or((0, 0));
+                assert_eq!((matrix.passes[idx], matrix.totals[idx]), expected);
+            }
+        }
+        for (cat_idx, category_tests) in tests_by_category.values().enumerate() {
+            for (test_idx, test_id) in matrix.tests.iter().enumerate() {
+                assert_eq!(
+                    matrix.category_mask[cat_idx * num_tests + test_idx] == 1,
+                    category_tests.contains(test_id)
+                );
+            }
+        }
+    }
+
+    #[test]
+    #[ignore = "benchmark"]
+    fn bench_dense_vs_map_scoring() {
+        let (runs, tests_by_category) = synthetic_scores(20_000, 4);
+        let expected_not_ok = BTreeSet::new();
+        let dense = time_best_of(10, || {
+            score_test_scores(runs.iter(), &tests_by_category, &expected_not_ok)
+        });
+        let map = time_best_of(10, || {
+            map_score_test_scores(runs.iter(), &tests_by_category)
+        });
+        println!(
+            "Scoring 4 runs x 20000 tests: dense matrix {:?}, BTreeMap {:?}",
+            dense, map
+        );
+    }
+}
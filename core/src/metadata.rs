@@ -1,9 +1,13 @@
 use crate::{Error, Result};
 use git2;
-use serde_derive::Deserialize;
+use serde_derive::{Deserialize, Serialize};
+use serde_json;
 use serde_yaml;
 use std::collections::{BTreeMap, BTreeSet};
-use std::path::Path;
+use std::fs;
+use std::io;
+use std::path::{Path, PathBuf};
+use std::thread;
 
 use crate::TestStatus;
 
@@ -46,10 +50,12 @@ pub struct MetadataLinkResult {
     pub status: Option<TestStatus>,
 }
 
-#[derive(Debug)]
+#[derive(Debug, PartialEq, Eq)]
 pub struct Metadata {
     pub revision: String,
     data: BTreeMap<String, PathMetadata>,
+    // Directory of each META.yml file to the patterns it contains
+    sources: BTreeMap<String, BTreeSet<String>>,
 }
 
 impl Metadata {
@@ -57,6 +63,7 @@ impl Metadata {
         Metadata {
             revision,
             data: BTreeMap::new(),
+            sources: BTreeMap::new(),
         }
     }
 
@@ -67,22 +74,29 @@ impl Metadata {
         test_path
     }
 
+    /// Merge the data from the META.yml file in the directory `path`.
+    ///
+    /// The result doesn't depend on the order in which files are
+    /// merged, so that `MetadataRepo::update_metadata` produces the
+    /// same data as `MetadataRepo::read_metadata`.
     fn add_from_file(&mut self, path: &str, metadata_file: MetadataFile) {
         for metadata_entry in metadata_file.links.iter() {
             match metadata_entry {
                 MetadataEntry::Label(entry) => {
                     for result in entry.results.iter() {
                         let test_path = Metadata::file_path(path, &result.test);
+                        self.add_source(path, &test_path);
                         let path_metadata = self.data.entry(test_path).or_default();
                         path_metadata.labels.insert(entry.label.clone());
                         if let Some(ref url) = entry.url {
-                            path_metadata.links.insert(url.clone(), Vec::new());
+                            path_metadata.links.entry(url.clone()).or_default();
                         }
                     }
                 }
                 MetadataEntry::Link(entry) => {
                     for result in entry.results.iter() {
                         let test_path = Metadata::file_path(path, &result.test);
+                        self.add_source(path, &test_path);
                         let path_metadata = self.data.entry(test_path).or_default();
                         let result_filter = LinkFilter {
                             product: entry.product.clone(),
@@ -91,13 +105,56 @@ impl Metadata {
                         };
                         let link_metadata =
                             path_metadata.links.entry(entry.url.clone()).or_default();
-                        link_metadata.push(result_filter)
+                        // Keep the filters sorted, so the merge order doesn't matter
+                        let idx = link_metadata.partition_point(|filter| filter <= &result_filter);
+                        link_metadata.insert(idx, result_filter)
                     }
                 }
             }
         }
     }
 
+    fn add_source(&mut self, path: &str, test_path: &str) {
+        if let Some(patterns) = self.sources.get_mut(path) {
+            if !patterns.contains(test_path) {
+                patterns.insert(test_path.to_string());
+            }
+        } else {
+            self.sources
+                .insert(path.to_string(), BTreeSet::from([test_path.to_string()]));
+        }
+    }
+
+    /// Remove the data from the META.yml files in the directories
+    /// `paths`.
+    ///
+    /// Other files can contribute to the same patterns as the removed
+    /// files, so the data for those is also removed. Returns the
+    /// directories of all the files that were removed.
+    fn remove_files(&mut self, paths: BTreeSet<String>) -> BTreeSet<String> {
+        let mut removed = paths;
+        let mut affected = BTreeSet::new();
+        let mut pending = removed.iter().cloned().collect::<Vec<_>>();
+        while !pending.is_empty() {
+            for path in pending.drain(..) {
+                if let Some(patterns) = self.sources.remove(&path) {
+                    affected.extend(patterns);
+                }
+            }
+            pending = self
+                .sources
+                .iter()
+                .filter(|(_, patterns)| !patterns.is_disjoint(&affected))
+                .map(|(path, _)| path.clone())
+                .collect();
+            removed.extend(pending.iter().cloned());
+        }
+        for pattern in affected.iter() {
+            self.data.remove(pattern);
+        }
+        removed
+    }
+
     pub fn get(&self, path: &str) -> Option<&PathMetadata> {
         self.data.get(path)
     }
@@ -121,31 +178,227 @@ impl Metadata {
     }
 }
 
-#[derive(Debug, Default)]
+#[derive(Debug, Default, PartialEq, Eq)]
 pub struct PathMetadata {
     pub labels: BTreeSet<String>,
     // Link from URL to filters
     pub links: BTreeMap<String, Vec<LinkFilter>>,
 }
 
-#[derive(Debug, Default)]
+#[derive(Debug, Default, Clone, PartialEq, Eq, PartialOrd, Ord, Deserialize, Serialize)]
 pub struct LinkFilter {
     pub product: Option<String>,
     pub status: Option<TestStatus>,
     pub subtest: Option<String>,
 }
 
+#[derive(Debug, Deserialize, Serialize)]
+struct StoredMetadata {
+    revision: String,
+    // Label to the patterns with that label
+    labels: BTreeMap<String, Vec<String>>,
+    // Pattern to link URL to filters
+    links: BTreeMap<String, BTreeMap<String, Vec<LinkFilter>>>,
+    // Directory of each META.yml file to the patterns it contains
+    sources: BTreeMap<String, BTreeSet<String>>,
+}
+
+impl From<&Metadata> for StoredMetadata {
+    fn from(metadata: &Metadata) -> StoredMetadata {
+        let mut labels: BTreeMap<String, Vec<String>> = BTreeMap::new();
+        let mut links = BTreeMap::new();
+        for (pattern, path_metadata) in metadata.data.iter() {
+            for label in path_metadata.labels.iter() {
+                labels
+                    .entry(label.clone())
+                    .or_default()
+                    .push(pattern.clone());
+            }
+            if !path_metadata.links.is_empty() {
+                links.insert(pattern.clone(), path_metadata.links.clone());
+            }
+        }
+        StoredMetadata {
+            revision: metadata.revision.clone(),
+            labels,
+            links,
+            sources: metadata.sources.clone(),
+        }
+    }
+}
+
+impl From<StoredMetadata> for Metadata {
+    fn from(stored: StoredMetadata) -> Metadata {
+        let mut metadata = Metadata::new(stored.revision);
+        for (label, patterns) in stored.labels.into_iter() {
+            for pattern in patterns.into_iter() {
+                metadata
+                    .data
+                    .entry(pattern)
+                    .or_default()
+                    .labels
+                    .insert(label.clone());
+            }
+        }
+        for (pattern, links) in stored.links.into_iter() {
+            metadata.data.entry(pattern).or_default().links = links;
+        }
+        metadata.sources = stored.sources;
+        metadata
+    }
+}
+
+/// Default number of entries kept in a [`MetadataCache`].
+pub const DEFAULT_METADATA_CACHE_ENTRIES: usize = 8;
+
+/// On-disk cache of parsed metadata, keyed by commit id.
+///
+/// Only the most recently inserted `max_entries` entries are kept;
+/// older entries are removed on insert. Insertion order is recorded
+/// in the `latest` file, which lists the revision of each entry, most
+/// recent first. If two processes insert at the same time one of the
+/// new entries may be dropped, which just means it's parsed again.
+pub struct MetadataCache {
+    path: PathBuf,
+    max_entries: usize,
+}
+
+impl MetadataCache {
+    pub fn new(path: &Path) -> Result<MetadataCache> {
+        MetadataCache::with_max_entries(path, DEFAULT_METADATA_CACHE_ENTRIES)
+    }
+
+    pub fn with_max_entries(path: &Path, max_entries: usize) -> Result<MetadataCache> {
+        fs::create_dir_all(path)?;
+        Ok(MetadataCache {
+            path: path.into(),
+            max_entries: max_entries.max(1),
+        })
+    }
+
+    fn entry_path(&self, commit_id: git2::Oid) -> PathBuf {
+        self.path.join(format!("{}.json", commit_id))
+    }
+
+    fn latest_path(&self) -> PathBuf {
+        self.path.join("latest")
+    }
+
+    /// Revisions of the cached entries, most recently inserted first.
+    fn recent_revisions(&self) -> Result<Vec<git2::Oid>> {
+        let data = match fs::read_to_string(self.latest_path()) {
+            Ok(data) => data,
+            Err(err) if err.kind() == io::ErrorKind::NotFound => return Ok(Vec::new()),
+            Err(err) => return Err(err.into()),
+        };
+        Ok(data
+            .lines()
+            .map(|line| line.trim())
+            .filter(|line| !line.is_empty())
+            .filter_map(|line| git2::Oid::from_str(line).ok())
+            .collect())
+    }
+
+    /// Get the cached metadata for a commit, if any.
+    pub fn get(&self, commit_id: git2::Oid) -> Result<Option<Metadata>> {
+        let data = match fs::read(self.entry_path(commit_id)) {
+            Ok(data) => data,
+            Err(err) if err.kind() == io::ErrorKind::NotFound => return Ok(None),
+            Err(err) => return Err(err.into()),
+        };
+        // A corrupt entry is treated as missing, so it will be overwritten
+        let stored: StoredMetadata = match serde_json::from_slice(&data) {
+            Ok(stored) => stored,
+            Err(_) => return Ok(None),
+        };
+        if stored.revision != commit_id.to_string() {
+            return Ok(None);
+        }
+        Ok(Some(stored.into()))
+    }
+
+    /// Get the most recently inserted metadata, if any.
+    pub fn latest(&self) -> Result<Option<Metadata>> {
+        match self.recent_revisions()?.first() {
+            Some(commit_id) => self.get(*commit_id),
+            None => Ok(None),
+        }
+    }
+
+    /// Store the metadata for a commit.
+    pub fn insert(&self, metadata: &Metadata) -> Result<()> {
+        let commit_id = git2::Oid::from_str(&metadata.revision)?;
+        crate::write_atomic(
+            &self.entry_path(commit_id),
+            &serde_json::to_vec(&StoredMetadata::from(metadata))?,
+        )?;
+        let mut revisions = self.recent_revisions()?;
+        revisions.retain(|revision| *revision != commit_id);
+        revisions.insert(0, commit_id);
+        revisions.truncate(self.max_entries);
+        let latest = revisions
+            .iter()
+            .map(|revision| format!("{}\n", revision))
+            .collect::<String>();
+        crate::write_atomic(&self.latest_path(), latest.as_bytes())?;
+        self.prune(&revisions)
+    }
+
+    /// Remove the entries for all revisions other than `keep`.
+    fn prune(&self, keep: &[git2::Oid]) -> Result<()> {
+        let keep_paths = keep
+            .iter()
+            .map(|revision| self.entry_path(*revision))
+            .collect::<BTreeSet<_>>();
+        for dir_entry in fs::read_dir(&self.path)? {
+            let path = dir_entry?.path();
+            if keep_paths.contains(&path) || path.extension().is_none_or(|ext| ext != "json") {
+                continue;
+            }
+            // Another process may have pruned the entry already
+            match fs::remove_file(&path) {
+                Ok(()) => {}
+                Err(err) if err.kind() == io::ErrorKind::NotFound => {}
+                Err(err) => return Err(err.into()),
+            }
+        }
+        Ok(())
+    }
+}
+
+/// Parse META.yml files, given as (directory, contents) pairs, using
+/// up to `threads` worker threads.
+///
+/// The returned files are in the same order as the input.
+fn parse_metadata_files(
+    files: &[(String, Vec<u8>)],
+    threads: usize,
+) -> Result<Vec<(String, MetadataFile)>> {
+    crate::map_parallel(files, threads, |(path, content)| {
+        Ok((path.clone(), serde_yaml::from_slice(content)?))
+    })
+}
+
 pub struct MetadataRepo {
     repo: git2::Repository,
+    threads: usize,
 }
 
 impl MetadataRepo {
     pub fn new(path: &Path) -> Result<MetadataRepo> {
         Ok(MetadataRepo {
             repo: git2::Repository::open(path)?,
+            threads: thread::available_parallelism()
+                .map(|threads| threads.get())
+                .unwrap_or(1),
         })
     }
 
+    /// Set the maximum number of threads used to parse META.yml files.
+    pub fn set_threads(&mut self, threads: usize) {
+        self.threads = threads.max(1);
+    }
+
     pub fn head(&self) -> Result<git2::Commit<'_>> {
         Ok(self.repo.head()?.peel_to_commit()?)
     }
@@ -155,8 +408,85 @@ impl MetadataRepo {
         Ok(self.repo.find_commit(oid)?)
     }
 
+    /// Default location of the metadata cache, inside the repository's
+    /// git directory.
+    pub fn cache_path(&self) -> PathBuf {
+        self.repo.path().join("wpt-interop").join("metadata-v3")
+    }
+
+    /// Get the metadata for a commit, using `cache` if provided.
+    ///
+    /// If the commit isn't in the cache, the metadata is updated from
+    /// the most recently cached commit, if that's in this repository.
+    pub fn load(&self, commit: &git2::Commit, cache: Option<&MetadataCache>) -> Result<Metadata> {
+        let mut base = None;
+        if let Some(cache) = cache {
+            if let Some(metadata) = cache.get(commit.id())? {
+                return Ok(metadata);
+            }
+            base = cache
+                .latest()?
+                .filter(|metadata| self.get_commit(&metadata.revision).is_ok());
+        }
+        let metadata = match base {
+            Some(base) => self.update_metadata(base, commit)?,
+            None => self.read_metadata(commit)?,
+        };
+        if let Some(cache) = cache {
+            cache.insert(&metadata)?;
+        }
+        Ok(metadata)
+    }
+
+    /// Update `metadata` to the metadata for `commit`.
+    ///
+    /// Only the META.yml files that differ between the metadata
+    /// revision and `commit` are read.
+    pub fn update_metadata(
+        &self,
+        mut metadata: Metadata,
+        commit: &git2::Commit,
+    ) -> Result<Metadata> {
+        let base_tree = self.get_commit(&metadata.revision)?.tree()?;
+        let tree = commit.tree()?;
+        let diff = self
+            .repo
+            .diff_tree_to_tree(Some(&base_tree), Some(&tree), None)?;
+        let mut changed = BTreeSet::new();
+        for delta in diff.deltas() {
+            for file in [delta.old_file(), delta.new_file()] {
+                if let Some(path) = file.path().and_then(metadata_file_dir) {
+                    changed.insert(path);
+                }
+            }
+        }
+        metadata.revision = commit.id().to_string();
+
+        let mut files = Vec::new();
+        for path in metadata.remove_files(changed) {
+            let file_path = if path.is_empty() {
+                "META.yml".to_string()
+            } else {
+                format!("{}/META.yml", &path[1..])
+            };
+            let tree_entry = match tree.get_path(Path::new(&file_path)) {
+                Ok(tree_entry) => tree_entry,
+                Err(err) if err.code() == git2::ErrorCode::NotFound => continue,
+                Err(err) => return Err(err.into()),
+            };
+            let blob = tree_entry.to_object(&self.repo)?.peel_to_blob()?;
+            files.push((path, blob.content().to_vec()));
+        }
+        for (path, metadata_file) in parse_metadata_files(&files, self.threads)? {
+            metadata.add_from_file(&path, metadata_file);
+        }
+        Ok(metadata)
+    }
+
     pub fn read_metadata(&self, commit: &git2::Commit) -> Result<Metadata> {
         let mut metadata = Metadata::new(commit.id().to_string());
+        // Read all the files first, so that parsing can happen in parallel
+        let mut files = Vec::new();
         let root = commit.tree()?;
         let mut stack: Vec<(git2::Tree, String)> = vec![(root, "".to_string())];
         while let Some((tree, path)) = stack.pop() {
@@ -176,9 +506,7 @@ impl MetadataRepo {
                         let name = tree_entry.name()?;
                         if name == "META.yml" {
                             let blob = tree_entry.to_object(&self.repo)?.peel_to_blob()?;
-                            let metadata_file: MetadataFile =
-                                serde_yaml::from_slice(blob.content())?;
-                            metadata.add_from_file(&path, metadata_file);
+                            files.push((path.clone(), blob.content().to_vec()));
                         }
                     }
                     _ => {
@@ -190,19 +518,296 @@ impl MetadataRepo {
                 }
             }
         }
+        for (path, metadata_file) in parse_metadata_files(&files, self.threads)? {
+            metadata.add_from_file(&path, metadata_file);
+        }
         Ok(metadata)
     }
 }
 
+/// Get the directory of a META.yml file, in the form used by
+/// `read_metadata`, or `None` if the path isn't a META.yml file that
+/// `read_metadata` would read.
+fn metadata_file_dir(path: &Path) -> Option<String> {
+    if path.file_name()? != "META.yml" {
+        return None;
+    }
+    let mut dir = String::new();
+    for component in path.parent()?.iter() {
+        let component = component.to_str()?;
+        if component.starts_with('.') {
+            return None;
+        }
+        dir.push('/');
+        dir.push_str(component);
+    }
+    Some(dir)
+}
+
+/// Load the metadata at `metadata_revision`, or the head revision.
+///
+/// `threads` is the maximum number of threads used to parse
+/// metadata files, or `None` to use the available parallelism.
 pub fn load_metadata(
     metadata_repo_path: &Path,
     metadata_revision: Option<&str>,
+    threads: Option<usize>,
 ) -> Result<(git2::Oid, Metadata)> {
-    let metadata_repo = MetadataRepo::new(metadata_repo_path)?;
+    let mut metadata_repo = MetadataRepo::new(metadata_repo_path)?;
+    if let Some(threads) = threads {
+        metadata_repo.set_threads(threads);
+    }
     let commit = if let Some(revision) = metadata_revision {
         metadata_repo.get_commit(revision).map_err(Error::from)?
     } else {
         metadata_repo.head().map_err(Error::from)?
     };
-    Ok((commit.id(), metadata_repo.read_metadata(&commit)?))
+    let cache = MetadataCache::new(&metadata_repo.cache_path())?;
+    Ok((commit.id(), metadata_repo.load(&commit, Some(&cache))?))
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::test_util::{time_best_of, TempDir};
+
+    /// (directory, contents) pairs for `num_files` synthetic META.yml
+    /// files, each with a label entry and a link entry.
+    fn synthetic_metadata_files(num_files: usize) -> Vec<(String, String)> {
+        (0..num_files)
+            .map(|idx| {
+                let dir = format!("dir{}/sub{}", idx % 100, idx);
+                let mut content = format!(
+                    "links:\n- label: interop-{}\n  url: https://bugs.example/{}\n  results:\n",
+                    idx % 20,
+                    idx
+                );
+                for test in 0..5 {
+                    content.push_str(&format!("  - test: test{}.html\n", test));
+                }
+                content.push_str(&format!(
+                    "- url: https://bugs.example/{}\n  product: chrome\n  results:\n",
+                    idx + num_files
+                ));
+                for test in 0..5 {
+                    content.push_str(&format!(
+                        "  - test: test{}.html\n    subtest: subtest {}\n    status: FAIL\n",
+                        test, idx
+                    ));
+                }
+                (dir, content)
+            })
+            .collect()
+    }
+
+    fn commit_files(repo: &git2::Repository, files: &[(&str, &str)]) -> git2::Oid {
+        let workdir = repo.workdir().unwrap();
+        for entry in fs::read_dir(workdir).unwrap() {
+            let path = entry.unwrap().path();
+            if path.file_name().unwrap() != ".git" {
+                if path.is_dir() {
+                    fs::remove_dir_all(path).unwrap();
+                } else {
+                    fs::remove_file(path).unwrap();
+                }
+            }
+        }
+        for (path, content) in files {
+            let path = workdir.join(path);
+            fs::create_dir_all(path.parent().unwrap()).unwrap();
+            fs::write(path, content).unwrap();
+        }
+        let mut index = repo.index().unwrap();
+        index.clear().unwrap();
+        index
+            .add_all(["*"], git2::IndexAddOption::DEFAULT, None)
+            .unwrap();
+        index.write().unwrap();
+        let tree = repo.find_tree(index.write_tree().unwrap()).unwrap();
+        let signature = git2::Signature::now("Test", "test@example.org").unwrap();
+        let parent = repo.head().ok().map(|head| head.peel_to_commit().unwrap());
+        repo.commit(
+            Some("HEAD"),
+            &signature,
+            &signature,
+            "Update metadata",
+            &tree,
+            &parent.iter().collect::<Vec<_>>(),
+        )
+        .unwrap()
+    }
+
+    #[test]
+    fn update_metadata_matches_read_metadata() {
+        let dir = TempDir::new("metadata-repo");
+        let repo = git2::Repository::init(dir.path()).unwrap();
+        let base = commit_files(
+            &repo,
+            &[
+                (
+                    "META.yml",
+                    "links:\n\
+                     - label: interop-root\n  results:\n  - test: a/t2.html\n",
+                ),
+                (
+                    "a/META.yml",
+                    "links:\n\
+                     - url: https://bugs.example/1\n  product: chrome\n  results:\n\
+                     \x20 - test: t2.html\n    status: FAIL\n",
+                ),
+                (
+                    "a/b/META.yml",
+                    "links:\n\
+                     - url: https://bugs.example/1\n  product: firefox\n  results:\n\
+                     \x20 - test: t1.html\n    subtest: sub\n\
+                     - label: interop-b\n  url: https://bugs.example/1\n  results:\n\
+                     \x20 - test: t1.html\n",
+                ),
+                (
+                    "c/META.yml",
+                    "links:\n- label: interop-c\n  results:\n  - test: t3.html\n",
+                ),
+            ],
+        );
+        // Change a/META.yml so that it also contributes to a pattern from
+        // the unchanged a/b/META.yml, remove c/META.yml and add e/META.yml
+        let head = commit_files(
+            &repo,
+            &[
+                (
+                    "META.yml",
+                    "links:\n\
+                     - label: interop-root\n  results:\n  - test: a/t2.html\n",
+                ),
+                (
+                    "a/META.yml",
+                    "links:\n\
+                     - url: https://bugs.example/1\n  product: chrome\n  results:\n\
+                     \x20 - test: t2.html\n    status: PASS\n\
+                     \x20 - test: b/t1.html\n    status: FAIL\n",
+                ),
+                (
+                    "a/b/META.yml",
+                    "links:\n\
+                     - url: https://bugs.example/1\n  product: firefox\n  results:\n\
+                     \x20 - test: t1.html\n    subtest: sub\n\
+                     - label: interop-b\n  url: https://bugs.example/1\n  results:\n\
+                     \x20 - test: t1.html\n",
+                ),
+                (
+                    "e/META.yml",
+                    "links:\n\
+                     - url: https://bugs.example/2\n  results:\n  - test: t5.html\n",
+                ),
+            ],
+        );
+
+        for threads in [1, 4] {
+            let mut metadata_repo = MetadataRepo::new(dir.path()).unwrap();
+            metadata_repo.set_threads(threads);
+            let base_commit = metadata_repo.get_commit(&base.to_string()).unwrap();
+            let head_commit = metadata_repo.get_commit(&head.to_string()).unwrap();
+            let base_metadata = metadata_repo.read_metadata(&base_commit).unwrap();
+            let full = metadata_repo.read_metadata(&head_commit).unwrap();
+            let updated = metadata_repo
+                .update_metadata(base_metadata, &head_commit)
+                .unwrap();
+            assert_eq!(updated, full);
+
+            let links = &full.get("/a/b/t1.html").unwrap().links;
+            assert_eq!(links["https://bugs.example/1"].len(), 2);
+            assert!(full.get("/c/t3.html").is_none());
+            assert!(full.get("/e/t5.html").is_some());
+        }
+    }
+
+    #[test]
+    fn metadata_cache_prune() {
+        let dir = TempDir::new("metadata-cache");
+        let cache = MetadataCache::with_max_entries(dir.path(), 3).unwrap();
+        let revisions = (0..5)
+            .map(|idx| format!("{:040x}", idx + 1))
+            .collect::<Vec<_>>();
+        for revision in revisions.iter() {
+            cache.insert(&Metadata::new(revision.clone())).unwrap();
+        }
+        let num_entries = fs::read_dir(dir.path())
+            .unwrap()
+            .filter(|entry| {
+                entry
+                    .as_ref()
+                    .unwrap()
+                    .path()
+                    .extension()
+                    .is_some_and(|ext| ext == "json")
+            })
+            .count();
+        assert_eq!(num_entries, 3);
+        let latest = cache.latest().unwrap().unwrap();
+        assert_eq!(&latest.revision, revisions.last().unwrap());
+
+        // Pruning follows insertion order, so re-inserting an entry keeps it
+        cache.insert(&Metadata::new(revisions[2].clone())).unwrap();
+        cache.insert(&Metadata::new(format!("{:040x}", 6))).unwrap();
+        let cached = revisions
+            .iter()
+            .map(|revision| {
+                cache
+                    .get(git2::Oid::from_str(revision).unwrap())
+                    .unwrap()
+                    .is_some()
+            })
+            .collect::<Vec<_>>();
+        assert_eq!(cached, [false, false, true, false, true]);
+        let latest = cache.latest().unwrap().unwrap();
+        assert_eq!(latest.revision, format!("{:040x}", 6));
+    }
+
+    #[test]
+    #[ignore = "benchmark"]
+    fn bench_parse_metadata_files() {
+        let files = synthetic_metadata_files(30_000)
+            .into_iter()
+            .map(|(dir, content)| (format!("/{}", dir), content.into_bytes()))
+            .collect::<Vec<_>>();
+
+        for threads in [1, 2, 4, 8] {
+            let elapsed = time_best_of(3, || parse_metadata_files(&files, threads).unwrap());
+            println!(
+                "parse_metadata_files: {} files, {} threads: {:?}",
+                files.len(),
+                threads,
+                elapsed
+            );
+        }
+    }
+
+    #[test]
+    #[ignore = "benchmark"]
+    fn bench_read_metadata() {
+        let dir = TempDir::new("bench-metadata-repo");
+        let repo = git2::Repository::init(dir.path()).unwrap();
+        let files = synthetic_metadata_files(30_000)
+            .into_iter()
+            .map(|(dir, content)| (format!("{}/META.yml", dir), content))
+            .collect::<Vec<_>>();
+        let files = files
+            .iter()
+            .map(|(path, content)| (path.as_str(), content.as_str()))
+            .collect::<Vec<_>>();
+        let commit_id = commit_files(&repo, &files);
+
+        for threads in [1, 2, 4, 8] {
+            let mut metadata_repo = MetadataRepo::new(dir.path()).unwrap();
+            metadata_repo.set_threads(threads);
+            let commit = metadata_repo.get_commit(&commit_id.to_string()).unwrap();
+            let elapsed = time_best_of(3, || metadata_repo.read_metadata(&commit).unwrap());
+            println!(
+                "read_metadata: {} files, {} threads: {:?}",
+                files.len(),
+                threads,
+                elapsed
+            );
+        }
+    }
 }
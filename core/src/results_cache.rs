@@ -1,69 +1,504 @@
-use crate::{Error, Result, Results};
+use crate::compact::{CompactResults, Interner};
+use crate::score_store::TestScoreStore;
+use crate::{
+    Error, ExpectedFailureScores, InteropScore, Result, Results, RunScores, TestScore, TestScores,
+};
 use chrono::{self, NaiveDate};
 use core::str;
 use git2;
 use serde_derive::Deserialize;
 use serde_json;
-use std::collections::{BTreeMap, BTreeSet};
+use std::collections::{BTreeMap, BTreeSet, HashMap, VecDeque};
 use std::path::{Path, PathBuf};
+use std::sync::{Arc, LazyLock, Mutex};
 use urlencoding;
 
+/// Maximum number of requested tests for which results are read by looking
+/// up each containing directory, rather than by walking the results tree.
+const DIRECT_LOOKUP_MAX_TESTS: usize = 64;
+
+/// Split a test id into its directory and file name parts.
+///
+/// Any query string is considered part of the file name, even if it contains a '/'.
+fn split_test_id(test_id: &str) -> (&str, &str) {
+    let path_end = test_id.find('?').unwrap_or(test_id.len());
+    match test_id[..path_end].rfind('/') {
+        Some(idx) => (&test_id[..idx], &test_id[idx + 1..]),
+        None => ("", test_id),
+    }
+}
+
+/// Get the test file name from the name of a results blob.
+fn test_name_from_entry(name: &str) -> Result<String> {
+    match name.rsplit_once('.') {
+        Some((test_name, "json")) => Ok(urlencoding::decode(test_name)
+            .expect("Test name is valid utf8")
+            .into_owned()),
+        Some((_, _)) | None => Err(Error::String(format!(
+            "Expected a name ending .json(), got {}",
+            name
+        ))),
+    }
+}
+
+/// Prefix tree of the directories containing a set of tests.
+///
+/// Used to restrict a walk of the results tree to subtrees that
+/// contain at least one of the requested tests.
+#[derive(Debug, Default)]
+struct TestPathTrie {
+    children: BTreeMap<String, TestPathTrie>,
+    tests: BTreeSet<String>,
+}
+
+impl TestPathTrie {
+    fn new<'a>(test_ids: impl Iterator<Item = &'a str>) -> TestPathTrie {
+        let mut root = TestPathTrie::default();
+        for test_id in test_ids {
+            let (dir, name) = split_test_id(test_id);
+            let mut node = &mut root;
+            for component in dir.split('/').filter(|x| !x.is_empty()) {
+                node = node.children.entry(component.to_string()).or_default();
+            }
+            node.tests.insert(name.to_string());
+        }
+        root
+    }
+}
+
+/// Default maximum number of entries in the parsed results cache.
+///
+/// Each entry costs roughly 150 bytes, plus roughly 100 bytes per
+/// subtest for the subtest name and status. With wpt's typical few tens
+/// of subtests per test file, a full cache at this capacity uses a few
+/// hundred MiB.
+pub const DEFAULT_BLOB_CACHE_CAPACITY: usize = 100_000;
+
+/// LRU cache of parsed results, keyed by the OID of the blob they were read from.
+///
+/// Results blobs are often identical between runs, so this avoids
+/// decompressing and parsing the same data for every run. Entries are
+/// shared, so a hit doesn't copy the results.
+struct BlobCache {
+    capacity: usize,
+    counter: u64,
+    entries: HashMap<git2::Oid, (u64, Arc<Results>)>,
+    // Map from last use to OID, oldest first
+    lru: BTreeMap<u64, git2::Oid>,
+}
+
+impl BlobCache {
+    fn new(capacity: usize) -> BlobCache {
+        BlobCache {
+            capacity,
+            counter: 0,
+            entries: HashMap::new(),
+            lru: BTreeMap::new(),
+        }
+    }
+
+    fn get(&mut self, oid: &git2::Oid) -> Option<Arc<Results>> {
+        let (last_used, results) = self.entries.get_mut(oid)?;
+        self.lru.remove(&*last_used);
+        self.counter += 1;
+        *last_used = self.counter;
+        self.lru.insert(self.counter, *oid);
+        Some(results.clone())
+    }
+
+    fn insert(&mut self, oid: git2::Oid, results: Arc<Results>) {
+        if self.capacity == 0 {
+            return;
+        }
+        self.counter += 1;
+        if let Some((last_used, _)) = self.entries.insert(oid, (self.counter, results)) {
+            self.lru.remove(&last_used);
+        }
+        self.lru.insert(self.counter, oid);
+        self.evict();
+    }
+
+    fn set_capacity(&mut self, capacity: usize) {
+        self.capacity = capacity;
+        self.evict();
+    }
+
+    fn clear(&mut self) {
+        self.entries.clear();
+        self.lru.clear();
+    }
+
+    fn evict(&mut self) {
+        while self.entries.len() > self.capacity {
+            match self.lru.pop_first() {
+                Some((_, oid)) => {
+                    self.entries.remove(&oid);
+                }
+                None => break,
+            }
+        }
+    }
+}
+
+static BLOB_CACHE: LazyLock<Mutex<BlobCache>> =
+    LazyLock::new(|| Mutex::new(BlobCache::new(DEFAULT_BLOB_CACHE_CAPACITY)));
+
+/// Set the maximum number of entries in the process-wide parsed results cache.
+///
+/// Memory use grows with the number and size of the cached results; see
+/// [`DEFAULT_BLOB_CACHE_CAPACITY`]. Setting this to zero disables the cache.
+pub fn set_blob_cache_capacity(capacity: usize) {
+    BLOB_CACHE
+        .lock()
+        .expect("Blob cache lock poisoned")
+        .set_capacity(capacity);
+}
+
+/// Remove all entries from the process-wide parsed results cache.
+pub fn clear_blob_cache() {
+    BLOB_CACHE.lock().expect("Blob cache lock poisoned").clear();
+}
+
+fn read_results(repo: &git2::Repository, oid: git2::Oid) -> Result<Results> {
+    let blob = repo.find_blob(oid)?;
+    Ok(serde_json::from_slice(blob.content())?)
+}
+
+/// Read results, using the parsed results cache where possible.
+fn read_cached_results(repo: &git2::Repository, oid: git2::Oid) -> Result<Arc<Results>> {
+    if let Some(results) = BLOB_CACHE
+        .lock()
+        .expect("Blob cache lock poisoned")
+        .get(&oid)
+    {
+        return Ok(results);
+    }
+    let results = Arc::new(read_results(repo, oid)?);
+    BLOB_CACHE
+        .lock()
+        .expect("Blob cache lock poisoned")
+        .insert(oid, results.clone());
+    Ok(results)
+}
+
+/// Get the test id corresponding to the path of a results blob
+/// relative to the root of the results tree.
+fn test_id_from_path(path: &str) -> Result<String> {
+    let (dir, name) = path.rsplit_once('/').unwrap_or(("", path));
+    let test_name = test_name_from_entry(name)?;
+    if dir.is_empty() {
+        Ok(format!("/{}", test_name))
+    } else {
+        Ok(format!("/{}/{}", dir, test_name))
+    }
+}
+
+/// Call `visit` with all the results under `root`, optionally only
+/// descending into directories that are part of `include`.
+fn walk_results<F: FnMut(String, Arc<Results>)>(
+    repo: &git2::Repository,
+    root: git2::Tree,
+    include: Option<&TestPathTrie>,
+    visit: &mut F,
+) -> Result<()> {
+    let mut stack: Vec<(git2::Tree, String, Option<&TestPathTrie>)> =
+        vec![(root, "".to_string(), include)];
+    while let Some((tree, path, trie)) = stack.pop() {
+        for tree_entry in tree.iter() {
+            match tree_entry.kind() {
+                Some(git2::ObjectType::Tree) => {
+                    let name = tree_entry.name()?;
+                    let child_trie = match trie {
+                        Some(trie) => match trie.children.get(name) {
+                            Some(child_trie) => Some(child_trie),
+                            None => continue,
+                        },
+                        None => None,
+                    };
+                    stack.push((
+                        tree_entry.to_object(repo)?.peel_to_tree()?,
+                        format!("{}/{}", path, name),
+                        child_trie,
+                    ));
+                }
+                Some(git2::ObjectType::Blob) => {
+                    let test_name = test_name_from_entry(tree_entry.name()?)?;
+                    // Loading a whole run would just churn the cache, so it's only
+                    // used when we're loading a subset of tests
+                    let results = if let Some(trie) = trie {
+                        if !trie.tests.contains(&test_name) {
+                            continue;
+                        }
+                        read_cached_results(repo, tree_entry.id())?
+                    } else {
+                        Arc::new(read_results(repo, tree_entry.id())?)
+                    };
+                    visit(format!("{}/{}", path, test_name), results);
+                }
+                _ => {
+                    return Err(Error::String(format!(
+                        "Unexpected object while walking tree {}",
+                        tree_entry.id()
+                    )));
+                }
+            }
+        }
+    }
+    Ok(())
+}
+
+/// Possible names of the results blob for the test file `name`.
+///
+/// Blob names are urlencoded, but writers differ in whether they escape
+/// the characters that JavaScript's `encodeURIComponent` leaves alone,
+/// so both spellings are tried.
+fn results_blob_names(name: &str) -> Vec<String> {
+    let encoded = urlencoding::encode(name);
+    let mut blob_names = vec![format!("{}.json", encoded)];
+    if name.contains(['!', '\'', '(', ')', '*']) {
+        let mut relaxed = encoded.into_owned();
+        for (escaped, unescaped) in [
+            ("%21", "!"),
+            ("%27", "'"),
+            ("%28", "("),
+            ("%29", ")"),
+            ("%2A", "*"),
+        ] {
+            relaxed = relaxed.replace(escaped, unescaped);
+        }
+        blob_names.push(format!("{}.json", relaxed));
+    }
+    blob_names
+}
+
+/// Call `visit` with the results for a small set of tests, by looking
+/// up the directory containing each test directly.
+fn lookup_results<F: FnMut(String, Arc<Results>)>(
+    repo: &git2::Repository,
+    root: &git2::Tree,
+    include: &BTreeSet<String>,
+    visit: &mut F,
+) -> Result<()> {
+    let mut tests_by_dir: BTreeMap<&str, BTreeSet<&str>> = BTreeMap::new();
+    for test_id in include.iter() {
+        let (dir, name) = split_test_id(test_id);
+        tests_by_dir.entry(dir).or_default().insert(name);
+    }
+
+    for (dir, names) in tests_by_dir.into_iter() {
+        let dir_path = dir.trim_start_matches('/');
+        let tree = if dir_path.is_empty() {
+            root.clone()
+        } else {
+            match root.get_path(Path::new(dir_path)) {
+                Ok(tree_entry) => match tree_entry.to_object(repo)?.into_tree() {
+                    Ok(tree) => tree,
+                    Err(_) => continue,
+                },
+                Err(err) if err.code() == git2::ErrorCode::NotFound => continue,
+                Err(err) => return Err(err.into()),
+            }
+        };
+        for name in names.into_iter() {
+            let tree_entry = results_blob_names(name).into_iter().find_map(|blob_name| {
+                tree.get_name(&blob_name)
+                    .filter(|tree_entry| tree_entry.kind() == Some(git2::ObjectType::Blob))
+            });
+            if let Some(tree_entry) = tree_entry {
+                let results = read_cached_results(repo, tree_entry.id())?;
+                visit(format!("{}/{}", dir, name), results);
+            }
+        }
+    }
+    Ok(())
+}
+
+/// Call `visit` with each of the results under `root`, optionally
+/// restricted to a set of tests.
+fn visit_tree_results<F: FnMut(String, Arc<Results>)>(
+    repo: &git2::Repository,
+    root: git2::Tree,
+    include_tests: Option<&BTreeSet<String>>,
+    visit: &mut F,
+) -> Result<()> {
+    match include_tests {
+        Some(include) if include.len() <= DIRECT_LOOKUP_MAX_TESTS => {
+            lookup_results(repo, &root, include, visit)
+        }
+        Some(include) => {
+            let trie = TestPathTrie::new(include.iter().map(|x| x.as_str()));
+            walk_results(repo, root, Some(&trie), visit)
+        }
+        None => walk_results(repo, root, None, visit),
+    }
+}
+
+/// Read the results under `root`, optionally restricted to a set of tests.
+fn tree_results(
+    repo: &git2::Repository,
+    root: git2::Tree,
+    include_tests: Option<&BTreeSet<String>>,
+) -> Result<BTreeMap<String, Results>> {
+    let mut results_data = BTreeMap::new();
+    visit_tree_results(repo, root, include_tests, &mut |test_id, results| {
+        results_data.insert(test_id, Arc::unwrap_or_clone(results));
+    })?;
+    Ok(results_data)
+}
+
+/// Per-test scores for a run, along with the results tree they were computed from.
+#[derive(Debug, Clone)]
+pub struct RunTestScores {
+    pub tree_id: git2::Oid,
+    /// Fingerprint of the set of tests that were scored
+    pub tests_fingerprint: u64,
+    pub scores: TestScores,
+}
+
 pub trait ResultsCache {
     fn run_ref(&self, run_id: &str) -> String;
     fn repo(&self) -> &git2::Repository;
+
+    fn results_tree(&self, run_id: &str) -> Result<git2::Tree<'_>> {
+        let run_ref = self.repo().find_reference(&self.run_ref(run_id))?;
+        Ok(run_ref.peel_to_tree()?)
+    }
+
     fn results(
         &self,
         run_id: &str,
         include_tests: Option<&BTreeSet<String>>,
     ) -> Result<BTreeMap<String, Results>> {
+        tree_results(self.repo(), self.results_tree(run_id)?, include_tests)
+    }
+
+    /// Load the results for a run into the compact representation,
+    /// interning names with `interner`.
+    fn compact_results(
+        &self,
+        run_id: &str,
+        include_tests: Option<&BTreeSet<String>>,
+        interner: &mut Interner,
+    ) -> Result<CompactResults> {
+        let mut results = CompactResults::default();
+        visit_tree_results(
+            self.repo(),
+            self.results_tree(run_id)?,
+            include_tests,
+            &mut |test_id, test_results| results.push(interner, &test_id, &test_results),
+        )?;
+        results.sort();
+        Ok(results)
+    }
+
+    /// Compute the per-test scores for a run.
+    ///
+    /// If `store` is provided, scores are read from there when
+    /// available, and otherwise added to the store once computed.
+    fn test_scores(
+        &self,
+        run_id: &str,
+        include_tests: &BTreeSet<String>,
+        store: Option<&TestScoreStore>,
+    ) -> Result<RunTestScores> {
+        let root = self.results_tree(run_id)?;
+        let tree_id = root.id();
+        let tests_fingerprint = crate::tests_fingerprint(include_tests);
+        if let Some(store) = store {
+            if let Some(scores) = store.get(tree_id, include_tests, tests_fingerprint)? {
+                return Ok(RunTestScores {
+                    tree_id,
+                    tests_fingerprint,
+                    scores,
+                });
+            }
+        }
+        // Score each test as it's read, so only the scores are kept in memory
+        let mut scores = TestScores::new();
+        visit_tree_results(
+            self.repo(),
+            root,
+            Some(include_tests),
+            &mut |test_id, test_results| {
+                scores.insert(test_id, TestScore::from_results(&test_results));
+            },
+        )?;
+        if let Some(store) = store {
+            store.insert(tree_id, include_tests, tests_fingerprint, &scores)?;
+        }
+        Ok(RunTestScores {
+            tree_id,
+            tests_fingerprint,
+            scores,
+        })
+    }
+
+    /// Compute the per-test scores for a run, starting from the scores
+    /// for a previous run and only reading the results that differ
+    /// between the two.
+    ///
+    /// If `base` was computed for a different set of tests, this is the
+    /// same as `test_scores`.
+    fn test_scores_from_base(
+        &self,
+        base: &RunTestScores,
+        run_id: &str,
+        include_tests: &BTreeSet<String>,
+        store: Option<&TestScoreStore>,
+    ) -> Result<RunTestScores> {
         let repo = self.repo();
-        let mut results_data = BTreeMap::new();
-        let run_ref = repo.find_reference(&self.run_ref(run_id))?;
-
-        let root = run_ref.peel_to_tree()?;
-        let mut stack: Vec<(git2::Tree, String)> = vec![(root, "".to_string())];
-        while let Some((tree, path)) = stack.pop() {
-            for tree_entry in tree.iter() {
-                match tree_entry.kind() {
-                    Some(git2::ObjectType::Tree) => {
-                        let name = tree_entry.name()?;
-                        stack.push((
-                            tree_entry.to_object(repo)?.peel_to_tree()?,
-                            format!("{}/{}", path, name),
-                        ));
-                    }
-                    Some(git2::ObjectType::Blob) => {
-                        let name = tree_entry.name()?;
-                        let test_name = match name.rsplit_once('.') {
-                            Some((test_name, "json")) => urlencoding::decode(test_name),
-                            Some((_, _)) | None => {
-                                return Err(Error::String(format!(
-                                    "Expected a name ending .json(), got {}",
-                                    name
-                                )));
-                            }
-                        }
-                        .expect("Test name is valid utf8");
-                        let path = format!("{}/{}", path, test_name);
-                        if let Some(include) = include_tests {
-                            if !include.contains(&path) {
-                                continue;
-                            }
-                        }
-                        let blob = tree_entry.to_object(repo)?.peel_to_blob()?;
-                        let results: Results = serde_json::from_slice(blob.content())?;
-                        results_data.insert(path, results);
-                    }
-                    _ => {
-                        return Err(Error::String(format!(
-                            "Unexpected object while walking tree {}",
-                            tree_entry.id()
-                        )));
-                    }
-                }
+        let root = self.results_tree(run_id)?;
+        let tree_id = root.id();
+        let tests_fingerprint = crate::tests_fingerprint(include_tests);
+        if base.tests_fingerprint != tests_fingerprint {
+            return self.test_scores(run_id, include_tests, store);
+        }
+        if tree_id == base.tree_id {
+            return Ok(base.clone());
+        }
+        if let Some(store) = store {
+            if let Some(scores) = store.get(tree_id, include_tests, tests_fingerprint)? {
+                return Ok(RunTestScores {
+                    tree_id,
+                    tests_fingerprint,
+                    scores,
+                });
             }
         }
-        Ok(results_data)
+
+        let base_root = repo.find_tree(base.tree_id)?;
+        let diff = repo.diff_tree_to_tree(Some(&base_root), Some(&root), None)?;
+
+        let mut scores = base.scores.clone();
+        for delta in diff.deltas() {
+            let file = if delta.status() == git2::Delta::Deleted {
+                delta.old_file()
+            } else {
+                delta.new_file()
+            };
+            let path = file
+                .path()
+                .and_then(|path| path.to_str())
+                .ok_or_else(|| Error::String("Results path is not valid utf8".into()))?;
+            let test_id = test_id_from_path(path)?;
+            if !include_tests.contains(&test_id) {
+                continue;
+            }
+            if delta.status() == git2::Delta::Deleted {
+                scores.remove(&test_id);
+            } else {
+                let results = read_cached_results(repo, file.id())?;
+                scores.insert(test_id, TestScore::from_results(&results));
+            }
+        }
+        if let Some(store) = store {
+            store.insert(tree_id, include_tests, tests_fingerprint, &scores)?;
+        }
+        Ok(RunTestScores {
+            tree_id,
+            tests_fingerprint,
+            scores,
+        })
     }
 }
 
@@ -113,6 +548,97 @@ impl GeckoResultsCache {
     }
 }
 
+/// Filter on run_info properties. A run matches if, for every key in the
+/// filter that's also in its run_info, the values are equal.
+pub type RunInfoFilter = BTreeMap<String, serde_json::Value>;
+
+/// Numeric value of a number or boolean, since Python compares
+/// `True == 1` and `64 == 64.0`.
+fn run_info_number(value: &serde_json::Value) -> Option<serde_json::Number> {
+    match value {
+        serde_json::Value::Bool(value) => Some(serde_json::Number::from(*value as u8)),
+        serde_json::Value::Number(value) => Some(value.clone()),
+        _ => None,
+    }
+}
+
+fn run_info_number_eq(run_value: &serde_json::Number, filter_value: &serde_json::Number) -> bool {
+    if let (Some(run_value), Some(filter_value)) = (run_value.as_i64(), filter_value.as_i64()) {
+        return run_value == filter_value;
+    }
+    if let (Some(run_value), Some(filter_value)) = (run_value.as_u64(), filter_value.as_u64()) {
+        return run_value == filter_value;
+    }
+    run_value.as_f64() == filter_value.as_f64()
+}
+
+/// Compare a run_info value with a filter value the same way as Python's
+/// `==` compares the equivalent Python values.
+fn run_info_value_eq(run_value: &serde_json::Value, filter_value: &serde_json::Value) -> bool {
+    match (run_value, filter_value) {
+        (serde_json::Value::Array(run_value), serde_json::Value::Array(filter_value)) => {
+            run_value.len() == filter_value.len()
+                && run_value
+                    .iter()
+                    .zip(filter_value.iter())
+                    .all(|(run_item, filter_item)| run_info_value_eq(run_item, filter_item))
+        }
+        (serde_json::Value::Object(run_value), serde_json::Value::Object(filter_value)) => {
+            run_value.len() == filter_value.len()
+                && run_value.iter().all(|(key, run_item)| {
+                    filter_value
+                        .get(key)
+                        .is_some_and(|filter_item| run_info_value_eq(run_item, filter_item))
+                })
+        }
+        _ => match (run_info_number(run_value), run_info_number(filter_value)) {
+            (Some(run_value), Some(filter_value)) => run_info_number_eq(&run_value, &filter_value),
+            _ => run_value == filter_value,
+        },
+    }
+}
+
+impl GeckoRun {
+    pub fn matches(&self, run_info_filter: &RunInfoFilter) -> bool {
+        run_info_filter.iter().all(|(key, filter_value)| {
+            self.run_info
+                .get(key)
+                .is_none_or(|run_value| run_info_value_eq(run_value, filter_value))
+        })
+    }
+}
+
+/// Read the runs for each commit on a given date, or None if there's no
+/// data for that date.
+fn read_date_runs(
+    repo: &git2::Repository,
+    index_tree: &git2::Tree,
+    branch: &str,
+    date: NaiveDate,
+) -> Result<Option<BTreeMap<String, GeckoRuns>>> {
+    let date_str = date.format("%Y-%m-%d");
+    let date_path = PathBuf::from(format!("runs/{}/{}/revision/", branch, date_str));
+    let tree_entry = match index_tree.get_path(&date_path) {
+        Ok(tree_entry) => tree_entry,
+        Err(_) => return Ok(None),
+    };
+    let mut date_entries = BTreeMap::new();
+    let commit_tree = tree_entry.to_object(repo)?.peel_to_tree()?;
+    for commit_entry in commit_tree.iter() {
+        if let Ok(name) = commit_entry.name() {
+            if !name.ends_with(".json") {
+                continue;
+            }
+            let commit = &name[..name.len() - 5];
+            if let Ok(commit_blob) = commit_entry.to_object(repo)?.peel_to_blob() {
+                let commit_entries: GeckoRuns = serde_json::from_slice(commit_blob.content())?;
+                date_entries.insert(commit.into(), commit_entries);
+            }
+        }
+    }
+    Ok(Some(date_entries))
+}
+
 impl GeckoResultsCache {
     pub fn get_runs(
         self,
@@ -129,24 +655,7 @@ impl GeckoResultsCache {
         let mut rv = BTreeMap::new();
         let last_date = to_date.unwrap_or_else(|| chrono::Utc::now().date_naive());
         while date <= last_date {
-            let date_str = date.format("%Y-%m-%d");
-            let date_path = PathBuf::from(format!("runs/{}/{}/revision/", branch, date_str));
-            let mut date_entries = BTreeMap::new();
-            if let Ok(tree_entry) = index_tree.get_path(&date_path) {
-                let commit_tree = tree_entry.to_object(repo)?.peel_to_tree()?;
-                for commit_entry in commit_tree.iter() {
-                    if let Ok(name) = commit_entry.name() {
-                        if !name.ends_with(".json") {
-                            continue;
-                        }
-                        let commit = &name[..name.len() - 5];
-                        if let Ok(commit_blob) = commit_entry.to_object(repo)?.peel_to_blob() {
-                            let commit_entries: GeckoRuns =
-                                serde_json::from_slice(commit_blob.content())?;
-                            date_entries.insert(commit.into(), commit_entries);
-                        }
-                    }
-                }
+            if let Some(date_entries) = read_date_runs(repo, &index_tree, branch, date)? {
                 rv.insert(date, date_entries);
             }
             if let Some(next_date) = date.succ_opt() {
@@ -158,6 +667,79 @@ impl GeckoResultsCache {
         }
         Ok(rv)
     }
+
+    /// Iterate over the runs for each commit in a date range, keeping only
+    /// the runs that match `run_info_filter`.
+    ///
+    /// Each date is only read once the runs for the previous date have been
+    /// consumed, and commits with no matching runs are skipped.
+    pub fn iter_runs(
+        self,
+        branch: &str,
+        from_date: NaiveDate,
+        to_date: Option<NaiveDate>,
+        run_info_filter: RunInfoFilter,
+    ) -> Result<GeckoRunsIter> {
+        let index_tree_id = self
+            .repo
+            .find_reference("refs/runs/index")?
+            .peel_to_tree()?
+            .id();
+        Ok(GeckoRunsIter {
+            repo: self.repo,
+            index_tree_id,
+            branch: branch.into(),
+            date: Some(from_date),
+            last_date: to_date.unwrap_or_else(|| chrono::Utc::now().date_naive()),
+            run_info_filter,
+            pending: VecDeque::new(),
+        })
+    }
+}
+
+/// Iterator over `(date, commit, runs)` for Gecko runs, in date order.
+pub struct GeckoRunsIter {
+    repo: git2::Repository,
+    index_tree_id: git2::Oid,
+    branch: String,
+    /// Next date to read, or None once all the dates have been read
+    date: Option<NaiveDate>,
+    last_date: NaiveDate,
+    run_info_filter: RunInfoFilter,
+    pending: VecDeque<(NaiveDate, String, GeckoRuns)>,
+}
+
+impl GeckoRunsIter {
+    fn read_next_date(&mut self, date: NaiveDate) -> Result<()> {
+        let index_tree = self.repo.find_tree(self.index_tree_id)?;
+        if let Some(date_entries) = read_date_runs(&self.repo, &index_tree, &self.branch, date)? {
+            for (commit, mut commit_runs) in date_entries.into_iter() {
+                commit_runs
+                    .runs
+                    .retain(|_, run| run.matches(&self.run_info_filter));
+                if !commit_runs.runs.is_empty() {
+                    self.pending.push_back((date, commit, commit_runs));
+                }
+            }
+        }
+        Ok(())
+    }
+}
+
+impl Iterator for GeckoRunsIter {
+    type Item = Result<(NaiveDate, String, GeckoRuns)>;
+
+    fn next(&mut self) -> Option<Self::Item> {
+        while self.pending.is_empty() {
+            let date = self.date.filter(|date| *date <= self.last_date)?;
+            self.date = date.succ_opt();
+            if let Err(err) = self.read_next_date(date) {
+                self.date = None;
+                return Some(Err(err));
+            }
+        }
+        self.pending.pop_front().map(Ok)
+    }
 }
 
 impl ResultsCache for GeckoResultsCache {
@@ -170,11 +752,670 @@ impl ResultsCache for GeckoResultsCache {
     }
 }
 
+/// Check if a results repository uses the Gecko layout rather than
+/// the wpt.fyi results cache layout.
+fn is_gecko_layout(repo: &git2::Repository) -> bool {
+    repo.find_reference("refs/runs/index").is_ok()
+}
+
 pub fn get(results_repo: &Path) -> Result<Box<dyn ResultsCache>> {
     let repo = git2::Repository::open(results_repo)?;
-    if repo.find_reference("refs/runs/index").is_ok() {
+    if is_gecko_layout(&repo) {
         Ok(Box::new(GeckoResultsCache::new(results_repo)?))
     } else {
         Ok(Box::new(WptfyiResultsCache::new(results_repo)?))
     }
 }
+
+/// Tree of results blobs to be written to a results repository.
+#[derive(Debug, Default)]
+struct ResultsTreeBuilder {
+    children: BTreeMap<String, ResultsTreeBuilder>,
+    blobs: BTreeMap<String, git2::Oid>,
+}
+
+impl ResultsTreeBuilder {
+    fn insert(&mut self, test_id: &str, blob_id: git2::Oid) {
+        let (dir, name) = split_test_id(test_id);
+        let mut node = self;
+        for component in dir.split('/').filter(|x| !x.is_empty()) {
+            node = node.children.entry(component.to_string()).or_default();
+        }
+        node.blobs
+            .insert(format!("{}.json", urlencoding::encode(name)), blob_id);
+    }
+
+    fn write(&self, repo: &git2::Repository) -> Result<git2::Oid> {
+        let mut builder = repo.treebuilder(None)?;
+        for (name, child) in self.children.iter() {
+            builder.insert(name, child.write(repo)?, 0o040000)?;
+        }
+        for (name, blob_id) in self.blobs.iter() {
+            builder.insert(name, *blob_id, 0o100644)?;
+        }
+        Ok(builder.write()?)
+    }
+}
+
+/// Write the results in a set of wptreport files into the results
+/// repository at `results_repo`, as the run `run_id`.
+///
+/// The results use the same layout as the wpt.fyi results cache, so
+/// the run can be loaded like any other run. The repository is
+/// created as a bare repository if it doesn't already exist; it's an
+/// error to import into a repository with the Gecko layout. SKIP
+/// results are ignored, and where a test has results in more than one
+/// report the last one is used. Returns the id of the results tree.
+pub fn import_wptreports(
+    results_repo: &Path,
+    run_id: &str,
+    paths: &[PathBuf],
+) -> Result<git2::Oid> {
+    let repo = if results_repo.exists() {
+        git2::Repository::open(results_repo)?
+    } else {
+        git2::Repository::init_bare(results_repo)?
+    };
+    if is_gecko_layout(&repo) {
+        return Err(Error::String(format!(
+            "Can't import wptreport files into {}, which uses the Gecko results layout",
+            results_repo.display()
+        )));
+    }
+
+    let mut results = BTreeMap::new();
+    for path in paths {
+        for (test_id, test_results) in crate::wptreport::read_wptreport(path, None)? {
+            if test_results.status != crate::TestStatus::Skip {
+                results.insert(test_id, test_results);
+            }
+        }
+    }
+
+    let mut tree = ResultsTreeBuilder::default();
+    for (test_id, test_results) in results.iter() {
+        // Identical results are stored as the same blob
+        let blob_id = repo.blob(&serde_json::to_vec(test_results)?)?;
+        tree.insert(test_id, blob_id);
+    }
+    let tree_id = tree.write(&repo)?;
+    repo.reference(
+        &format!("refs/tags/run/{}/results", run_id),
+        tree_id,
+        true,
+        &format!("Import results for run {}", run_id),
+    )?;
+    Ok(tree_id)
+}
+
+/// Run `f` for each of `run_ids`, using up to `threads` worker threads.
+///
+/// Each worker opens its own handle to the repository at
+/// `results_repo`. The return values are in the same order as
+/// `run_ids`.
+fn map_runs<T, F>(results_repo: &Path, run_ids: &[String], threads: usize, f: F) -> Result<Vec<T>>
+where
+    T: Send,
+    F: Fn(&dyn ResultsCache, &str) -> Result<T> + Sync,
+{
+    crate::map_parallel_with(
+        run_ids,
+        threads,
+        || get(results_repo),
+        |results_cache, run_id| f(results_cache.as_ref(), run_id),
+    )
+}
+
+/// Compute the per-test scores for several runs, using up to `threads`
+/// worker threads and the score store, if provided.
+///
+/// The returned scores are in the same order as `run_ids`.
+pub fn load_test_scores(
+    results_repo: &Path,
+    run_ids: &[String],
+    include_tests: &BTreeSet<String>,
+    store: Option<&TestScoreStore>,
+    threads: usize,
+) -> Result<Vec<RunTestScores>> {
+    map_runs(results_repo, run_ids, threads, |results_cache, run_id| {
+        results_cache.test_scores(run_id, include_tests, store)
+    })
+}
+
+/// Scores for a group of runs, as returned by `score_runs`
+pub type GroupScores = (RunScores, InteropScore, ExpectedFailureScores);
+
+/// Check if an error was caused by a run not being present in the repository.
+pub fn is_missing_run(err: &Error) -> bool {
+    matches!(err, Error::Git(err) if err.code() == git2::ErrorCode::NotFound)
+}
+
+/// Compute the Interop scores for several groups of runs.
+///
+/// Each distinct run is loaded once, however many groups it appears
+/// in. Groups containing a run that isn't in the repository get `None`.
+pub fn score_run_groups(
+    results_repo: &Path,
+    groups: &[Vec<String>],
+    tests_by_category: &BTreeMap<String, BTreeSet<String>>,
+    expected_not_ok: &BTreeSet<String>,
+    store: Option<&TestScoreStore>,
+    threads: usize,
+) -> Result<Vec<Option<GroupScores>>> {
+    let mut all_tests = BTreeSet::new();
+    for tests in tests_by_category.values() {
+        all_tests.extend(tests.iter().cloned());
+    }
+    let run_ids = groups
+        .iter()
+        .flatten()
+        .cloned()
+        .collect::<BTreeSet<_>>()
+        .into_iter()
+        .collect::<Vec<_>>();
+
+    let loaded =
+        map_runs(
+            results_repo,
+            &run_ids,
+            threads,
+            |results_cache, run_id| match results_cache.test_scores(run_id, &all_tests, store) {
+                Ok(scores) => Ok(Some(scores)),
+                Err(err) if is_missing_run(&err) => Ok(None),
+                Err(err) => Err(err),
+            },
+        )?;
+    let scores_by_run = run_ids
+        .iter()
+        .map(|run_id| run_id.as_str())
+        .zip(loaded)
+        .collect::<BTreeMap<_, _>>();
+
+    Ok(groups
+        .iter()
+        .map(|group| {
+            let group_scores = group
+                .iter()
+                .map(|run_id| {
+                    scores_by_run
+                        .get(run_id.as_str())
+                        .and_then(|scores| scores.as_ref())
+                })
+                .collect::<Option<Vec<_>>>()?;
+            Some(crate::score_test_scores(
+                group_scores.into_iter().map(|scores| &scores.scores),
+                tests_by_category,
+                expected_not_ok,
+            ))
+        })
+        .collect())
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::test_util::{
+        peak_allocated, reset_peak_allocated, synthetic_results, synthetic_tests, time_best_of,
+        TempDir,
+    };
+
+    #[test]
+    fn run_info_values() {
+        use serde_json::json;
+
+        for (run_value, filter_value) in [
+            (json!(64), json!(64.0)),
+            (json!(true), json!(1)),
+            (json!(false), json!(0.0)),
+            (json!([1, "a", [true]]), json!([true, "a", [1]])),
+            (json!({"a": 1, "b": [false]}), json!({"b": [0], "a": true})),
+            (json!(null), json!(null)),
+        ] {
+            assert!(
+                run_info_value_eq(&run_value, &filter_value),
+                "{run_value} != {filter_value}"
+            );
+        }
+        for (run_value, filter_value) in [
+            (json!(2), json!(true)),
+            (json!("1"), json!(1)),
+            (json!([1]), json!([1, 1])),
+            (json!({"a": 1}), json!({"a": 1, "b": 2})),
+            (json!(9007199254740993u64), json!(9007199254740992u64)),
+            (json!(null), json!(false)),
+        ] {
+            assert!(
+                !run_info_value_eq(&run_value, &filter_value),
+                "{run_value} == {filter_value}"
+            );
+        }
+    }
+
+    #[test]
+    fn blob_cache_evicts_least_recently_used() {
+        let oids = (0..4u8)
+            .map(|idx| git2::Oid::from_bytes(&[idx; 20]).unwrap())
+            .collect::<Vec<_>>();
+        let mut cache = BlobCache::new(2);
+        cache.insert(oids[0], Arc::new(synthetic_results(0)));
+        cache.insert(oids[1], Arc::new(synthetic_results(1)));
+        // Using the first entry makes the second the least recently used
+        assert!(cache.get(&oids[0]).is_some());
+        cache.insert(oids[2], Arc::new(synthetic_results(2)));
+        assert!(cache.get(&oids[1]).is_none());
+        assert!(cache.get(&oids[0]).is_some());
+        assert!(cache.get(&oids[2]).is_some());
+
+        let results = Arc::new(synthetic_results(3));
+        cache.insert(oids[3], results.clone());
+        assert!(cache.get(&oids[0]).is_none());
+        // Hits share the cached results rather than copying them
+        assert!(Arc::ptr_eq(&cache.get(&oids[3]).unwrap(), &results));
+        assert_eq!(cache.entries.len(), 2);
+        assert_eq!(cache.lru.len(), 2);
+
+        cache.set_capacity(1);
+        assert!(cache.get(&oids[2]).is_none());
+        assert!(cache.get(&oids[3]).is_some());
+
+        cache.set_capacity(0);
+        cache.insert(oids[0], Arc::new(synthetic_results(0)));
+        assert!(cache.entries.is_empty());
+        assert!(cache.lru.is_empty());
+    }
+
+    /// Write a run with synthetic results for each of `tests` to `repo`
+    fn write_run(repo: &git2::Repository, run_id: &str, tests: &[String], seed: usize) {
+        write_run_results(
+            repo,
+            run_id,
+            tests
+                .iter()
+                .enumerate()
+                .map(|(idx, test_id)| (test_id.as_str(), synthetic_results(idx + seed))),
+        )
+    }
+
+    /// Write a run with the given results for each test to `repo`
+    fn write_run_results<'a>(
+        repo: &git2::Repository,
+        run_id: &str,
+        results: impl Iterator<Item = (&'a str, Results)>,
+    ) {
+        let mut tree = ResultsTreeBuilder::default();
+        for (test_id, test_results) in results {
+            let blob_id = repo
+                .blob(&serde_json::to_vec(&test_results).unwrap())
+                .unwrap();
+            tree.insert(test_id, blob_id);
+        }
+        let tree_id = tree.write(repo).unwrap();
+        repo.reference(
+            &format!("refs/tags/run/{}/results", run_id),
+            tree_id,
+            true,
+            "Synthetic run",
+        )
+        .unwrap();
+    }
+
+    fn synthetic_repo(dir: &Path, tests: &[String], num_runs: usize) -> Vec<String> {
+        let repo = git2::Repository::init_bare(dir).unwrap();
+        let run_ids = (0..num_runs)
+            .map(|idx| format!("run{}", idx))
+            .collect::<Vec<_>>();
+        for (idx, run_id) in run_ids.iter().enumerate() {
+            write_run(&repo, run_id, tests, idx * 13);
+        }
+        run_ids
+    }
+
+    fn run_tree<'repo>(repo: &'repo git2::Repository, run_id: &str) -> git2::Tree<'repo> {
+        repo.find_reference(&format!("refs/tags/run/{}/results", run_id))
+            .unwrap()
+            .peel_to_tree()
+            .unwrap()
+    }
+
+    /// Results as JSON, so they can be compared
+    fn results_json(results: &BTreeMap<String, Results>) -> serde_json::Value {
+        serde_json::to_value(results).unwrap()
+    }
+
+    #[test]
+    fn subset_matches_full_walk() {
+        let dir = TempDir::new("subset-walk");
+        let mut tests = synthetic_tests(300, 10);
+        let extra_tests = [
+            "/root.html",
+            "/a/b/query.html?x=/y/z",
+            "/a/b/query.html?x=1",
+            "/a/b/query.html?path=/a/b/c.html",
+        ];
+        tests.extend(extra_tests.iter().map(|x| x.to_string()));
+        synthetic_repo(dir.path(), &tests, 1);
+        let repo = git2::Repository::open(dir.path()).unwrap();
+
+        let full = tree_results(&repo, run_tree(&repo, "run0"), None).unwrap();
+        assert_eq!(full.len(), tests.len());
+        for test_id in extra_tests {
+            assert!(full.contains_key(test_id), "{test_id} missing");
+        }
+
+        let missing = [
+            "/dir0/missing.html",
+            "/missing/test.html",
+            "/a/b/query.html",
+        ];
+        let small = tests
+            .iter()
+            .step_by(50)
+            .map(|x| x.as_str())
+            .chain(extra_tests)
+            .chain(missing)
+            .map(|x| x.to_string())
+            .collect::<BTreeSet<_>>();
+        let large = tests
+            .iter()
+            .step_by(2)
+            .map(|x| x.as_str())
+            .chain(extra_tests)
+            .chain(missing)
+            .map(|x| x.to_string())
+            .collect::<BTreeSet<_>>();
+        assert!(small.len() <= DIRECT_LOOKUP_MAX_TESTS);
+        assert!(large.len() > DIRECT_LOOKUP_MAX_TESTS);
+
+        for include in [small, large] {
+            let expected = full
+                .iter()
+                .filter(|(test_id, _)| include.contains(*test_id))
+                .map(|(test_id, results)| (test_id.clone(), results.clone()))
+                .collect::<BTreeMap<_, _>>();
+            assert_eq!(expected.len(), include.len() - missing.len());
+            let subset = tree_results(&repo, run_tree(&repo, "run0"), Some(&include)).unwrap();
+            assert_eq!(results_json(&subset), results_json(&expected));
+        }
+    }
+
+    #[test]
+    fn lookup_blob_name_spellings() {
+        let dir = TempDir::new("lookup-names");
+        let repo = git2::Repository::init_bare(dir.path()).unwrap();
+        let results = synthetic_results(1);
+        let blob_id = repo.blob(&serde_json::to_vec(&results).unwrap()).unwrap();
+        let mut dir_builder = repo.treebuilder(None).unwrap();
+        for name in [
+            "it's(1).html.json",
+            "it%27s%282%29.html.json",
+            "a%20b.html.json",
+        ] {
+            dir_builder.insert(name, blob_id, 0o100644).unwrap();
+        }
+        let mut root_builder = repo.treebuilder(None).unwrap();
+        root_builder
+            .insert("dir", dir_builder.write().unwrap(), 0o040000)
+            .unwrap();
+        let root = repo.find_tree(root_builder.write().unwrap()).unwrap();
+
+        let include = ["/dir/it's(1).html", "/dir/it's(2).html", "/dir/a b.html"]
+            .iter()
+            .map(|x| x.to_string())
+            .collect::<BTreeSet<_>>();
+        let walked = tree_results(&repo, root.clone(), None).unwrap();
+        let looked_up = tree_results(&repo, root, Some(&include)).unwrap();
+        assert_eq!(walked.keys().cloned().collect::<BTreeSet<_>>(), include);
+        assert_eq!(results_json(&looked_up), results_json(&walked));
+    }
+
+    #[test]
+    fn test_scores_from_base_matches_full() {
+        let dir = TempDir::new("scores-from-base");
+        let repo = git2::Repository::init_bare(dir.path()).unwrap();
+        let tests = synthetic_tests(220, 10);
+        // The head run drops the first 20 tests, changes the results of
+        // the next 20, and adds the last 20
+        let (base_tests, added_tests) = tests.split_at(200);
+        write_run_results(
+            &repo,
+            "base",
+            base_tests
+                .iter()
+                .enumerate()
+                .map(|(idx, test_id)| (test_id.as_str(), synthetic_results(idx))),
+        );
+        write_run_results(
+            &repo,
+            "head",
+            tests.iter().enumerate().skip(20).map(|(idx, test_id)| {
+                let seed = if idx < 40 { idx + 1 } else { idx };
+                (test_id.as_str(), synthetic_results(seed))
+            }),
+        );
+        // Leave out some tests, including some of each kind of change
+        let include_tests = tests
+            .iter()
+            .enumerate()
+            .filter(|(idx, _)| idx % 7 != 3)
+            .map(|(_, test_id)| test_id.clone())
+            .collect::<BTreeSet<_>>();
+
+        let results_cache = get(dir.path()).unwrap();
+        let base = results_cache
+            .test_scores("base", &include_tests, None)
+            .unwrap();
+        let expected = results_cache
+            .test_scores("head", &include_tests, None)
+            .unwrap();
+        assert!(base.scores.contains_key(&tests[0]));
+        assert!(!expected.scores.contains_key(&tests[0]));
+        assert!(!base.scores.contains_key(&added_tests[0]));
+        assert!(expected.scores.contains_key(&added_tests[0]));
+        assert_ne!(base.scores.get(&tests[21]), expected.scores.get(&tests[21]));
+
+        let store_dir = TempDir::new("scores-from-base-store");
+        let store = TestScoreStore::new(store_dir.path()).unwrap();
+        // With the store, the second pass reads the entry written by the first
+        for store in [None, Some(&store), Some(&store)] {
+            let head = results_cache
+                .test_scores_from_base(&base, "head", &include_tests, store)
+                .unwrap();
+            assert_eq!(head.tree_id, expected.tree_id);
+            assert_eq!(head.tests_fingerprint, expected.tests_fingerprint);
+            assert_eq!(head.scores, expected.scores);
+        }
+        assert_eq!(
+            store
+                .get(expected.tree_id, &include_tests, expected.tests_fingerprint)
+                .unwrap(),
+            Some(expected.scores.clone())
+        );
+
+        // An unchanged tree gives the base scores
+        let unchanged = results_cache
+            .test_scores_from_base(&base, "base", &include_tests, None)
+            .unwrap();
+        assert_eq!(unchanged.scores, base.scores);
+
+        // Scores for a different set of tests can't be used as the base
+        let other_tests = include_tests
+            .iter()
+            .skip(1)
+            .cloned()
+            .collect::<BTreeSet<_>>();
+        let other = results_cache
+            .test_scores_from_base(&base, "head", &other_tests, None)
+            .unwrap();
+        assert_eq!(
+            other.tests_fingerprint,
+            crate::tests_fingerprint(&other_tests)
+        );
+        assert_eq!(
+            other.scores,
+            results_cache
+                .test_scores("head", &other_tests, None)
+                .unwrap()
+                .scores
+        );
+    }
+
+    #[test]
+    fn score_store_shared_between_identical_runs() {
+        let dir = TempDir::new("score-store-shared");
+        let tests = synthetic_tests(50, 5);
+        let repo = git2::Repository::init_bare(dir.path()).unwrap();
+        write_run(&repo, "run0", &tests, 0);
+        write_run(&repo, "run1", &tests, 0);
+        let include_tests = tests.iter().cloned().collect::<BTreeSet<_>>();
+        let store_dir = TempDir::new("score-store-shared-store");
+        let store = TestScoreStore::new(store_dir.path()).unwrap();
+
+        let results_cache = get(dir.path()).unwrap();
+        let run0 = results_cache
+            .test_scores("run0", &include_tests, Some(&store))
+            .unwrap();
+        let run1 = results_cache
+            .test_scores("run1", &include_tests, Some(&store))
+            .unwrap();
+        assert_eq!(run0.tree_id, run1.tree_id);
+        assert_eq!(run0.scores, run1.scores);
+
+        let entries = std::fs::read_dir(store_dir.path())
+            .unwrap()
+            .map(|entry| std::fs::read_dir(entry.unwrap().path()).unwrap().count())
+            .sum::<usize>();
+        assert_eq!(entries, 1);
+    }
+
+    #[test]
+    fn import_wptreports_read_back() {
+        let dir = TempDir::new("import-wptreports");
+        let report_path = dir.path().join("wptreport.json");
+        let report = serde_json::json!({
+            "results": [
+                {"test": "/a/test1.html", "status": "OK", "subtests": [
+                    {"name": "first", "status": "PASS"},
+                    {"name": "second", "status": "FAIL"},
+                ]},
+                {"test": "/a/b/test2.html?x=/y", "status": "FAIL"},
+                {"test": "/root.html", "status": "PASS"},
+                {"test": "/a/skipped.html", "status": "SKIP"},
+            ]
+        });
+        std::fs::write(&report_path, serde_json::to_vec(&report).unwrap()).unwrap();
+        let repo_path = dir.path().join("results");
+
+        let tree_id = import_wptreports(&repo_path, "1", &[report_path.clone()]).unwrap();
+        let results_cache = get(&repo_path).unwrap();
+        assert_eq!(results_cache.results_tree("1").unwrap().id(), tree_id);
+        let expected = crate::wptreport::read_wptreport(&report_path, None)
+            .unwrap()
+            .into_iter()
+            .filter(|(_, results)| results.status != crate::TestStatus::Skip)
+            .collect::<BTreeMap<_, _>>();
+        assert_eq!(expected.len(), 3);
+        assert_eq!(
+            results_json(&results_cache.results("1", None).unwrap()),
+            results_json(&expected)
+        );
+
+        // Re-importing the same results gives the same tree
+        assert_eq!(
+            import_wptreports(&repo_path, "2", &[report_path.clone()]).unwrap(),
+            tree_id
+        );
+    }
+
+    #[test]
+    fn import_wptreports_gecko_layout() {
+        let dir = TempDir::new("import-wptreports-gecko");
+        let report_path = dir.path().join("wptreport.json");
+        std::fs::write(&report_path, br#"{"results": []}"#).unwrap();
+        let repo_path = dir.path().join("results");
+        let repo = git2::Repository::init_bare(&repo_path).unwrap();
+        let empty_tree = repo.treebuilder(None).unwrap().write().unwrap();
+        repo.reference("refs/runs/index", empty_tree, false, "Gecko index")
+            .unwrap();
+
+        assert!(import_wptreports(&repo_path, "1", &[report_path]).is_err());
+        assert!(repo.find_reference("refs/tags/run/1/results").is_err());
+    }
+
+    #[test]
+    fn load_test_scores_threads_match() {
+        let dir = TempDir::new("load-scores");
+        let tests = synthetic_tests(500, 20);
+        let run_ids = synthetic_repo(dir.path(), &tests, 6);
+        let include_tests = tests.iter().skip(1).cloned().collect::<BTreeSet<_>>();
+
+        let serial = load_test_scores(dir.path(), &run_ids, &include_tests, None, 1).unwrap();
+        let parallel = load_test_scores(dir.path(), &run_ids, &include_tests, None, 4).unwrap();
+        assert_eq!(serial.len(), run_ids.len());
+        for (serial_run, parallel_run) in serial.iter().zip(parallel.iter()) {
+            assert_eq!(serial_run.tree_id, parallel_run.tree_id);
+            assert_eq!(serial_run.scores, parallel_run.scores);
+            assert_eq!(serial_run.scores.len(), include_tests.len());
+        }
+    }
+
+    #[test]
+    #[ignore = "benchmark"]
+    fn bench_load_test_scores_threads() {
+        let dir = TempDir::new("bench-load-scores");
+        let tests = synthetic_tests(20_000, 500);
+        let run_ids = synthetic_repo(dir.path(), &tests, 16);
+        let include_tests = tests.iter().cloned().collect::<BTreeSet<_>>();
+
+        for threads in [1, 2, 4, 8] {
+            let elapsed = time_best_of(3, || {
+                clear_blob_cache();
+                load_test_scores(dir.path(), &run_ids, &include_tests, None, threads).unwrap()
+            });
+            println!(
+                "load_test_scores: {} runs x {} tests, {} threads: {:?}",
+                run_ids.len(),
+                tests.len(),
+                threads,
+                elapsed
+            );
+        }
+    }
+
+    #[test]
+    #[ignore = "benchmark"]
+    fn bench_whole_run_memory() {
+        let dir = TempDir::new("bench-run-memory");
+        let tests = synthetic_tests(100_000, 1000);
+        let run_ids = synthetic_repo(dir.path(), &tests, 2);
+        clear_blob_cache();
+        let results_cache = get(dir.path()).unwrap();
+
+        let base = reset_peak_allocated();
+        let full = run_ids
+            .iter()
+            .map(|run_id| results_cache.results(run_id, None).unwrap())
+            .collect::<Vec<_>>();
+        let full_peak = peak_allocated() - base;
+        drop(full);
+
+        let base = reset_peak_allocated();
+        let mut interner = Interner::new();
+        let compact = run_ids
+            .iter()
+            .map(|run_id| {
+                results_cache
+                    .compact_results(run_id, None, &mut interner)
+                    .unwrap()
+            })
+            .collect::<Vec<_>>();
+        let compact_peak = peak_allocated() - base;
+        drop(compact);
+
+        println!(
+            "Peak heap loading 2 runs x {} tests: BTreeMap<String, Results> {} MiB, CompactResults {} MiB",
+            tests.len(),
+            full_peak / (1024 * 1024),
+            compact_peak / (1024 * 1024)
+        );
+    }
+}
@@ -0,0 +1,236 @@
+use crate::{Result, TestScore, TestScores};
+use git2;
+use serde_derive::{Deserialize, Serialize};
+use serde_json;
+use std::collections::{BTreeMap, BTreeSet};
+use std::fs;
+use std::io;
+use std::path::{Path, PathBuf};
+
+#[derive(Debug, Deserialize, Serialize)]
+struct StoredTestScores {
+    num_tests: usize,
+    // (index of test in the sorted test set, passes, total, expected failures, is ok)
+    scores: Vec<(usize, u64, u64, u64, bool)>,
+}
+
+/// On-disk store of per-test scores.
+///
+/// Entries are keyed by the OID of the results tree and the
+/// fingerprint of the set of tests that were scored, so runs with
+/// identical results trees share a single entry. Tests are stored by
+/// their index in the sorted test set rather than by name.
+pub struct TestScoreStore {
+    path: PathBuf,
+}
+
+impl TestScoreStore {
+    pub fn new(path: &Path) -> Result<TestScoreStore> {
+        fs::create_dir_all(path)?;
+        Ok(TestScoreStore { path: path.into() })
+    }
+
+    fn entry_path(&self, tree_id: git2::Oid, tests_fingerprint: u64) -> PathBuf {
+        self.path
+            .join(format!("{:016x}", tests_fingerprint))
+            .join(format!("{}.json", tree_id))
+    }
+
+    /// Get the stored scores for a results tree, if any.
+    ///
+    /// `tests_fingerprint` must be the fingerprint of `include_tests`.
+    pub fn get(
+        &self,
+        tree_id: git2::Oid,
+        include_tests: &BTreeSet<String>,
+        tests_fingerprint: u64,
+    ) -> Result<Option<TestScores>> {
+        let data = match fs::read(self.entry_path(tree_id, tests_fingerprint)) {
+            Ok(data) => data,
+            Err(err) if err.kind() == io::ErrorKind::NotFound => return Ok(None),
+            Err(err) => return Err(err.into()),
+        };
+        // A corrupt entry is treated as missing, so it will be overwritten
+        let stored: StoredTestScores = match serde_json::from_slice(&data) {
+            Ok(stored) => stored,
+            Err(_) => return Ok(None),
+        };
+        if stored.num_tests != include_tests.len() {
+            return Ok(None);
+        }
+        let tests = include_tests.iter().collect::<Vec<_>>();
+        let mut scores = BTreeMap::new();
+        for (idx, passes, total, expected_failures, is_ok) in stored.scores.into_iter() {
+            let Some(test_id) = tests.get(idx) else {
+                return Ok(None);
+            };
+            scores.insert(
+                (*test_id).clone(),
+                TestScore::new(passes, total, expected_failures, is_ok),
+            );
+        }
+        Ok(Some(scores))
+    }
+
+    /// Store the scores for a results tree.
+    ///
+    /// `tests_fingerprint` must be the fingerprint of `include_tests`.
+    pub fn insert(
+        &self,
+        tree_id: git2::Oid,
+        include_tests: &BTreeSet<String>,
+        tests_fingerprint: u64,
+        scores: &TestScores,
+    ) -> Result<()> {
+        let index = include_tests
+            .iter()
+            .enumerate()
+            .map(|(idx, test_id)| (test_id.as_str(), idx))
+            .collect::<BTreeMap<_, _>>();
+        let stored = StoredTestScores {
+            num_tests: include_tests.len(),
+            scores: scores
+                .iter()
+                .filter_map(|(test_id, score)| {
+                    index.get(test_id.as_str()).map(|idx| {
+                        (
+                            *idx,
+                            score.passes,
+                            score.total,
+                            score.expected_failures,
+                            score.is_ok,
+                        )
+                    })
+                })
+                .collect(),
+        };
+
+        let path = self.entry_path(tree_id, tests_fingerprint);
+        if let Some(parent) = path.parent() {
+            fs::create_dir_all(parent)?;
+        }
+        crate::write_atomic(&path, &serde_json::to_vec(&stored)?)
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::test_util::{synthetic_tests, TempDir};
+
+    fn test_set(num_tests: usize) -> BTreeSet<String> {
+        synthetic_tests(num_tests, 5).into_iter().collect()
+    }
+
+    fn scores(include_tests: &BTreeSet<String>) -> TestScores {
+        include_tests
+            .iter()
+            .enumerate()
+            // Leave out some tests, as if they had no results
+            .filter(|(idx, _)| idx % 4 != 1)
+            .map(|(idx, test_id)| {
+                let idx = idx as u64;
+                (
+                    test_id.clone(),
+                    TestScore::new(idx % 3, 2, idx % 2, idx % 5 != 0),
+                )
+            })
+            .collect()
+    }
+
+    #[test]
+    fn round_trip() {
+        let dir = TempDir::new("score-store-round-trip");
+        let store = TestScoreStore::new(dir.path()).unwrap();
+        let tree_id = git2::Oid::from_bytes(&[1; 20]).unwrap();
+        let include_tests = test_set(20);
+        let fingerprint = crate::tests_fingerprint(&include_tests);
+        let scores = scores(&include_tests);
+
+        assert_eq!(
+            store.get(tree_id, &include_tests, fingerprint).unwrap(),
+            None
+        );
+        store
+            .insert(tree_id, &include_tests, fingerprint, &scores)
+            .unwrap();
+        assert_eq!(
+            store.get(tree_id, &include_tests, fingerprint).unwrap(),
+            Some(scores)
+        );
+        let other_tree_id = git2::Oid::from_bytes(&[2; 20]).unwrap();
+        assert_eq!(
+            store
+                .get(other_tree_id, &include_tests, fingerprint)
+                .unwrap(),
+            None
+        );
+    }
+
+    #[test]
+    fn num_tests_mismatch() {
+        let dir = TempDir::new("score-store-num-tests");
+        let store = TestScoreStore::new(dir.path()).unwrap();
+        let tree_id = git2::Oid::from_bytes(&[1; 20]).unwrap();
+        let include_tests = test_set(20);
+        let fingerprint = crate::tests_fingerprint(&include_tests);
+        store
+            .insert(
+                tree_id,
+                &include_tests,
+                fingerprint,
+                &scores(&include_tests),
+            )
+            .unwrap();
+
+        // As if two test sets had the same fingerprint
+        let other_tests = test_set(21);
+        assert_eq!(store.get(tree_id, &other_tests, fingerprint).unwrap(), None);
+    }
+
+    #[test]
+    fn index_out_of_range() {
+        let dir = TempDir::new("score-store-index");
+        let store = TestScoreStore::new(dir.path()).unwrap();
+        let tree_id = git2::Oid::from_bytes(&[1; 20]).unwrap();
+        let include_tests = test_set(3);
+        let fingerprint = crate::tests_fingerprint(&include_tests);
+        let path = store.entry_path(tree_id, fingerprint);
+        fs::create_dir_all(path.parent().unwrap()).unwrap();
+        fs::write(
+            &path,
+            r#"{"num_tests": 3, "scores": [[0, 1, 1, 0, true], [3, 1, 1, 0, true]]}"#,
+        )
+        .unwrap();
+        assert_eq!(
+            store.get(tree_id, &include_tests, fingerprint).unwrap(),
+            None
+        );
+    }
+
+    #[test]
+    fn corrupt_entry_is_missing() {
+        let dir = TempDir::new("score-store-corrupt");
+        let store = TestScoreStore::new(dir.path()).unwrap();
+        let tree_id = git2::Oid::from_bytes(&[1; 20]).unwrap();
+        let include_tests = test_set(20);
+        let fingerprint = crate::tests_fingerprint(&include_tests);
+        let path = store.entry_path(tree_id, fingerprint);
+        fs::create_dir_all(path.parent().unwrap()).unwrap();
+        fs::write(&path, b"{\"num_tests\": 20, \"scores\": [[0,").unwrap();
+        assert_eq!(
+            store.get(tree_id, &include_tests, fingerprint).unwrap(),
+            None
+        );
+
+        // The corrupt entry is replaced by the next insert
+        let scores = scores(&include_tests);
+        store
+            .insert(tree_id, &include_tests, fingerprint, &scores)
+            .unwrap();
+        assert_eq!(
+            store.get(tree_id, &include_tests, fingerprint).unwrap(),
+            Some(scores)
+        );
+    }
+}
@@ -0,0 +1,152 @@
+//! Helpers shared by the unit tests and benchmarks.
+//!
+//! Benchmarks are `#[ignore]`d tests; run them with
+//! `cargo test --release -- --ignored --nocapture --test-threads=1 bench_`.
+
+use crate::{Results, SubtestResult, SubtestStatus, TestStatus};
+use std::alloc::{GlobalAlloc, Layout, System};
+use std::path::{Path, PathBuf};
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::time::{Duration, Instant};
+
+/// Allocator that tracks the current and peak number of bytes allocated,
+/// so benchmarks can report the peak heap use of a single operation.
+struct CountingAllocator;
+
+static ALLOCATED: AtomicUsize = AtomicUsize::new(0);
+static PEAK_ALLOCATED: AtomicUsize = AtomicUsize::new(0);
+
+fn add_allocated(size: usize) {
+    let allocated = ALLOCATED.fetch_add(size, Ordering::Relaxed) + size;
+    PEAK_ALLOCATED.fetch_max(allocated, Ordering::Relaxed);
+}
+
+unsafe impl GlobalAlloc for CountingAllocator {
+    unsafe fn alloc(&self, layout: Layout) -> *mut u8 {
+        let ptr = System.alloc(layout);
+        if !ptr.is_null() {
+            add_allocated(layout.size());
+        }
+        ptr
+    }
+
+    unsafe fn alloc_zeroed(&self, layout: Layout) -> *mut u8 {
+        let ptr = System.alloc_zeroed(layout);
+        if !ptr.is_null() {
+            add_allocated(layout.size());
+        }
+        ptr
+    }
+
+    unsafe fn dealloc(&self, ptr: *mut u8, layout: Layout) {
+        System.dealloc(ptr, layout);
+        ALLOCATED.fetch_sub(layout.size(), Ordering::Relaxed);
+    }
+
+    unsafe fn realloc(&self, ptr: *mut u8, layout: Layout, new_size: usize) -> *mut u8 {
+        let new_ptr = System.realloc(ptr, layout, new_size);
+        if !new_ptr.is_null() {
+            ALLOCATED.fetch_sub(layout.size(), Ordering::Relaxed);
+            add_allocated(new_size);
+        }
+        new_ptr
+    }
+}
+
+#[global_allocator]
+static GLOBAL: CountingAllocator = CountingAllocator;
+
+/// Reset the peak heap use to the current heap use, and return it.
+pub fn reset_peak_allocated() -> usize {
+    let allocated = ALLOCATED.load(Ordering::Relaxed);
+    PEAK_ALLOCATED.store(allocated, Ordering::Relaxed);
+    allocated
+}
+
+/// Peak heap use in bytes since the last call to `reset_peak_allocated`.
+///
+/// This counts allocations from all threads, so benchmarks using it
+/// should be run with `--test-threads=1`.
+pub fn peak_allocated() -> usize {
+    PEAK_ALLOCATED.load(Ordering::Relaxed)
+}
+
+static TEMP_DIR_COUNTER: AtomicUsize = AtomicUsize::new(0);
+
+/// A directory under the system temporary directory that's removed on drop.
+pub struct TempDir {
+    path: PathBuf,
+}
+
+impl TempDir {
+    pub fn new(prefix: &str) -> TempDir {
+        let path = std::env::temp_dir().join(format!(
+            "wpt-interop-{}-{}-{}",
+            prefix,
+            std::process::id(),
+            TEMP_DIR_COUNTER.fetch_add(1, Ordering::Relaxed)
+        ));
+        std::fs::create_dir_all(&path).expect("Failed to create temporary directory");
+        TempDir { path }
+    }
+
+    pub fn path(&self) -> &Path {
+        &self.path
+    }
+}
+
+impl Drop for TempDir {
+    fn drop(&mut self) {
+        let _ = std::fs::remove_dir_all(&self.path);
+    }
+}
+
+/// Synthetic test ids spread over `num_dirs` directories.
+pub fn synthetic_tests(num_tests: usize, num_dirs: usize) -> Vec<String> {
+    (0..num_tests)
+        .map(|idx| format!("/dir{}/sub{}/test{}.html", idx % num_dirs, idx % 7, idx))
+        .collect()
+}
+
+/// Synthetic results for a test, with a mix of passing and failing subtests
+/// that depends on `seed`.
+pub fn synthetic_results(seed: usize) -> Results {
+    let num_subtests = seed % 5;
+    Results {
+        status: if num_subtests == 0 {
+            if seed % 3 == 0 {
+                TestStatus::Fail
+            } else {
+                TestStatus::Pass
+            }
+        } else if seed % 11 == 0 {
+            TestStatus::Error
+        } else {
+            TestStatus::Ok
+        },
+        subtests: (0..num_subtests)
+            .map(|idx| SubtestResult {
+                name: format!("subtest {}", idx),
+                status: if (seed + idx) % 4 == 0 {
+                    SubtestStatus::Fail
+                } else {
+                    SubtestStatus::Pass
+                },
+                expected: None,
+            })
+            .collect(),
+        expected: None,
+    }
+}
+
+/// Run `f` `iterations` times, returning the fastest time.
+pub fn time_best_of<T>(iterations: usize, mut f: impl FnMut() -> T) -> Duration {
+    (0..iterations)
+        .map(|_| {
+            let start = Instant::now();
+            std::hint::black_box(f());
+            start.elapsed()
+        })
+        .min()
+        .expect("No iterations")
+}
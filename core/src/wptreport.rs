@@ -0,0 +1,442 @@
+//! Reading results directly from wptreport files.
+//!
+//! wptreport files are the JSON results format written by wptrunner,
+//! optionally gzip compressed. Reports are parsed incrementally, and
+//! only the tests that are being scored are kept.
+
+use crate::{
+    Error, Result, Results, SubtestResult, SubtestStatus, TestScore, TestScores, TestStatus,
+};
+use flate2::read::GzDecoder;
+use serde::de::{DeserializeSeed, Deserializer, IgnoredAny, MapAccess, SeqAccess, Visitor};
+use serde_derive::Deserialize;
+use std::collections::{BTreeMap, BTreeSet};
+use std::fmt;
+use std::fs::File;
+use std::io::{BufRead, BufReader, Read};
+use std::path::{Path, PathBuf};
+
+/// Known failures for each test. A `None` entry marks the whole test
+/// as an expected failure, otherwise the entries are subtest names.
+pub type ExpectedFailures = BTreeMap<String, BTreeSet<Option<String>>>;
+
+#[derive(Debug, Deserialize)]
+struct ReportResult {
+    test: String,
+    status: TestStatus,
+    #[serde(default)]
+    subtests: Vec<ReportSubtestResult>,
+}
+
+#[derive(Debug, Deserialize)]
+struct ReportSubtestResult {
+    name: String,
+    status: SubtestStatus,
+}
+
+/// Deserializes a wptreport, calling `visit` for each test result
+/// in `include_tests` (or all results if that's `None`), without
+/// keeping the whole report in memory.
+struct ReportSeed<'a, F> {
+    include_tests: Option<&'a BTreeSet<String>>,
+    visit: &'a mut F,
+}
+
+impl<'de, F: FnMut(ReportResult)> DeserializeSeed<'de> for ReportSeed<'_, F> {
+    type Value = ();
+
+    fn deserialize<D: Deserializer<'de>>(
+        self,
+        deserializer: D,
+    ) -> std::result::Result<(), D::Error> {
+        deserializer.deserialize_map(self)
+    }
+}
+
+impl<'de, F: FnMut(ReportResult)> Visitor<'de> for ReportSeed<'_, F> {
+    type Value = ();
+
+    fn expecting(&self, formatter: &mut fmt::Formatter) -> fmt::Result {
+        formatter.write_str("a wptreport object")
+    }
+
+    fn visit_map<A: MapAccess<'de>>(self, mut map: A) -> std::result::Result<(), A::Error> {
+        while let Some(key) = map.next_key::<String>()? {
+            if key == "results" {
+                map.next_value_seed(ResultsSeed {
+                    include_tests: self.include_tests,
+                    visit: &mut *self.visit,
+                })?;
+            } else {
+                map.next_value::<IgnoredAny>()?;
+            }
+        }
+        Ok(())
+    }
+}
+
+struct ResultsSeed<'a, F> {
+    include_tests: Option<&'a BTreeSet<String>>,
+    visit: &'a mut F,
+}
+
+impl<'de, F: FnMut(ReportResult)> DeserializeSeed<'de> for ResultsSeed<'_, F> {
+    type Value = ();
+
+    fn deserialize<D: Deserializer<'de>>(
+        self,
+        deserializer: D,
+    ) -> std::result::Result<(), D::Error> {
+        deserializer.deserialize_seq(self)
+    }
+}
+
+impl<'de, F: FnMut(ReportResult)> Visitor<'de> for ResultsSeed<'_, F> {
+    type Value = ();
+
+    fn expecting(&self, formatter: &mut fmt::Formatter) -> fmt::Result {
+        formatter.write_str("a list of test results")
+    }
+
+    fn visit_seq<A: SeqAccess<'de>>(self, mut seq: A) -> std::result::Result<(), A::Error> {
+        while let Some(result) = seq.next_element::<ReportResult>()? {
+            if self
+                .include_tests
+                .is_none_or(|include| include.contains(&result.test))
+            {
+                (self.visit)(result);
+            }
+        }
+        Ok(())
+    }
+}
+
+fn open_report(path: &Path) -> Result<Box<dyn Read>> {
+    let mut reader = BufReader::new(File::open(path)?);
+    // Check for the gzip magic number rather than relying on the extension
+    let is_gzip = reader.fill_buf()?.starts_with(&[0x1f, 0x8b]);
+    Ok(if is_gzip {
+        Box::new(BufReader::new(GzDecoder::new(reader)))
+    } else {
+        Box::new(reader)
+    })
+}
+
+/// Read the results for the tests in `include_tests` from a single
+/// wptreport file, in the order they appear in the report.
+///
+/// If `include_tests` is `None` all the results are read.
+pub fn read_wptreport(
+    path: &Path,
+    include_tests: Option<&BTreeSet<String>>,
+) -> Result<Vec<(String, Results)>> {
+    let reader = open_report(path)?;
+    let mut results = Vec::new();
+    let mut deserializer = serde_json::Deserializer::from_reader(reader);
+    ReportSeed {
+        include_tests,
+        visit: &mut |result: ReportResult| {
+            results.push((
+                result.test,
+                Results {
+                    status: result.status,
+                    subtests: result
+                        .subtests
+                        .into_iter()
+                        .map(|subtest| SubtestResult {
+                            name: subtest.name,
+                            status: subtest.status,
+                            expected: None,
+                        })
+                        .collect(),
+                    expected: None,
+                },
+            ))
+        },
+    }
+    .deserialize(&mut deserializer)
+    .and_then(|_| deserializer.end())
+    .map_err(|err| Error::String(format!("Failed to read {}: {}", path.display(), err)))?;
+    Ok(results)
+}
+
+/// Per-test scores for a run read from wptreport files
+#[derive(Debug, Default, Clone)]
+pub struct ReportTestScores {
+    pub scores: TestScores,
+    /// Tests which had more than one result, whether in the same
+    /// report or in different reports
+    pub duplicates: BTreeSet<String>,
+}
+
+fn mark_expected_failures(results: &mut Results, expected: &BTreeSet<Option<String>>) {
+    if expected.contains(&None) {
+        results.expected = Some(TestStatus::Fail);
+    } else {
+        for subtest in results.subtests.iter_mut() {
+            if expected.contains(&Some(subtest.name.clone())) {
+                subtest.expected = Some(SubtestStatus::Fail);
+            }
+        }
+    }
+}
+
+/// Compute the per-test scores for several runs, each given as a
+/// list of wptreport files, using up to `threads` worker threads.
+///
+/// SKIP results are ignored, since there can be several jobs that
+/// report SKIP for tests they don't run. Where a test has more than
+/// one result, the last one is used and the test is recorded in
+/// `duplicates`. The returned scores are in the same order as `runs`.
+pub fn score_wptreports(
+    runs: &[Vec<PathBuf>],
+    include_tests: &BTreeSet<String>,
+    expected_failures: &ExpectedFailures,
+    threads: usize,
+) -> Result<Vec<ReportTestScores>> {
+    let paths = runs.iter().flatten().collect::<Vec<_>>();
+    let score_report = |path: &Path| -> Result<Vec<(String, TestScore)>> {
+        Ok(read_wptreport(path, Some(include_tests))?
+            .into_iter()
+            .filter(|(_, results)| results.status != TestStatus::Skip)
+            .map(|(test_id, mut results)| {
+                if let Some(expected) = expected_failures.get(&test_id) {
+                    mark_expected_failures(&mut results, expected);
+                }
+                let score = TestScore::from_results(&results);
+                (test_id, score)
+            })
+            .collect())
+    };
+
+    let mut report_scores =
+        crate::map_parallel(&paths, threads, |path| score_report(path))?.into_iter();
+    Ok(runs
+        .iter()
+        .map(|run| {
+            let mut run_scores = ReportTestScores::default();
+            for scores in report_scores.by_ref().take(run.len()) {
+                for (test_id, score) in scores {
+                    if run_scores.scores.contains_key(&test_id) {
+                        run_scores.duplicates.insert(test_id.clone());
+                    }
+                    run_scores.scores.insert(test_id, score);
+                }
+            }
+            run_scores
+        })
+        .collect())
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::test_util::TempDir;
+    use flate2::write::GzEncoder;
+    use flate2::Compression;
+    use serde_json::{json, Value};
+    use std::io::Write;
+
+    fn report(results: Value) -> Vec<u8> {
+        serde_json::to_vec(&json!({
+            "run_info": {"product": "firefox"},
+            "results": results,
+            "time_start": 0,
+        }))
+        .unwrap()
+    }
+
+    fn write_report(dir: &Path, name: &str, data: &[u8], gzip: bool) -> PathBuf {
+        let path = dir.join(name);
+        if gzip {
+            let mut encoder = GzEncoder::new(File::create(&path).unwrap(), Compression::default());
+            encoder.write_all(data).unwrap();
+            encoder.finish().unwrap();
+        } else {
+            std::fs::write(&path, data).unwrap();
+        }
+        path
+    }
+
+    fn results_json(results: &[(String, Results)]) -> Value {
+        serde_json::to_value(results).unwrap()
+    }
+
+    /// Scores computed the way the Python loader did: load each report
+    /// in full, drop tests that aren't included and SKIP results, let
+    /// later results replace earlier ones, and then mark expected
+    /// failures.
+    fn reference_scores(
+        paths: &[PathBuf],
+        include_tests: &BTreeSet<String>,
+        expected_failures: &ExpectedFailures,
+    ) -> TestScores {
+        let mut run_results = BTreeMap::new();
+        for path in paths {
+            let mut data = Vec::new();
+            open_report(path).unwrap().read_to_end(&mut data).unwrap();
+            let report: Value = serde_json::from_slice(&data).unwrap();
+            for item in report["results"].as_array().unwrap() {
+                let test_id = item["test"].as_str().unwrap().to_string();
+                let results: Results = serde_json::from_value(item.clone()).unwrap();
+                if !include_tests.contains(&test_id) || results.status == TestStatus::Skip {
+                    continue;
+                }
+                run_results.insert(test_id, results);
+            }
+        }
+        run_results
+            .into_iter()
+            .map(|(test_id, mut results)| {
+                if let Some(expected) = expected_failures.get(&test_id) {
+                    mark_expected_failures(&mut results, expected);
+                }
+                (test_id, TestScore::from_results(&results))
+            })
+            .collect()
+    }
+
+    #[test]
+    fn read_plain_and_gzip() {
+        let dir = TempDir::new("wptreport-read");
+        let data = report(json!([
+            {"test": "/a/test1.html", "status": "OK", "subtests": [
+                {"name": "first", "status": "PASS", "message": null},
+                {"name": "second", "status": "FAIL", "message": "assert_true"},
+            ]},
+            {"test": "/a/test2.html", "status": "FAIL", "message": "failed"},
+            {"test": "/b/test3.html", "status": "SKIP", "subtests": []},
+        ]));
+        // The format is detected from the contents, not the name
+        let plain = write_report(dir.path(), "wptreport.json.gz", &data, false);
+        let gzip = write_report(dir.path(), "wptreport.json", &data, true);
+
+        let plain_results = read_wptreport(&plain, None).unwrap();
+        let tests = plain_results
+            .iter()
+            .map(|(test_id, _)| test_id.as_str())
+            .collect::<Vec<_>>();
+        assert_eq!(tests, ["/a/test1.html", "/a/test2.html", "/b/test3.html"]);
+        assert_eq!(plain_results[0].1.subtests.len(), 2);
+        assert_eq!(plain_results[0].1.subtests[1].status, SubtestStatus::Fail);
+        assert_eq!(plain_results[1].1.status, TestStatus::Fail);
+        assert!(plain_results[1].1.subtests.is_empty());
+        assert_eq!(
+            results_json(&read_wptreport(&gzip, None).unwrap()),
+            results_json(&plain_results)
+        );
+
+        let include_tests = BTreeSet::from(["/a/test2.html".to_string()]);
+        let subset = read_wptreport(&gzip, Some(&include_tests)).unwrap();
+        assert_eq!(results_json(&subset), results_json(&plain_results[1..2]));
+
+        let invalid = write_report(dir.path(), "invalid.json", b"{\"results\": [", false);
+        assert!(read_wptreport(&invalid, None).is_err());
+    }
+
+    #[test]
+    fn score_wptreports_skips_duplicates_and_expected_failures() {
+        let dir = TempDir::new("wptreport-score");
+        let first = write_report(
+            dir.path(),
+            "first.json",
+            &report(json!([
+                {"test": "/a/skip.html", "status": "OK", "subtests": [
+                    {"name": "subtest", "status": "PASS"},
+                ]},
+                {"test": "/a/dup.html", "status": "OK", "subtests": [
+                    {"name": "subtest", "status": "FAIL"},
+                ]},
+                {"test": "/a/dup.html", "status": "OK", "subtests": [
+                    {"name": "subtest", "status": "PASS"},
+                ]},
+                {"test": "/a/expected.html", "status": "FAIL"},
+                {"test": "/a/expected_subtests.html", "status": "OK", "subtests": [
+                    {"name": "known", "status": "FAIL"},
+                    {"name": "unknown", "status": "FAIL"},
+                    {"name": "passing", "status": "PASS"},
+                ]},
+                {"test": "/a/excluded.html", "status": "PASS"},
+            ])),
+            false,
+        );
+        let second = write_report(
+            dir.path(),
+            "second.json",
+            &report(json!([
+                {"test": "/a/skip.html", "status": "SKIP", "subtests": []},
+                {"test": "/a/across.html", "status": "FAIL"},
+                {"test": "/b/only_skip.html", "status": "SKIP"},
+            ])),
+            true,
+        );
+        let third = write_report(
+            dir.path(),
+            "third.json",
+            &report(json!([
+                {"test": "/a/across.html", "status": "PASS"},
+            ])),
+            false,
+        );
+        let include_tests = [
+            "/a/skip.html",
+            "/a/dup.html",
+            "/a/across.html",
+            "/a/expected.html",
+            "/a/expected_subtests.html",
+            "/b/only_skip.html",
+        ]
+        .iter()
+        .map(|x| x.to_string())
+        .collect::<BTreeSet<_>>();
+        let expected_failures = ExpectedFailures::from([
+            ("/a/expected.html".to_string(), BTreeSet::from([None])),
+            (
+                "/a/expected_subtests.html".to_string(),
+                BTreeSet::from([Some("known".to_string()), Some("passing".to_string())]),
+            ),
+        ]);
+
+        let runs = vec![
+            vec![first.clone(), second.clone(), third.clone()],
+            vec![third.clone()],
+        ];
+        for threads in [1, 4] {
+            let scores =
+                score_wptreports(&runs, &include_tests, &expected_failures, threads).unwrap();
+            assert_eq!(scores.len(), 2);
+            let run = &scores[0];
+
+            // SKIP results don't replace earlier results, and a test
+            // with only SKIP results has no score
+            assert_eq!(run.scores["/a/skip.html"], TestScore::new(1, 1, 0, true));
+            assert!(!run.scores.contains_key("/b/only_skip.html"));
+            assert!(!run.scores.contains_key("/a/excluded.html"));
+            // The last result is used for duplicates, both within a
+            // report and across reports
+            assert_eq!(run.scores["/a/dup.html"], TestScore::new(1, 1, 0, true));
+            assert_eq!(run.scores["/a/across.html"], TestScore::new(1, 1, 0, false));
+            assert_eq!(
+                run.duplicates,
+                BTreeSet::from(["/a/across.html".to_string(), "/a/dup.html".to_string()])
+            );
+            assert_eq!(
+                run.scores["/a/expected.html"],
+                TestScore::new(0, 1, 1, false)
+            );
+            assert_eq!(
+                run.scores["/a/expected_subtests.html"],
+                TestScore::new(1, 3, 1, true)
+            );
+
+            for (run_scores, paths) in scores.iter().zip(runs.iter()) {
+                assert_eq!(
+                    run_scores.scores,
+                    reference_scores(paths, &include_tests, &expected_failures)
+                );
+            }
+            assert_eq!(scores[1].scores.len(), 1);
+            assert!(scores[1].duplicates.is_empty());
+        }
+    }
+}
@@ -1,5 +1,6 @@
-from datetime import datetime
-from typing import Mapping, Optional
+from collections.abc import Buffer
+from datetime import date, datetime
+from typing import Iterator, Mapping, Optional
 
 Json = None | int | float | str | bool | list["Json"] | dict[str, "Json"]
 RunScores = Mapping[str, list[int]]
@@ -16,6 +17,28 @@ class SubtestResult:
     status: str
     expected: Optional[str]
 
+class RunResults(Mapping[str, Results]):
+    def __getitem__(self, test_id: str) -> Results: ...
+    def __iter__(self) -> Iterator[str]: ...
+    def __len__(self) -> int: ...
+
+class RunTestScores:
+    run_id: str
+    tree_id: str
+    def __len__(self) -> int: ...
+
+class ArrayBuffer(Buffer):
+    shape: tuple[int, int]
+    def __len__(self) -> int: ...
+
+class TestScoreMatrix:
+    run_ids: list[str]
+    categories: list[str]
+    tests: list[str]
+    passes: ArrayBuffer
+    totals: ArrayBuffer
+    category_mask: ArrayBuffer
+
 class GeckoRun:
     id: str
     run_info: Mapping[str, Json]
@@ -24,26 +47,71 @@ class GeckoRuns:
     push_date: datetime
     runs: Mapping[str, GeckoRun]
 
+class GeckoRunsIter(Iterator[tuple[date, str, GeckoRuns]]):
+    def __iter__(self) -> GeckoRunsIter: ...
+    def __next__(self) -> tuple[date, str, GeckoRuns]: ...
+
 def interop_score(
     runs: list[Mapping[str, Results]], tests: Mapping[str, set[str]], expected_not_ok: set[str]
 ) -> tuple[RunScores, InteropScore, ExpectedFailureScores]: ...
-def run_results(
-    results_repo: str, run_ids: list[str], tests: set[str]
-) -> list[Mapping[str, Results]]: ...
+def run_results(results_repo: str, run_ids: list[str], tests: set[str]) -> list[RunResults]: ...
 def score_runs(
     results_repo: str,
     run_ids: list[str],
     tests_by_category: Mapping[str, set[str]],
     expected_not_ok: set[str],
+    threads: int = 1,
+    score_cache: Optional[str] = None,
+) -> tuple[RunScores, InteropScore, ExpectedFailureScores]: ...
+def score_run_groups(
+    results_repo: str,
+    groups: list[list[str]],
+    tests_by_category: Mapping[str, set[str]],
+    expected_not_ok: set[str],
+    threads: int = 1,
+    score_cache: Optional[str] = None,
+) -> list[Optional[tuple[RunScores, InteropScore, ExpectedFailureScores]]]: ...
+def run_test_scores(
+    results_repo: str,
+    run_id: str,
+    tests: set[str],
+    base: Optional[RunTestScores] = None,
+    score_cache: Optional[str] = None,
+) -> RunTestScores: ...
+def score_test_scores(
+    runs: list[RunTestScores],
+    tests_by_category: Mapping[str, set[str]],
+    expected_not_ok: set[str],
 ) -> tuple[RunScores, InteropScore, ExpectedFailureScores]: ...
+def test_score_matrix(
+    results_repo: str,
+    run_ids: list[str],
+    tests_by_category: Mapping[str, set[str]],
+    threads: int = 1,
+    score_cache: Optional[str] = None,
+) -> TestScoreMatrix: ...
+def score_wptreports(
+    run_logs: list[list[str]],
+    tests_by_category: Mapping[str, set[str]],
+    expected_not_ok: set[str],
+    expected_failures: Mapping[str, set[Optional[str]]],
+    threads: int = 1,
+) -> tuple[RunScores, InteropScore, ExpectedFailureScores, list[set[str]]]: ...
+def import_wptreports(results_repo: str, run_id: str, log_paths: list[str]) -> str: ...
 def interop_tests(
     metadata_repo_path: str,
     labels_by_category: Mapping[str, set[str]],
-    metadata_revision: Optional[str],
-) -> tuple[str, Mapping[str, set[str]], set[str]]: ...
+    metadata_revision: Optional[str] = None,
+    threads: Optional[int] = None,
+) -> tuple[str, Mapping[str, set[str]], set[str], Mapping[str, str], str]: ...
 def regressions(
     results_repo: str, metadata_repo_path: str, run_ids: tuple[str, str]
 ) -> Mapping[str, tuple[Optional[str], list[tuple[str, str]], list[str]]]: ...
 def gecko_runs(
-    results_repo: str, branch: str, from_date: datetime, to_date: Optional[datetime]
-) -> Mapping[datetime, Mapping[str, GeckoRuns]]: ...
+    results_repo: str,
+    branch: str,
+    from_date: date,
+    to_date: Optional[date] = None,
+    run_info_filter: Optional[Mapping[str, Json]] = None,
+) -> GeckoRunsIter: ...
+def set_results_cache_capacity(capacity: int) -> None: ...
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Mapping, Optional, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Maximum number of concurrent HTTP requests
+MAX_CONCURRENT_REQUESTS = 8
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+_session_lock = threading.Lock()
+_session: requests.Session | None = None
+
+
+def get_session() -> requests.Session:
+    """Get a shared HTTP session, so that connections are reused between requests"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=MAX_CONCURRENT_REQUESTS, pool_maxsize=MAX_CONCURRENT_REQUESTS
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def get_json(url: str) -> Any:
+    resp = get_session().get(url)
+    resp.raise_for_status()
+    return resp.json()
+
+
+# Map from validator name to the response header it's read from
+VALIDATOR_HEADERS = {"etag": "ETag", "last-modified": "Last-Modified"}
+# Map from validator name to the request header used to send it
+CONDITIONAL_HEADERS = {"etag": "If-None-Match", "last-modified": "If-Modified-Since"}
+
+
+def get_json_conditional(
+    url: str, validators: Mapping[str, str]
+) -> tuple[Optional[Any], dict[str, str]]:
+    """Fetch JSON from url, unless it's unchanged since a previous response.
+
+    :param validators: ETag and Last-Modified values from a previous response.
+    :returns: Tuple of (data, validators). data is None if the server reports
+              the resource is unchanged.
+    """
+    headers = {
+        CONDITIONAL_HEADERS[name]: value
+        for name, value in validators.items()
+        if name in CONDITIONAL_HEADERS
+    }
+    resp = get_session().get(url, headers=headers)
+    if resp.status_code == 304:
+        return None, dict(validators)
+    resp.raise_for_status()
+    new_validators = {
+        name: resp.headers[header]
+        for name, header in VALIDATOR_HEADERS.items()
+        if header in resp.headers
+    }
+    return resp.json(), new_validators
+
+
+def map_concurrent(
+    func: Callable[[T], U], items: Iterable[T], max_workers: int = MAX_CONCURRENT_REQUESTS
+) -> list[U]:
+    """Call func for each item using up to max_workers threads.
+
+    The results are returned in the same order as items."""
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
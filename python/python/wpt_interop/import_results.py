@@ -0,0 +1,53 @@
+import argparse
+import logging
+from typing import Iterable
+
+from . import _wpt_interop
+
+logger = logging.getLogger("wpt_interop.import_results")
+
+
+def import_wptreports(results_repo: str, run_id: str, log_paths: Iterable[str]) -> str:
+    """Import wptreport files into a local results cache repository
+
+    The results are stored in the same layout as the wpt.fyi
+    results-analysis-cache, so the run can then be scored with
+    `score_runs` or compared with `regressions` like any upstream run.
+
+    :param results_repo: Path to the results repository. This is created as
+                         a bare repository if it doesn't already exist, and
+                         must not be a repository using the Gecko layout.
+    :param run_id: Id to use for the run.
+    :param log_paths: Paths to the wptreport files for the run.
+    :returns: The id of the git tree containing the run results.
+    """
+    tree_id = _wpt_interop.import_wptreports(results_repo, run_id, list(log_paths))
+    logger.info(f"Imported run {run_id} as tree {tree_id}")
+    return tree_id
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Import wptreport files into a local results cache repository",
+        epilog="The id of the git tree containing the imported results is printed to stdout",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="info",
+        choices=["critical", "warning", "info", "debug"],
+        help="Logging level",
+    )
+    parser.add_argument("results_repo", help="Path to the results cache repository")
+    parser.add_argument("run_id", help="Id to use for the imported run")
+    parser.add_argument("log_paths", nargs="+", help="Paths to wptreport files for the run")
+    return parser
+
+
+def main() -> None:
+    parser = get_parser()
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.getLevelNamesMapping()[args.log_level.upper()])
+
+    tree_id = import_wptreports(args.results_repo, args.run_id, args.log_paths)
+    # The tree id is the command's output, so it goes to stdout rather than the log
+    print(tree_id)
@@ -3,10 +3,21 @@ import csv
 import json
 import logging
 import os
+import sqlite3
 from dataclasses import dataclass
 from datetime import datetime
 from types import TracebackType
-from typing import Any, Iterable, Iterator, Mapping, MutableSequence, Optional, Self, cast
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    Self,
+    cast,
+)
 
 from . import _wpt_interop
 from . import metadata
@@ -17,10 +28,15 @@ from .runs import (
     GeckoRun,
     RunCacheData,
     RunsByRevision,
+    ValidatorStore,
+    close_run_store,
     fetch_runs_gecko,
     fetch_runs_wptfyi,
+    open_run_store,
+    run_cache_query,
 )
 from .repo import (
+    InteropTests,
     Repo,
     ResultsAnalysisCache,
     GeckoResultsAnalysisCache,
@@ -33,6 +49,9 @@ ScoresByCategory = Mapping[str, list[int]]
 
 logger = logging.getLogger("wpt_interop.main")
 
+# Number of threads used to load the runs for a single revision
+SCORE_THREADS = os.cpu_count() or 1
+
 
 @dataclass
 class Configuration:
@@ -266,7 +285,7 @@ class RevisionData:
         runs_path = RevisionData.path(base_path, configuration)
 
         if not any(item.run_id == run.run_id for item in self.runs):
-            self.runs.runs.append(run)
+            self.runs.append(run)
             with open(runs_path, "w") as f:
                 json.dump([run.to_json() for run in self.runs], f, indent=2)
             updated_files.append(runs_path)
@@ -353,15 +372,36 @@ class HistoricAlignedRunData(AlignedRunData):
 
 
 class AlignedRunsMetadata:
-    def __init__(self, metadata_revision: str):
+    def __init__(
+        self,
+        metadata_revision: str,
+        tests_hash: Optional[str] = None,
+        category_hashes: Optional[Mapping[str, str]] = None,
+    ):
         self.metadata_revision = metadata_revision
+        # Hash of the tests in each category at metadata_revision. Older files don't have this.
+        self.tests_hash = tests_hash
+        self.category_hashes = category_hashes
 
     @classmethod
     def from_json(cls, data: Mapping[str, Any]) -> Self:
-        return cls(data["metadata_revision"])
+        return cls(data["metadata_revision"], data.get("tests_hash"), data.get("category_hashes"))
+
+    @classmethod
+    def from_interop_tests(cls, interop_tests: InteropTests) -> Self:
+        return cls(
+            interop_tests.metadata_revision,
+            interop_tests.tests_hash,
+            interop_tests.category_hashes,
+        )
 
     def to_json(self) -> Mapping[str, Any]:
-        return {"metadata_revision": self.metadata_revision}
+        rv: dict[str, Any] = {"metadata_revision": self.metadata_revision}
+        if self.tests_hash is not None:
+            rv["tests_hash"] = self.tests_hash
+        if self.category_hashes is not None:
+            rv["category_hashes"] = dict(self.category_hashes)
+        return rv
 
     def write(self, path: str) -> None:
         with open(path, "w") as f:
@@ -656,17 +696,37 @@ def read_scores_csv(
 
 
 class RunCache:
-    def __init__(self, current_runs: RunsByRevision):
+    """Run cache holding the runs that have already been scored.
+
+    The HTTP validators for each day are kept in the run database at store_path, so
+    later updates can revalidate recent days with conditional requests. Validators
+    are only used while all the runs from the response they came from are among the
+    scored runs."""
+
+    def __init__(
+        self,
+        current_runs: RunsByRevision,
+        store_path: str,
+        products: list[str],
+        channel: str,
+    ):
         self.data: dict[str, Any] = {}
         for runs in current_runs:
             for run in runs:
-                date = run.time_start.strftime("%Y-%m-%d")
+                date = run.start_date
                 if date not in self.data:
                     self.data[date] = []
                 self.data[date].append(run.to_json())
+        self.store_path = store_path
+        # Runs are always fetched unaligned and without a per-day limit
+        self.query = run_cache_query(products, channel, False, None)
+        self.conn: Optional[sqlite3.Connection] = None
+        self.cache_data = RunCacheData(self.data)
 
     def __enter__(self) -> RunCacheData:
-        return RunCacheData(self.data)
+        self.conn = open_run_store(self.store_path)
+        self.cache_data.validator_store = ValidatorStore(self.conn, self.query)
+        return self.cache_data
 
     def __exit__(
         self,
@@ -674,14 +734,27 @@ class RunCache:
         exc_val: Optional[BaseException],
         exc_tb: Optional[TracebackType],
     ) -> None:
-        pass
+        self.cache_data.validator_store = None
+        if self.conn is not None:
+            close_run_store(self.conn, exc_type is None)
+            self.conn = None
 
 
 def updated_runs(
-    old_runs: RunsByRevision, new_runs: RunsByRevision
+    old_runs: RunsByRevision,
+    new_runs: RunsByRevision,
+    unchanged_dates: Optional[set[str]] = None,
 ) -> Mapping[str, MutableSequence[Run]]:
+    """Get the runs in new_runs that aren't in old_runs, by revision.
+
+    :param unchanged_dates: Dates (as YYYY-MM-DD) for which new_runs is known to
+                            be the same as old_runs, so revisions with runs only
+                            on those dates can be skipped.
+    """
     updated = {}
     for runs in new_runs:
+        if unchanged_dates and all(run.start_date in unchanged_dates for run in runs):
+            continue
         if runs.revision not in old_runs:
             updated[runs.revision] = runs.runs
         else:
@@ -692,27 +765,72 @@ def updated_runs(
     return updated
 
 
-def score_aligned_runs(
-    results_cache_path: str,
+def aligned_run_ids(configuration: Configuration, runs: RevisionRuns) -> list[str]:
+    runs_by_product = {run.browser_name: run for run in runs}
+    return [runs_by_product[product].run_id for product in configuration.products]
+
+
+def aligned_run_data(
     configuration: Configuration,
     runs: RevisionRuns,
-    tests_by_category: Mapping[str, set[str]],
+    scores_by_category: ScoresByCategory,
+    interop_scores: InteropScores,
 ) -> AlignedRunData:
-    logger.info(f"Generating aligned results for revision {runs.revision}")
     runs_by_product = {run.browser_name: run for run in runs}
-    run_ids = [runs_by_product[product].run_id for product in configuration.products]
     product_versions = {
         product: runs_by_product[product].browser_version for product in configuration.products
     }
-
-    scores_by_category, interop_scores, _ = _wpt_interop.score_runs(
-        results_cache_path, run_ids, tests_by_category, set()
-    )
     return AlignedRunData(
         runs.revision, runs.min_start_time, product_versions, scores_by_category, interop_scores
     )
 
 
+def score_aligned_runs(
+    results_analysis_repo: ResultsAnalysisCache,
+    configuration: Configuration,
+    runs: RevisionRuns,
+    tests_by_category: Mapping[str, set[str]],
+    base_scores: Optional[tuple[set[str], MutableMapping[str, _wpt_interop.RunTestScores]]] = None,
+) -> AlignedRunData:
+    """Score a set of aligned runs.
+
+    :param base_scores: Optional tuple of (all tests, per-test scores by product).
+                        If provided, each run is scored relative to the previous
+                        run for the same product, which is then updated to the
+                        new run.
+    """
+    logger.info(f"Generating aligned results for revision {runs.revision}")
+    run_ids = aligned_run_ids(configuration, runs)
+
+    if base_scores is None:
+        scores_by_category, interop_scores, _ = _wpt_interop.score_runs(
+            results_analysis_repo.path,
+            run_ids,
+            tests_by_category,
+            set(),
+            threads=SCORE_THREADS,
+            score_cache=results_analysis_repo.score_cache_path,
+        )
+    else:
+        all_tests, scores_by_product = base_scores
+        test_scores = []
+        for product, run_id in zip(configuration.products, run_ids):
+            product_scores = _wpt_interop.run_test_scores(
+                results_analysis_repo.path,
+                run_id,
+                all_tests,
+                scores_by_product.get(product),
+                score_cache=results_analysis_repo.score_cache_path,
+            )
+            test_scores.append(product_scores)
+        scores_by_category, interop_scores, _ = _wpt_interop.score_test_scores(
+            test_scores, tests_by_category, set()
+        )
+        for product, product_scores in zip(configuration.products, test_scores):
+            scores_by_product[product] = product_scores
+    return aligned_run_data(configuration, runs, scores_by_category, interop_scores)
+
+
 def get_runs(
     results_analysis_repo: ResultsAnalysisCache,
     interop: Interop,
@@ -760,14 +878,20 @@ def update_configuration(
     interop: Interop,
     configuration: Configuration,
 ) -> None:
-    metadata_revision, tests_by_category, _ = metadata_repo.tests_by_category(
-        interop.categories(True)
-    )
+    interop_tests = metadata_repo.interop_tests(interop.categories(True))
+    metadata_revision = interop_tests.metadata_revision
+    tests_by_category = interop_tests.tests_by_category
+    all_tests = interop_tests.all_tests
 
     # Score new runs since the run of this code
     stored_runs = interop_repo.runs(interop, configuration)
 
-    run_cache = RunCache(stored_runs)
+    run_cache = RunCache(
+        stored_runs,
+        results_analysis_repo.run_store_path,
+        configuration.products,
+        configuration.channel,
+    )
 
     all_runs = get_runs(
         results_analysis_repo,
@@ -777,92 +901,123 @@ def update_configuration(
         run_cache=run_cache,
     )
 
-    updated = updated_runs(stored_runs, all_runs)
+    updated = updated_runs(stored_runs, all_runs, run_cache.cache_data.unchanged)
 
     if updated:
-        for revision, runs in updated.items():
-            logger.info(f"Generating results for revision {revision}")
-            try:
-                scores, _, _ = _wpt_interop.score_runs(
-                    results_analysis_repo.path,
-                    [item.run_id for item in runs],
-                    tests_by_category,
-                    set(),
-                )
-            except OSError as e:
-                if "refs/tags/run/" in str(e):
-                    # We didn't find the run data, probably want to try again with just some runs
-                    # But skip for now
-                    logger.warning(f"Failed to generate scores for revision {revision}:\n  {e}")
-                    continue
-                raise
-            else:
-                for i, run in enumerate(runs):
-                    run_score = {}
-                    for category in interop.categories():
-                        category_scores = scores[category]
-                        assert len(category_scores) == len(runs)
-                        run_score[category] = category_scores[i]
-                    interop_repo.add_run_score(
-                        interop, configuration, run, metadata_revision, run_score
-                    )
-
-        # Check for newly aligned runs
+        # Check if the interop tests changed since the previous metadata revision
         aligned_all = interop_repo.latest_aligned(interop, configuration)
+        aligned_metadata_revision = metadata_revision
         recompute_all = True
         if aligned_all is not None:
-            # Check if the interop tests changed since the previous metadata revision
-            metadata_revision = aligned_all.metadata.metadata_revision
-            _, prev_tests_by_category, _ = metadata_repo.tests_by_category(
-                interop.categories(), metadata_revision
-            )
-            recompute_all = prev_tests_by_category != tests_by_category
+            prev_metadata_revision = aligned_all.metadata.metadata_revision
+            if aligned_all.metadata.tests_hash is not None:
+                recompute_all = aligned_all.metadata.tests_hash != interop_tests.tests_hash
+            else:
+                # No stored hash, so compare with the tests at the previous revision
+                _, prev_tests_by_category, _ = metadata_repo.tests_by_category(
+                    interop.categories(), prev_metadata_revision
+                )
+                recompute_all = prev_tests_by_category != tests_by_category
+            if not recompute_all:
+                aligned_metadata_revision = prev_metadata_revision
+                # The tests are unchanged, so the current hashes also apply to the stored revision
+                aligned_all.metadata = AlignedRunsMetadata(
+                    prev_metadata_revision,
+                    interop_tests.tests_hash,
+                    interop_tests.category_hashes,
+                )
+
+        # Score the new runs and, if the metadata is unchanged, any newly aligned runs
+        # in a single batch so that each run is only loaded once
+        groups = [[item.run_id for item in runs] for runs in updated.values()]
+        aligned_revisions = []
+        if not recompute_all:
+            for revision_runs in all_runs.filter_by_revisions(set(updated.keys())):
+                if revision_runs.is_aligned(configuration.products):
+                    aligned_revisions.append(revision_runs)
+                    groups.append(aligned_run_ids(configuration, revision_runs))
+        group_scores = _wpt_interop.score_run_groups(
+            results_analysis_repo.path,
+            groups,
+            tests_by_category,
+            set(),
+            threads=SCORE_THREADS,
+            score_cache=results_analysis_repo.score_cache_path,
+        )
+
+        for (revision, runs), revision_scores in zip(updated.items(), group_scores):
+            logger.info(f"Generating results for revision {revision}")
+            if revision_scores is None:
+                # We didn't find the run data, probably want to try again with just some runs
+                # But skip for now
+                logger.warning(f"Failed to generate scores for revision {revision}: missing runs")
+                continue
+            scores, _, _ = revision_scores
+            for i, run in enumerate(runs):
+                run_score = {}
+                for category in interop.categories():
+                    category_scores = scores[category]
+                    assert len(category_scores) == len(runs)
+                    run_score[category] = category_scores[i]
+                interop_repo.add_run_score(
+                    interop, configuration, run, metadata_revision, run_score
+                )
+
         if not recompute_all:
             logger.info("Metadata has not changed; adding new runs")
             assert aligned_all is not None
-            for revision_runs in all_runs.filter_by_revisions(set(updated.keys())):
-                if not revision_runs.is_aligned(configuration.products):
+            for revision_runs, revision_scores in zip(
+                aligned_revisions, group_scores[len(updated) :]
+            ):
+                logger.info(f"Generating aligned results for revision {revision_runs.revision}")
+                if revision_scores is None:
+                    logger.warning(
+                        "Failed to generate aligned scores for revision "
+                        f"{revision_runs.revision}: missing runs"
+                    )
                     continue
-                try:
-                    aligned_run_data = score_aligned_runs(
-                        results_analysis_repo.path, configuration, revision_runs, tests_by_category
+                scores_by_category, interop_scores, _ = revision_scores
+                aligned_all.append(
+                    aligned_run_data(
+                        configuration, revision_runs, scores_by_category, interop_scores
                     )
-                except OSError as e:
-                    if "refs/tags/run/" in str(e):
-                        logger.warning(
-                            f"""Failed to generate aligned scores for revision {revision}:
-  {e}"""
-                        )
-                        continue
-                aligned_all.append(aligned_run_data)
+                )
             new_aligned = aligned_all
         else:
             logger.info("Metadata changed; recomputing all runs")
             data = []
-            AlignedRunsMetadata(metadata_revision)
+            # Runs are in date order, so score each run relative to the previous one
+            # for the same product
+            base_scores: tuple[set[str], dict[str, _wpt_interop.RunTestScores]] = (all_tests, {})
             for revision_runs in all_runs:
                 if not revision_runs.is_aligned(configuration.products):
                     continue
                 try:
-                    aligned_run_data = score_aligned_runs(
-                        results_analysis_repo.path, configuration, revision_runs, tests_by_category
+                    revision_data = score_aligned_runs(
+                        results_analysis_repo,
+                        configuration,
+                        revision_runs,
+                        tests_by_category,
+                        base_scores,
                     )
                 except OSError as e:
                     if "refs/tags/run/" in str(e):
                         logger.warning(
-                            f"""Failed to generate aligned scores for revision {revision}:
+                            f"""Failed to generate aligned scores for revision {revision_runs.revision}:
   {e}"""
                         )
                         continue
-                data.append(aligned_run_data)
-            new_aligned = AlignedRuns(data, AlignedRunsMetadata(metadata_revision))
+                data.append(revision_data)
+            new_aligned = AlignedRuns(data, AlignedRunsMetadata.from_interop_tests(interop_tests))
         interop_repo.set_latest_aligned(interop, configuration, new_aligned)
 
         if new_aligned.data:
             aligned_historic = interop_repo.historic_aligned(interop, configuration)
             for new_aligned_run in new_aligned.data:
                 if not aligned_historic.has_revision(new_aligned_run.revision):
-                    aligned_historic.append(new_aligned_run.to_historic(metadata_revision))
+                    aligned_historic.append(
+                        new_aligned_run.to_historic(aligned_metadata_revision)
+                    )
             interop_repo.set_historic_aligned(interop, configuration, aligned_historic)
         else:
             logger.info("Didn't find any new aligned runs")
@@ -3,7 +3,7 @@ from functools import cache
 from typing import Any, Callable, Mapping, Optional, Set, Tuple
 from urllib.parse import urljoin
 
-import requests
+from .fetch import get_json, map_concurrent
 
 DEFAULT_WPT_FYI = "https://activate-interop-2026-dot-wptdashboard-staging.uk.r.appspot.com/"
 CATEGORY_URL = (
@@ -16,18 +16,18 @@ METADATA_URL = "/api/metadata?includeTestLevel=true&product=chrome"
 
 def fetch_category_data(wpt_fyi: Optional[str] = None) -> Mapping[str, Mapping[str, Any]]:
     url = urljoin(wpt_fyi if wpt_fyi is not None else DEFAULT_WPT_FYI, CATEGORY_URL)
-    return requests.get(url).json()
+    return get_json(url)
 
 
 def fetch_interop_data(wpt_fyi: Optional[str] = None) -> Mapping[str, Mapping[str, Any]]:
     url = urljoin(wpt_fyi if wpt_fyi is not None else DEFAULT_WPT_FYI, INTEROP_DATA_URL)
-    return requests.get(url).json()
+    return get_json(url)
 
 
 def fetch_labelled_tests(wpt_fyi: Optional[str] = None) -> Mapping[str, set]:
     rv = defaultdict(set)
     url = urljoin(wpt_fyi if wpt_fyi is not None else DEFAULT_WPT_FYI, METADATA_URL)
-    data = requests.get(url).json()
+    data = get_json(url)
     for test, metadata in data.items():
         for meta_item in metadata:
             if "label" in meta_item:
@@ -61,9 +61,12 @@ def categories_for_year(
 def get_category_data(
     year: int, only_active: bool = True, category_filter: Optional[Callable[[str], bool]] = None
 ) -> Tuple[Mapping[str, Set[str]], Set[str]]:
-    category_data = fetch_category_data()
-    interop_data = fetch_interop_data()
-    labelled_tests = fetch_labelled_tests()
+    fetches: list[Callable[[], Any]] = [
+        fetch_category_data,
+        fetch_interop_data,
+        fetch_labelled_tests,
+    ]
+    category_data, interop_data, labelled_tests = map_concurrent(lambda fetch: fetch(), fetches)
 
     categories = categories_for_year(year, category_data, interop_data, only_active)
 
@@ -60,7 +60,13 @@ def run(args: argparse.Namespace) -> None:
     now = datetime.now()
     from_date = datetime(now.year, now.month, now.day) - timedelta(days=7)
     browser_names = [args.base_browser, args.browser]
-    runs = fetch_runs_wptfyi(browser_names, "experimental", from_date=from_date, aligned=True)
+    runs = fetch_runs_wptfyi(
+        browser_names,
+        "experimental",
+        from_date=from_date,
+        aligned=True,
+        run_store_path=results_analysis_repo.run_store_path,
+    )
     if not runs:
         print("No aligned runs found in the last 7 days")
         return
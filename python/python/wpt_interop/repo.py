@@ -1,7 +1,7 @@
 import logging
 import os
 import subprocess
-from typing import Mapping, Optional
+from typing import Mapping, NamedTuple, Optional
 
 from . import _wpt_interop
 
@@ -130,7 +130,22 @@ class Repo:
             logger.info(f"No changes in {self.name}")
 
 
-class ResultsAnalysisCache(Repo): ...
+def run_store_path(results_cache_path: str) -> str:
+    """Path to the database of cached wpt.fyi runs, inside the git directory of the
+    bare results cache repository at results_cache_path"""
+    return os.path.join(results_cache_path, "wpt-interop", "wpt-fyi-runs.sqlite")
+
+
+class ResultsAnalysisCache(Repo):
+    @property
+    def score_cache_path(self) -> str:
+        """Path to the on-disk cache of per-test scores for runs in this repository"""
+        return os.path.join(self.path, "wpt-interop-scores")
+
+    @property
+    def run_store_path(self) -> str:
+        """Path to the database of cached wpt.fyi runs for this repository"""
+        return run_store_path(self.path)
 
 
 class WptResultsAnalysisCache(ResultsAnalysisCache):
@@ -148,6 +163,15 @@ class GeckoResultsAnalysisCache(ResultsAnalysisCache):
     fetch_spec = ["+refs/runs/*:refs/runs/*"]
 
 
+class InteropTests(NamedTuple):
+    metadata_revision: str
+    tests_by_category: Mapping[str, set[str]]
+    all_tests: set[str]
+    # Stable hash of the tests in each category, and of all the categories
+    category_hashes: Mapping[str, str]
+    tests_hash: str
+
+
 class Metadata(Repo):
     name = "wpt-metadata.git"
     remote = "https://github.com/web-platform-tests/wpt-metadata.git"
@@ -157,7 +181,19 @@ class Metadata(Repo):
         super().__init__(path, repo_root)
         self._tests = None
 
+    def interop_tests(
+        self, labels_by_category: Mapping[str, set[str]], metadata_revision: Optional[str] = None
+    ) -> InteropTests:
+        return InteropTests(
+            *_wpt_interop.interop_tests(self.path, labels_by_category, metadata_revision)
+        )
+
     def tests_by_category(
         self, labels_by_category: Mapping[str, set[str]], metadata_revision: Optional[str] = None
     ) -> tuple[str, Mapping[str, set[str]], set[str]]:
-        return _wpt_interop.interop_tests(self.path, labels_by_category, metadata_revision)
+        interop_tests = self.interop_tests(labels_by_category, metadata_revision)
+        return (
+            interop_tests.metadata_revision,
+            interop_tests.tests_by_category,
+            interop_tests.all_tests,
+        )
@@ -1,7 +1,11 @@
+import bisect
 import json
 import logging
 import os
+import re
+import sqlite3
 from datetime import datetime, timedelta
+from operator import itemgetter
 from types import TracebackType
 from typing import (
     Any,
@@ -17,12 +21,20 @@ from typing import (
 )
 from urllib.parse import urlencode
 
+from .fetch import get_json, get_json_conditional, map_concurrent
 from .repo import ResultsAnalysisCache
 from ._wpt_interop import gecko_runs
 
-import requests
-
 RUNS_URL = "https://wpt.fyi/api/runs"
+# Maximum number of days of runs to fetch in a single request
+RANGE_FETCH_DAYS = 31
+# Maximum number of runs wpt.fyi returns for a single request
+MAX_RUNS_PER_REQUEST = 500
+# Path that keeps a run database in memory, rather than on disk
+IN_MEMORY_RUN_STORE = ":memory:"
+# Run store used when no other store is given. Like the default results cache
+# location, this is in the working directory.
+DEFAULT_RUN_STORE_PATH = os.path.join(os.path.abspath(os.curdir), "wpt-fyi-runs.sqlite")
 
 RunsByDate = Mapping[str, list["RevisionRuns"]]
 
@@ -31,7 +43,45 @@ logger = logging.getLogger("wpt_interop.runs")
 Json = None | int | float | str | bool | Sequence["Json"] | Mapping[str, "Json"]
 
 
+def parse_datetime(value: "datetime | str") -> datetime:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+# Strings in the form produced by datetime.isoformat, which can be written out as-is
+_ISOFORMAT_RE = re.compile(
+    r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?!\.0{6})(\.\d{6})?(?!-00:00)([+-]\d{2}:\d{2})?"
+)
+
+
+def format_datetime(value: "datetime | str") -> str:
+    """Format a datetime, or an ISO format string, the way datetime.isoformat does"""
+    if isinstance(value, str):
+        if _ISOFORMAT_RE.fullmatch(value):
+            return value
+        value = parse_datetime(value)
+    return value.isoformat()
+
+
 class Run:
+    """A single test run.
+
+    Datetimes may be passed as ISO format strings, in which case they're only parsed
+    when first accessed."""
+
+    __slots__ = (
+        "run_id",
+        "browser_name",
+        "browser_version",
+        "os_name",
+        "os_version",
+        "revision",
+        "full_revision_hash",
+        "_created_at",
+        "_time_start",
+    )
+
     def __init__(
         self,
         run_id: str,
@@ -41,8 +91,8 @@ class Run:
         os_version: str,
         revision: str,
         full_revision_hash: str,
-        created_at: datetime,
-        time_start: datetime,
+        created_at: datetime | str,
+        time_start: datetime | str,
     ):
         self.run_id = run_id
         self.browser_name = browser_name
@@ -51,8 +101,25 @@ class Run:
         self.os_version = os_version
         self.revision = revision
         self.full_revision_hash = full_revision_hash
-        self.created_at = created_at
-        self.time_start = time_start
+        self._created_at = created_at
+        self._time_start = time_start
+
+    @property
+    def created_at(self) -> datetime:
+        self._created_at = parse_datetime(self._created_at)
+        return self._created_at
+
+    @property
+    def time_start(self) -> datetime:
+        self._time_start = parse_datetime(self._time_start)
+        return self._time_start
+
+    @property
+    def start_date(self) -> str:
+        """Date the run started, as YYYY-MM-DD"""
+        if isinstance(self._time_start, str):
+            return self._time_start[:10]
+        return self._time_start.strftime("%Y-%m-%d")
 
     @classmethod
     def from_json(cls, data: Mapping[str, Json]) -> "Run":
@@ -82,8 +149,8 @@ class Run:
             os_version,
             revision,
             full_revision_hash,
-            datetime.fromisoformat(created_at),
-            datetime.fromisoformat(time_start),
+            created_at,
+            time_start,
         )
 
     def to_json(self) -> MutableMapping[str, Json]:
@@ -95,12 +162,14 @@ class Run:
             "os_version": self.os_version,
             "revision": self.revision,
             "full_revision_hash": self.full_revision_hash,
-            "created_at": self.created_at.isoformat(),
-            "time_start": self.time_start.isoformat(),
+            "created_at": format_datetime(self._created_at),
+            "time_start": format_datetime(self._time_start),
         }
 
 
 class WptFyiRun(Run):
+    __slots__ = ("_time_end", "results_url", "raw_results_url", "labels")
+
     def __init__(
         self,
         run_id: str,
@@ -110,9 +179,9 @@ class WptFyiRun(Run):
         os_version: str,
         revision: str,
         full_revision_hash: str,
-        created_at: datetime,
-        time_start: datetime,
-        time_end: datetime,
+        created_at: datetime | str,
+        time_start: datetime | str,
+        time_end: datetime | str,
         results_url: str,
         raw_results_url: str,
         labels: list[str],
@@ -128,11 +197,16 @@ class WptFyiRun(Run):
             created_at,
             time_start,
         )
-        self.time_end = time_end
+        self._time_end = time_end
         self.results_url = results_url
         self.raw_results_url = raw_results_url
         self.labels = labels
 
+    @property
+    def time_end(self) -> datetime:
+        self._time_end = parse_datetime(self._time_end)
+        return self._time_end
+
     @classmethod
     def from_json(cls, data: Mapping[str, Json]) -> "WptFyiRun":
         run_id = str(data["id"])
@@ -170,9 +244,9 @@ class WptFyiRun(Run):
             os_version,
             revision,
             full_revision_hash,
-            datetime.fromisoformat(created_at),
-            datetime.fromisoformat(time_start),
-            datetime.fromisoformat(time_end),
+            created_at,
+            time_start,
+            time_end,
             results_url,
             raw_results_url,
             cast(list[str], labels),
@@ -183,7 +257,7 @@ class WptFyiRun(Run):
         rv.update(
             {
                 "results_url": self.results_url,
-                "time_end": self.time_end.isoformat(),
+                "time_end": format_datetime(self._time_end),
                 "raw_results_url": self.raw_results_url,
                 "labels": self.labels,
             }
@@ -192,6 +266,8 @@ class WptFyiRun(Run):
 
 
 class GeckoRun(Run):
+    __slots__ = ("run_info",)
+
     def __init__(
         self,
         run_id: str,
@@ -201,8 +277,8 @@ class GeckoRun(Run):
         os_version: str,
         revision: str,
         full_revision_hash: str,
-        created_at: datetime,
-        time_start: datetime,
+        created_at: datetime | str,
+        time_start: datetime | str,
         run_info: Json,
     ):
         super().__init__(
@@ -273,8 +349,8 @@ class GeckoRun(Run):
             os_version,
             revision,
             full_revision_hash,
-            datetime.fromisoformat(created_at),
-            datetime.fromisoformat(time_start),
+            created_at,
+            time_start,
             run_info,
         )
 
@@ -289,6 +365,9 @@ class RevisionRuns:
     def __init__(self, revision: str, runs: MutableSequence[Run]):
         self.revision = revision
         self.runs = runs
+        # Start time and date of the earliest run, computed on first use
+        self._min_start_time: Optional[datetime] = None
+        self._start_date: Optional[str] = None
 
     def __len__(self) -> int:
         return len(self.runs)
@@ -301,13 +380,27 @@ class RevisionRuns:
 
     def append(self, run: Run) -> None:
         self.runs.append(run)
+        if self._min_start_time is not None:
+            self._min_start_time = min(self._min_start_time, run.time_start)
+        if self._start_date is not None:
+            self._start_date = min(self._start_date, run.start_date)
 
     def extend(self, other: Iterable[Run]) -> None:
-        self.runs.extend(other)
+        for run in other:
+            self.append(run)
 
     @property
     def min_start_time(self) -> datetime:
-        return min(item.time_start for item in self.runs)
+        if self._min_start_time is None:
+            self._min_start_time = min(item.time_start for item in self.runs)
+        return self._min_start_time
+
+    @property
+    def start_date(self) -> str:
+        """Date of the earliest run, as YYYY-MM-DD"""
+        if self._start_date is None:
+            self._start_date = min(item.start_date for item in self.runs)
+        return self._start_date
 
     def run_ids(self) -> list[str]:
         return [item.run_id for item in self.runs]
@@ -317,21 +410,75 @@ class RevisionRuns:
         return {item.browser_name for item in self.runs} == set(products)
 
 
-class RunsByRevision:
-    def __init__(self, runs: list[RevisionRuns]) -> None:
-        self._runs = runs
-        self._make_index()
+def _start_time_key(revision_runs: RevisionRuns) -> datetime:
+    return revision_runs.min_start_time
+
 
-    def _make_index(self) -> None:
-        self._runs.sort(key=lambda x: x.min_start_time)
-        self._index = {}
-        for run in self._runs:
-            self._index[run.revision] = run
+class RunsByRevision:
+    """Runs grouped by revision, ordered by the start time of each revision's earliest run.
+
+    Revisions are kept in buckets by the date of their earliest run, so adding runs
+    and querying a range of dates doesn't require sorting all the revisions.
+
+    Each revision appears once. Adding runs for a revision that's already present,
+    for example runs for one revision fetched for two different days, merges them
+    into a single RevisionRuns."""
+
+    def __init__(self, runs: Iterable[RevisionRuns]) -> None:
+        self._index: dict[str, RevisionRuns] = {}
+        self._by_date: dict[str, list[RevisionRuns]] = {}
+        # Sorted list of the keys of _by_date
+        self._dates: list[str] = []
+        for revision_runs in runs:
+            self.add(revision_runs)
+
+    def _insert(self, revision_runs: RevisionRuns) -> None:
+        date = revision_runs.start_date
+        if date not in self._by_date:
+            bisect.insort(self._dates, date)
+            self._by_date[date] = []
+        bisect.insort(self._by_date[date], revision_runs, key=_start_time_key)
+
+    def _remove(self, revision_runs: RevisionRuns, date: str) -> None:
+        bucket = self._by_date[date]
+        bucket.remove(revision_runs)
+        if not bucket:
+            del self._by_date[date]
+            del self._dates[bisect.bisect_left(self._dates, date)]
+
+    def add(self, revision_runs: RevisionRuns) -> None:
+        """Add the runs for a revision.
+
+        If the revision is already present the runs are added to its existing
+        RevisionRuns, which is moved if its start time changed.
+
+        :raises ValueError: if revision_runs is empty, since it has no start time
+                            to order it by."""
+        if not revision_runs:
+            raise ValueError(f"No runs for revision {revision_runs.revision}")
+        existing = self._index.get(revision_runs.revision)
+        if existing is None:
+            self._index[revision_runs.revision] = revision_runs
+            self._insert(revision_runs)
+        elif existing is not revision_runs:
+            prev_date = existing.start_date
+            prev_start_time = existing.min_start_time
+            existing.extend(revision_runs)
+            if existing.min_start_time != prev_start_time:
+                self._remove(existing, prev_date)
+                self._insert(existing)
+
+    def add_run(self, run: Run) -> None:
+        """Add a single run, keyed by its full revision hash"""
+        self.add(RevisionRuns(run.full_revision_hash, [run]))
 
     def __iter__(self) -> Iterator[RevisionRuns]:
         """Iterator over runs in date order"""
-        for run in self._runs:
-            yield run
+        for date in self._dates:
+            yield from self._by_date[date]
+
+    def __len__(self) -> int:
+        return len(self._index)
 
     def __contains__(self, revision: str) -> bool:
         return revision in self._index
@@ -339,28 +486,36 @@ class RunsByRevision:
     def __getitem__(self, revision: str) -> RevisionRuns:
         return self._index[revision]
 
-    def filter_by_revisions(self, revisions: set[str]) -> "RunsByRevision":
-        return RunsByRevision([item for item in self._runs if item.revision in revisions])
+    def dates(self) -> list[str]:
+        """Dates, as YYYY-MM-DD, on which at least one revision has its earliest run"""
+        return list(self._dates)
 
+    def between(self, from_date: datetime, to_date: datetime) -> Iterator[RevisionRuns]:
+        """Iterator over the runs for revisions whose earliest run is in [from_date, to_date),
+        in date order"""
+        start = bisect.bisect_left(self._dates, from_date.strftime("%Y-%m-%d"))
+        end = bisect.bisect_left(self._dates, to_date.strftime("%Y-%m-%d"))
+        for date in self._dates[start:end]:
+            yield from self._by_date[date]
 
-def group_by_date(runs_by_revision: RunsByRevision) -> RunsByDate:
-    runs_by_date: dict[str, list[RevisionRuns]] = {}
-    for rev_runs in runs_by_revision:
-        date = rev_runs.min_start_time.strftime("%Y-%m-%d")
-        if date not in runs_by_date:
-            runs_by_date[date] = []
-        runs_by_date[date].append(rev_runs)
+    def by_date(self) -> RunsByDate:
+        """Runs for each revision grouped by the date of the earliest run"""
+        return {date: list(self._by_date[date]) for date in self._dates}
 
-    return runs_by_date
+    def filter_by_revisions(self, revisions: set[str]) -> "RunsByRevision":
+        rv = RunsByRevision([])
+        for date in self._dates:
+            bucket = [item for item in self._by_date[date] if item.revision in revisions]
+            if bucket:
+                rv._dates.append(date)
+                rv._by_date[date] = bucket
+                for item in bucket:
+                    rv._index[item.revision] = item
+        return rv
 
 
-def run_info_filter_matches(
-    run_info_filter: Mapping[str, Json], run_info: Mapping[str, Json]
-) -> bool:
-    for key, value in run_info_filter.items():
-        if key in run_info and run_info[key] != value:
-            return False
-    return True
+def group_by_date(runs_by_revision: RunsByRevision) -> RunsByDate:
+    return runs_by_revision.by_date()
 
 
 def fetch_runs_gecko(
@@ -369,6 +524,10 @@ def fetch_runs_gecko(
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
 ) -> RunsByRevision:
+    """Get the Gecko runs for a given date range.
+
+    Only runs where every property in run_info_filter that's present in the
+    run_info has the given value are returned."""
     now = datetime.now()
     if from_date is None:
         from_date = datetime(now.year, 1, 1)
@@ -376,21 +535,20 @@ def fetch_runs_gecko(
         to_date = datetime(now.year, now.month, now.day)
 
     rv = []
-    for date_commits in gecko_runs(
-        results_analysis_repo.path, "mozilla-central", from_date, to_date
-    ).values():
-        for commit, commit_runs in date_commits.items():
-            revision_runs = RevisionRuns(commit, [])
-            push_date = commit_runs.push_date
-            for run_data in commit_runs.runs.values():
-                if run_info_filter_matches(run_info_filter, run_data.run_info):
-                    revision_runs.append(
-                        GeckoRun.from_run(commit, push_date, run_data.id, run_data.run_info)
-                    )
-            if revision_runs:
-                rv.append(revision_runs)
-                # TODO: remove this
-                assert len(revision_runs) == 1
+    for _, commit, commit_runs in gecko_runs(
+        results_analysis_repo.path, "mozilla-central", from_date, to_date, run_info_filter
+    ):
+        push_date = commit_runs.push_date
+        revision_runs = RevisionRuns(
+            commit,
+            [
+                GeckoRun.from_run(commit, push_date, run_data.id, run_data.run_info)
+                for run_data in commit_runs.runs.values()
+            ],
+        )
+        rv.append(revision_runs)
+        # TODO: remove this
+        assert len(revision_runs) == 1
 
     return RunsByRevision(rv)
 
@@ -403,13 +561,20 @@ def fetch_runs_wptfyi(
     aligned: bool = True,
     max_per_day: Optional[int] = None,
     run_cache: Optional[ContextManager["RunCacheData"]] = None,
+    run_store_path: str = DEFAULT_RUN_STORE_PATH,
 ) -> RunsByRevision:
     """Fetch all the runs for a given date range.
 
-    Runs are only fetched if they aren't found (keyed by date) in the run_cache."""
+    Runs are only fetched if they aren't found (keyed by date) in the run_cache. Recent
+    days are revalidated with a conditional request. Days that were already cached and
+    either weren't revalidated, or didn't change, are recorded in the cache's unchanged
+    set.
+
+    If run_cache isn't given, runs are cached in the database at run_store_path. This
+    defaults to wpt-fyi-runs.sqlite in the working directory; pass IN_MEMORY_RUN_STORE
+    to only cache runs for this call."""
 
-    revision_index: MutableMapping[str, int] = {}
-    rv: list[RevisionRuns] = []
+    rv = RunsByRevision([])
 
     now = datetime.now()
     if from_date is None:
@@ -423,6 +588,8 @@ def fetch_runs_wptfyi(
     ]
     for product in products:
         query.append(("product", product))
+    # Range fetches of aligned runs get all the runs and align each day here
+    unaligned_url = f"{RUNS_URL}?{urlencode(query)}"
     if aligned:
         query.append(("aligned", "true"))
     if max_per_day:
@@ -430,41 +597,163 @@ def fetch_runs_wptfyi(
 
     url = f"{RUNS_URL}?{urlencode(query)}"
 
-    fetch_date = from_date
+    def fetch_range(fetch_dates: list[datetime]) -> Mapping[datetime, list[Mapping[str, Any]]]:
+        if not aligned:
+            return fetch_runs_range(url, fetch_dates)
+        range_runs = fetch_runs_range(unaligned_url, fetch_dates)
+        return {date: align_runs(day_runs, products) for date, day_runs in range_runs.items()}
+
     cache_cutoff_date = now - timedelta(days=3)
 
     if run_cache is None:
-        run_cache = RunCache(products, channel, aligned, max_per_day)
+        run_cache = RunCache(products, channel, aligned, max_per_day, run_store_path)
     assert run_cache is not None
 
-    with run_cache as cache:
-        while fetch_date < to_date:
-            next_date = fetch_date + timedelta(days=1)
+    dates = []
+    fetch_date = from_date
+    while fetch_date < to_date:
+        dates.append(fetch_date)
+        fetch_date += timedelta(days=1)
 
-            if fetch_date in cache and fetch_date < cache_cutoff_date:
+    with run_cache as cache:
+        missing = [date for date in dates if date not in cache]
+        # Recent days may still get new runs, so check if they changed
+        stale = [date for date in dates if date >= cache_cutoff_date and date in cache]
+
+        if max_per_day:
+            # max-count applies to the whole request, so with a per-day limit each day
+            # has to be fetched separately to get the same runs
+            fetched = map_concurrent(
+                lambda fetch_dates: fetch_runs_range(url, fetch_dates),
+                date_ranges(missing, 1),
+            )
+        else:
+            fetched = map_concurrent(fetch_range, date_ranges(missing, RANGE_FETCH_DAYS))
+        for range_runs in fetched:
+            for date, day_runs in range_runs.items():
+                cache[date] = day_runs
+
+        revalidated = map_concurrent(
+            lambda item: revalidate_runs_day(url, *item),
+            [(date, cache.get_validators(date)) for date in stale],
+        )
+        changed = set(missing)
+        for date, (day_runs, validators) in zip(stale, revalidated):
+            if day_runs is not None and not same_runs(day_runs, cache[date]):
+                cache[date] = day_runs
+                changed.add(date)
+            cache.set_validators(date, validators)
+        # Cached days before the cutoff aren't fetched again, so they count as unchanged
+        cache.unchanged.update(date.strftime("%Y-%m-%d") for date in dates if date not in changed)
+
+        for fetch_date in dates:
+            if fetch_date not in changed:
                 logger.debug(f"Using cached data for {fetch_date.strftime('%Y-%m-%d')}")
-                day_runs = cache[fetch_date]
-            else:
-                date_query = urlencode(
-                    {"from": fetch_date.strftime("%Y-%m-%d"), "to": next_date.strftime("%Y-%m-%d")}
-                )
-                date_url = f"{url}&{date_query}"
-                logger.info(f"Fetching runs from {date_url}")
-                day_runs = requests.get(date_url).json()
-                cache[fetch_date] = day_runs
+            day_runs = cache[fetch_date]
 
             by_revision = group_by_revision(day_runs)
             for revision, runs in by_revision.items():
-                if revision not in revision_index:
-                    idx = len(rv)
-                    revision_index[revision] = idx
-                    rv.append(RevisionRuns(revision, []))
+                rv.add(RevisionRuns(revision, runs))
 
-                rv[revision_index[revision]].extend(runs)
+    return rv
 
-            fetch_date = next_date
 
-    return RunsByRevision(rv)
+def align_runs(runs: list[Mapping[str, Any]], products: list[str]) -> list[Mapping[str, Any]]:
+    """Keep the runs for revisions that have a run for each of products.
+
+    wpt.fyi aligns runs across the whole request window, so applying this to the runs
+    that started on a single day gives the same runs as an aligned request for that day.
+    """
+    browsers_by_revision: dict[str, set[str]] = {}
+    for run in runs:
+        browsers_by_revision.setdefault(run["full_revision_hash"], set()).add(run["browser_name"])
+    required = set(products)
+    return [run for run in runs if required <= browsers_by_revision[run["full_revision_hash"]]]
+
+
+def date_ranges(dates: list[datetime], max_days: int) -> Iterator[list[datetime]]:
+    """Split a sorted list of dates into runs of consecutive days, each at most max_days long"""
+    current: list[datetime] = []
+    for date in dates:
+        if current and (len(current) >= max_days or date - current[-1] != timedelta(days=1)):
+            yield current
+            current = []
+        current.append(date)
+    if current:
+        yield current
+
+
+def fetch_runs_range(url: str, dates: list[datetime]) -> Mapping[datetime, list[Mapping[str, Any]]]:
+    """Fetch the runs for a range of consecutive days in a single request,
+    and split them by the date the run started.
+
+    wpt.fyi selects runs for a date range by their time_start, so splitting on that
+    gives the same runs as fetching each day. If the response may have been truncated,
+    or contains a run that started outside the range, the range is fetched again one
+    day at a time."""
+    from_date = dates[0]
+    to_date = dates[-1] + timedelta(days=1)
+    date_query = {"from": from_date.strftime("%Y-%m-%d"), "to": to_date.strftime("%Y-%m-%d")}
+    if len(dates) > 1:
+        date_query["max-count"] = str(MAX_RUNS_PER_REQUEST)
+    date_url = f"{url}&{urlencode(date_query)}"
+    logger.info(f"Fetching runs from {date_url}")
+    runs = normalize_runs(get_json(date_url))
+
+    if len(dates) == 1:
+        return {from_date: runs}
+
+    if len(runs) >= MAX_RUNS_PER_REQUEST:
+        logger.info(f"Got {len(runs)} runs from {date_url}, fetching each day separately")
+        return fetch_runs_days(url, dates)
+
+    by_day: dict[str, list[Mapping[str, Any]]] = {date.strftime("%Y-%m-%d"): [] for date in dates}
+    for run in runs:
+        day = run["time_start"][:10]
+        if day not in by_day:
+            logger.warning(
+                f"Run {run['id']} from {date_url} started on {day}, fetching each day separately"
+            )
+            return fetch_runs_days(url, dates)
+        by_day[day].append(run)
+    return {date: by_day[date.strftime("%Y-%m-%d")] for date in dates}
+
+
+def fetch_runs_days(url: str, dates: list[datetime]) -> Mapping[datetime, list[Mapping[str, Any]]]:
+    """Fetch the runs for each of dates with one request per day"""
+    rv: dict[datetime, list[Mapping[str, Any]]] = {}
+    for date in dates:
+        rv.update(fetch_runs_range(url, [date]))
+    return rv
+
+
+def revalidate_runs_day(
+    url: str, date: datetime, validators: Mapping[str, str]
+) -> tuple[Optional[list[Mapping[str, Any]]], dict[str, str]]:
+    """Fetch the runs for a single cached day, using a conditional request.
+
+    :returns: Tuple of (runs, validators). runs is None if the day is unchanged.
+    """
+    to_date = date + timedelta(days=1)
+    date_query = {"from": date.strftime("%Y-%m-%d"), "to": to_date.strftime("%Y-%m-%d")}
+    date_url = f"{url}&{urlencode(date_query)}"
+    logger.info(f"Revalidating runs from {date_url}")
+    runs, validators = get_json_conditional(date_url, validators)
+    if runs is None:
+        logger.debug(f"Runs for {date_query['from']} not modified")
+        return None, validators
+    return normalize_runs(runs), validators
+
+
+def normalize_runs(runs: list[Mapping[str, Any]]) -> list[Mapping[str, Any]]:
+    """Convert runs from a wpt.fyi response to the JSON format produced by
+    WptFyiRun.to_json, so they can be compared with cached runs"""
+    return [WptFyiRun.from_json(run).to_json() for run in runs]
+
+
+def same_runs(runs: list[Mapping[str, Any]], other: list[Mapping[str, Any]]) -> bool:
+    """Check if two lists of runs, in the to_json format, contain the same runs in any order"""
+    return sorted(runs, key=itemgetter("id")) == sorted(other, key=itemgetter("id"))
 
 
 def group_by_revision(runs: list[Mapping[str, Any]]) -> Mapping[str, list[WptFyiRun]]:
@@ -478,10 +767,22 @@ def group_by_revision(runs: list[Mapping[str, Any]]) -> Mapping[str, list[WptFyi
 
 
 class RunCacheData:
-    """Run cache that stores a map of {date: [Run as JSON]}, matching the fetch_runs endpoint"""
+    """Run cache that stores a map of {date: [Run as JSON]}, matching the fetch_runs endpoint
+
+    After a fetch, unchanged holds the requested days that are known to match the
+    cache. These are the days older than the freshness cutoff that were already
+    cached, since those aren't fetched again, and the recent days that revalidated as
+    unchanged."""
 
-    def __init__(self, data: MutableMapping[str, Any]):
+    def __init__(
+        self, data: MutableMapping[str, Any], validator_store: Optional["ValidatorStore"] = None
+    ):
         self.data = data
+        self.validator_store = validator_store
+        # Validators for each day, and the ids of the runs in the response they came from
+        self.validators: dict[str, tuple[Mapping[str, str], frozenset[str]]] = {}
+        # Days whose runs are known to be unchanged since they were cached
+        self.unchanged: set[str] = set()
 
     def __contains__(self, date: datetime) -> bool:
         return date.strftime("%Y-%m-%d") in self.data
@@ -492,34 +793,204 @@ class RunCacheData:
     def __setitem__(self, date: datetime, value: list[Mapping[str, Any]]) -> None:
         self.data[date.strftime("%Y-%m-%d")] = value
 
+    def _run_ids(self, date: datetime) -> frozenset[str]:
+        if date not in self:
+            return frozenset()
+        return frozenset(str(run["id"]) for run in self[date])
+
+    def get_validators(self, date: datetime) -> Mapping[str, str]:
+        """Get the HTTP validators from the response the runs for date were read from.
+
+        Validators are only returned if every run in that response is still in the
+        cache, so that a 304 response means the cached runs are complete."""
+        key = date.strftime("%Y-%m-%d")
+        if key not in self.validators:
+            if self.validator_store is not None:
+                self.validators[key] = self.validator_store.get(key)
+            else:
+                self.validators[key] = ({}, frozenset())
+        validators, run_ids = self.validators[key]
+        if not run_ids <= self._run_ids(date):
+            return {}
+        return validators
+
+    def set_validators(self, date: datetime, validators: Mapping[str, str]) -> None:
+        """Set the HTTP validators for the response that the cached runs for date match"""
+        key = date.strftime("%Y-%m-%d")
+        value = (dict(validators), self._run_ids(date))
+        if self.validator_store is not None and self.validators.get(key) != value:
+            self.validator_store.set(key, *value)
+        self.validators[key] = value
+
+
+def run_cache_query(
+    products: list[str], channel: str, aligned: bool, max_per_day: Optional[int]
+) -> str:
+    """Key identifying a wpt.fyi runs query in a run database"""
+    products_str = "-".join(products)
+    return f"products:{products_str}-channel:{channel}-aligned:{aligned}-max_per_day:{max_per_day}"
+
+
+def open_run_store(path: str) -> sqlite3.Connection:
+    """Open the SQLite database of cached runs at path, creating it if necessary"""
+    if path != IN_MEMORY_RUN_STORE:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS days (
+            query TEXT NOT NULL,
+            date TEXT NOT NULL,
+            runs TEXT NOT NULL,
+            PRIMARY KEY (query, date)
+        );
+        CREATE TABLE IF NOT EXISTS revisions (
+            query TEXT NOT NULL,
+            date TEXT NOT NULL,
+            revision TEXT NOT NULL,
+            PRIMARY KEY (query, date, revision)
+        );
+        CREATE INDEX IF NOT EXISTS revisions_by_revision ON revisions (query, revision);
+        CREATE TABLE IF NOT EXISTS validators (
+            query TEXT NOT NULL,
+            date TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            run_ids TEXT NOT NULL,
+            PRIMARY KEY (query, date)
+        );
+        """
+    )
+    return conn
+
+
+def close_run_store(conn: sqlite3.Connection, commit: bool) -> None:
+    """Commit or roll back the changes to a run database, and close it"""
+    if commit:
+        conn.commit()
+    else:
+        conn.rollback()
+    conn.close()
+
+
+class ValidatorStore:
+    """HTTP validators for each day of a query, stored in a run database"""
+
+    def __init__(self, conn: sqlite3.Connection, query: str):
+        self.conn = conn
+        self.query = query
+
+    def get(self, date: str) -> tuple[Mapping[str, str], frozenset[str]]:
+        row = self.conn.execute(
+            "SELECT etag, last_modified, run_ids FROM validators WHERE query = ? AND date = ?",
+            (self.query, date),
+        ).fetchone()
+        if row is None:
+            return {}, frozenset()
+        validators = {}
+        for name, value in zip(["etag", "last-modified"], row[:2]):
+            if value is not None:
+                validators[name] = value
+        return validators, frozenset(json.loads(row[2]))
+
+    def set(self, date: str, validators: Mapping[str, str], run_ids: frozenset[str]) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO validators (query, date, etag, last_modified, run_ids) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                self.query,
+                date,
+                validators.get("etag"),
+                validators.get("last-modified"),
+                json.dumps(sorted(run_ids)),
+            ),
+        )
+
+
+class RunStoreData(RunCacheData):
+    """Run cache backed by the SQLite database of a RunCache.
+
+    Days are loaded when they are first accessed, and only days that are new or
+    changed are written back."""
+
+    def __init__(self, conn: sqlite3.Connection, query: str):
+        super().__init__({}, ValidatorStore(conn, query))
+        self.conn = conn
+        self.query = query
+        # Serialized form of each day that's been read from, or written to, the store
+        self._stored: dict[str, Optional[str]] = {}
+
+    def _load(self, date: str) -> Optional[str]:
+        if date not in self._stored:
+            row = self.conn.execute(
+                "SELECT runs FROM days WHERE query = ? AND date = ?", (self.query, date)
+            ).fetchone()
+            self._stored[date] = row[0] if row is not None else None
+            if row is not None:
+                self.data[date] = json.loads(row[0])
+        return self._stored[date]
+
+    def __contains__(self, date: datetime) -> bool:
+        return self._load(date.strftime("%Y-%m-%d")) is not None
+
+    def __getitem__(self, date: datetime) -> list[Mapping[str, Any]]:
+        key = date.strftime("%Y-%m-%d")
+        if self._load(key) is None:
+            raise KeyError(key)
+        return self.data[key]
+
+    def __setitem__(self, date: datetime, value: list[Mapping[str, Any]]) -> None:
+        key = date.strftime("%Y-%m-%d")
+        serialized = json.dumps(value, sort_keys=True)
+        # Load before assigning, since loading a stored day replaces the data for it
+        stored = self._load(key)
+        self.data[key] = value
+        if stored == serialized:
+            return
+        self._stored[key] = serialized
+        self.conn.execute(
+            "INSERT OR REPLACE INTO days (query, date, runs) VALUES (?, ?, ?)",
+            (self.query, key, serialized),
+        )
+        self.conn.execute("DELETE FROM revisions WHERE query = ? AND date = ?", (self.query, key))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO revisions (query, date, revision) VALUES (?, ?, ?)",
+            [(self.query, key, run["full_revision_hash"]) for run in value],
+        )
+
+    def dates_for_revision(self, revision: str) -> list[str]:
+        """Get the dates which have runs for a given revision"""
+        return [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT date FROM revisions WHERE query = ? AND revision = ? ORDER BY date",
+                (self.query, revision),
+            )
+        ]
+
 
 class RunCache:
+    """Persistent cache of wpt.fyi runs by day.
+
+    All queries share a single SQLite database, indexed by date and revision, so
+    only the days that are actually used are read. The database is usually kept in the
+    results cache repository, at repo.run_store_path."""
+
     def __init__(
         self,
         products: list[str],
         channel: str,
         aligned: bool = True,
         max_per_day: Optional[int] = None,
+        path: str = DEFAULT_RUN_STORE_PATH,
     ):
-        products_str = "-".join(products)
+        self.path = path
+        self.query = run_cache_query(products, channel, aligned, max_per_day)
+        self.conn: Optional[sqlite3.Connection] = None
 
-        self.path = (
-            f"products:{products_str}-channel:{channel}-"
-            f"aligned:{aligned}-max_per_day:{max_per_day}.json"
-        )
-        self.data: Optional[RunCacheData] = None
-
-    def __enter__(self) -> RunCacheData:
-        if os.path.exists(self.path):
-            with open(self.path) as f:
-                try:
-                    data = json.load(f)
-                except json.JSONDecodeError:
-                    data = {}
-        if self.data is None:
-            data = {}
-        self.data = RunCacheData(data)
-        return self.data
+    def __enter__(self) -> RunStoreData:
+        self.conn = open_run_store(self.path)
+        return RunStoreData(self.conn, self.query)
 
     def __exit__(
         self,
@@ -527,7 +998,6 @@ class RunCache:
         exc_val: Optional[BaseException],
         exc_tb: Optional[TracebackType],
     ) -> None:
-        if self.data is not None:
-            with open(self.path, "w") as f:
-                json.dump(self.data.data, f)
-            self.data = None
+        if self.conn is not None:
+            close_run_store(self.conn, exc_type is None)
+            self.conn = None
@@ -1,15 +1,13 @@
 import csv
-import gzip
-import json
 import logging
 import os
 import subprocess
-from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Callable, Dict, Iterable, Mapping, Optional, cast
 
 
 from . import _wpt_interop
+from .repo import run_store_path
 from .runs import RunsByDate, fetch_runs_wptfyi, group_by_date
 from .metadata import get_category_data
 
@@ -22,76 +20,6 @@ InteropScore = Mapping[str, int]
 ExpectedFailureScores = Mapping[str, list[tuple[int, int]]]
 
 
-def is_gzip(path: str) -> bool:
-    if os.path.splitext(path) == ".gz":
-        return True
-    try:
-        # Check for magic number at the start of the file
-        with open(path, "rb") as f:
-            return f.read(2) == b"\x1f\x8b"
-    except Exception:
-        return False
-
-
-@dataclass
-class SubtestResults:
-    name: str
-    status: str
-    expected: Optional[str] = None
-
-
-@dataclass
-class Results:
-    status: str
-    subtests: list[SubtestResults]
-    expected: Optional[str] = None
-
-
-def load_wptreport(path: str) -> Mapping[str, Results]:
-    rv = {}
-    opener = gzip.GzipFile if is_gzip(path) else open
-    with opener(path) as f:
-        try:
-            data = json.load(f)
-        except Exception as e:
-            raise IOError(f"Failed to read {path}") from e
-    for item in data["results"]:
-        subtests = [
-            SubtestResults(name=subtest["name"], status=subtest["status"])
-            for subtest in item["subtests"]
-        ]
-        result = Results(status=item["status"], subtests=subtests)
-        rv[item["test"]] = result
-    return rv
-
-
-def load_taskcluster_results(
-    log_paths: Iterable[str],
-    all_tests: set[str],
-    expected_failures: Mapping[str, set[Optional[str]]],
-) -> Mapping[str, Any]:
-    run_results = {}
-    for path in log_paths:
-        log_results = load_wptreport(path)
-        for test_name, results in log_results.items():
-            if test_name not in all_tests:
-                continue
-            if results.status == "SKIP":
-                # Sometimes we have multiple jobs which log SKIP for tests that aren't run
-                continue
-            if test_name in run_results:
-                logger.warning(f"Got duplicate results for {test_name}")
-            run_results[test_name] = results
-            if test_name in expected_failures:
-                if None in expected_failures[test_name]:
-                    run_results[test_name].expected = "FAIL"
-                else:
-                    for subtest_result in run_results[test_name].subtests:
-                        if subtest_result.name in expected_failures[test_name]:
-                            subtest_result.expected = "FAIL"
-    return run_results
-
-
 def date_range(
     year: int, from_date: Optional[datetime] = None, to_date: Optional[datetime] = None
 ) -> tuple[datetime, datetime]:
@@ -175,14 +103,18 @@ def score_wptreports(
         expected_failures = {}
 
     tests_by_category, all_tests = get_category_data(year, category_filter=category_filter)
-    runs_results = []
-    for log_paths in run_logs:
-        runs_results.append(load_taskcluster_results(log_paths, all_tests, expected_failures))
 
     expected_failure_scores: Optional[Mapping[str, list[tuple[int, int]]]]
-    run_scores, _, expected_failure_scores = _wpt_interop.interop_score(
-        runs_results, tests_by_category, set()
+    run_scores, _, expected_failure_scores, duplicates = _wpt_interop.score_wptreports(
+        [list(log_paths) for log_paths in run_logs],
+        tests_by_category,
+        set(),
+        expected_failures,
+        threads=os.cpu_count() or 1,
     )
+    for run_duplicates in duplicates:
+        for test_name in sorted(run_duplicates):
+            logger.warning(f"Got duplicate results for {test_name}")
 
     if not include_expected_failures:
         # Otherwise this will just be all zeros
@@ -221,7 +153,12 @@ def score_all_runs(
 
     from_date, to_date = date_range(year, from_date=from_date)
     runs_by_revision = fetch_runs_wptfyi(
-        products, "experimental" if experimental else "stable", from_date, to_date, aligned=False
+        products,
+        "experimental" if experimental else "stable",
+        from_date,
+        to_date,
+        aligned=False,
+        run_store_path=run_store_path(results_cache_path),
     )
 
     return score_runs_by_date(
@@ -252,6 +189,7 @@ def score_aligned_runs(
         to_date,
         aligned=True,
         max_per_day=max_per_day,
+        run_store_path=run_store_path(results_cache_path),
     )
 
     return score_runs_by_date(
@@ -297,6 +235,7 @@ def write_per_date_csv(
                 to_date,
                 aligned=True,
                 max_per_day=1,
+                run_store_path=run_store_path(results_cache_path),
             )
             results_by_date = score_runs_by_date(
                 group_by_date(runs_by_revision), tests_by_category, results_cache_path
@@ -1,13 +1,16 @@
 extern crate wpt_interop as interop;
 use interop::TestStatus;
 use pyo3::conversion::IntoPyObjectExt;
-use pyo3::exceptions::PyOSError;
+use pyo3::exceptions::{PyBufferError, PyKeyError, PyOSError};
 use pyo3::prelude::*;
-use pyo3::types::{PyDict, PyList};
+use pyo3::types::{PyBool, PyDict, PyFloat, PyInt, PyList, PyString};
 use std::collections::{BTreeMap, BTreeSet};
 use std::convert::TryFrom;
+use std::ffi::{c_char, c_int, c_void};
 use std::fmt;
-use std::path::PathBuf;
+use std::path::{Path, PathBuf};
+use std::ptr;
+use std::sync::Mutex;
 
 #[derive(Debug)]
 struct Error(interop::Error);
@@ -105,6 +108,7 @@ impl From<&interop::SubtestResult> for SubtestResult {
 
 #[pyfunction]
 fn interop_score(
+    py: Python<'_>,
     runs: Vec<BTreeMap<String, Results>>,
     tests: BTreeMap<String, BTreeSet<String>>,
     expected_not_ok: BTreeSet<String>,
@@ -113,51 +117,183 @@ fn interop_score(
     interop::InteropScore,
     interop::ExpectedFailureScores,
 )> {
-    // This is a (second?) copy of all the input data
-    let mut interop_runs: Vec<BTreeMap<String, interop::Results>> = Vec::with_capacity(runs.len());
-    for run in runs.into_iter() {
-        let mut run_map: BTreeMap<String, interop::Results> = BTreeMap::new();
-        for (key, value) in run.into_iter() {
-            run_map.insert(key, value.try_into().map_err(Error::from)?);
+    Ok(py
+        .detach(|| -> interop::Result<_> {
+            // Only keep the per-test scores, not a copy of all the input data
+            let mut interop_runs: Vec<interop::TestScores> = Vec::with_capacity(runs.len());
+            for run in runs.into_iter() {
+                let mut run_scores = interop::TestScores::new();
+                for (key, value) in run.into_iter() {
+                    let results: interop::Results = value.try_into()?;
+                    run_scores.insert(key, interop::TestScore::from_results(&results));
+                }
+                interop_runs.push(run_scores);
+            }
+            Ok(interop::score_test_scores(
+                interop_runs.iter(),
+                &tests,
+                &expected_not_ok,
+            ))
+        })
+        .map_err(Error::from)?)
+}
+
+/// Read-only mapping from test id to results for a single run
+///
+/// Python `Results` objects are only created for the tests that are
+/// accessed.
+#[pyclass(frozen, mapping)]
+struct RunResults {
+    // Sorted by test id
+    tests: Vec<String>,
+    results: Vec<interop::Results>,
+}
+
+impl RunResults {
+    fn new(results: BTreeMap<String, interop::Results>) -> RunResults {
+        let (tests, results) = results.into_iter().unzip();
+        RunResults { tests, results }
+    }
+
+    fn index(&self, test_id: &str) -> Option<usize> {
+        self.tests
+            .binary_search_by(|item| item.as_str().cmp(test_id))
+            .ok()
+    }
+}
+
+#[pymethods]
+impl RunResults {
+    fn __len__(&self) -> usize {
+        self.tests.len()
+    }
+
+    fn __contains__(&self, test_id: &str) -> bool {
+        self.index(test_id).is_some()
+    }
+
+    fn __getitem__(&self, test_id: &str) -> PyResult<Results> {
+        self.index(test_id)
+            .map(|idx| self.results[idx].clone().into())
+            .ok_or_else(|| PyKeyError::new_err(test_id.to_string()))
+    }
+
+    #[pyo3(signature = (test_id, default=None))]
+    fn get<'py>(
+        &self,
+        py: Python<'py>,
+        test_id: &str,
+        default: Option<Bound<'py, PyAny>>,
+    ) -> PyResult<Bound<'py, PyAny>> {
+        match self.index(test_id) {
+            Some(idx) => Results::from(self.results[idx].clone()).into_bound_py_any(py),
+            None => Ok(default.unwrap_or_else(|| py.None().into_bound(py))),
         }
-        interop_runs.push(run_map);
     }
-    Ok(interop::score_runs(
-        interop_runs.iter(),
-        &tests,
-        &expected_not_ok,
-    ))
+
+    fn __iter__(slf: Bound<'_, Self>) -> RunResultsIter {
+        RunResultsIter::new(slf, RunResultsIterKind::Keys)
+    }
+
+    fn keys(slf: Bound<'_, Self>) -> RunResultsIter {
+        RunResultsIter::new(slf, RunResultsIterKind::Keys)
+    }
+
+    fn items(slf: Bound<'_, Self>) -> RunResultsIter {
+        RunResultsIter::new(slf, RunResultsIterKind::Items)
+    }
+
+    fn values(slf: Bound<'_, Self>) -> RunResultsIter {
+        RunResultsIter::new(slf, RunResultsIterKind::Values)
+    }
+}
+
+enum RunResultsIterKind {
+    Keys,
+    Values,
+    Items,
+}
+
+/// Iterator over the test ids, results, or (test id, results) pairs in a
+/// `RunResults`
+///
+/// Python `Results` objects are created as the iterator advances.
+#[pyclass]
+struct RunResultsIter {
+    run: Py<RunResults>,
+    kind: RunResultsIterKind,
+    idx: usize,
+}
+
+impl RunResultsIter {
+    fn new(run: Bound<'_, RunResults>, kind: RunResultsIterKind) -> RunResultsIter {
+        RunResultsIter {
+            run: run.unbind(),
+            kind,
+            idx: 0,
+        }
+    }
+}
+
+#[pymethods]
+impl RunResultsIter {
+    fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
+    }
+
+    fn __next__<'py>(
+        mut slf: PyRefMut<'py, Self>,
+        py: Python<'py>,
+    ) -> PyResult<Option<Bound<'py, PyAny>>> {
+        let idx = slf.idx;
+        let run = slf.run.get();
+        let (Some(test_id), Some(results)) = (run.tests.get(idx), run.results.get(idx)) else {
+            return Ok(None);
+        };
+        let item = match slf.kind {
+            RunResultsIterKind::Keys => test_id.into_bound_py_any(py)?,
+            RunResultsIterKind::Values => Results::from(results.clone()).into_bound_py_any(py)?,
+            RunResultsIterKind::Items => {
+                (test_id, Results::from(results.clone())).into_bound_py_any(py)?
+            }
+        };
+        slf.idx += 1;
+        Ok(Some(item))
+    }
 }
 
 #[pyfunction]
 fn run_results(
+    py: Python<'_>,
     results_repo: PathBuf,
     run_ids: Vec<String>,
     tests: BTreeSet<String>,
-) -> PyResult<Vec<BTreeMap<String, Results>>> {
-    let results_cache = interop::results_cache::get(&results_repo).map_err(Error::from)?;
-
-    let mut results = Vec::with_capacity(run_ids.len());
-    for run_id in run_ids.into_iter() {
-        let mut run_results: BTreeMap<String, Results> = BTreeMap::new();
-        for (key, value) in results_cache
-            .results(&run_id, Some(&tests))
-            .map_err(Error::from)?
-            .into_iter()
-        {
-            run_results.insert(key, value.into());
-        }
-        results.push(run_results)
-    }
-    Ok(results)
+) -> PyResult<Vec<RunResults>> {
+    Ok(py
+        .detach(|| -> interop::Result<_> {
+            let results_cache = interop::results_cache::get(&results_repo)?;
+
+            let mut results = Vec::with_capacity(run_ids.len());
+            for run_id in run_ids.iter() {
+                results.push(RunResults::new(
+                    results_cache.results(run_id, Some(&tests))?,
+                ));
+            }
+            Ok(results)
+        })
+        .map_err(Error::from)?)
 }
 
 #[pyfunction]
+#[pyo3(signature = (results_repo, run_ids, tests_by_category, expected_not_ok, threads=1, score_cache=None))]
 fn score_runs(
+    py: Python<'_>,
     results_repo: PathBuf,
     run_ids: Vec<String>,
     tests_by_category: BTreeMap<String, BTreeSet<String>>,
     expected_not_ok: BTreeSet<String>,
+    threads: usize,
+    score_cache: Option<PathBuf>,
 ) -> PyResult<(
     interop::RunScores,
     interop::InteropScore,
@@ -167,47 +303,437 @@ fn score_runs(
     for tests in tests_by_category.values() {
         all_tests.extend(tests.iter().map(|item| item.into()));
     }
-    let results_cache = interop::results_cache::get(&results_repo).map_err(Error::from)?;
 
-    let run_results = run_ids
-        .into_iter()
-        .map(|run_id| results_cache.results(&run_id, Some(&all_tests)))
-        .collect::<interop::Result<Vec<_>>>()
+    Ok(py
+        .detach(|| -> interop::Result<_> {
+            let store = score_store(score_cache)?;
+            let test_scores = interop::results_cache::load_test_scores(
+                &results_repo,
+                &run_ids,
+                &all_tests,
+                store.as_ref(),
+                threads,
+            )?;
+            Ok(interop::score_test_scores(
+                test_scores.iter().map(|run| &run.scores),
+                &tests_by_category,
+                &expected_not_ok,
+            ))
+        })
+        .map_err(Error::from)?)
+}
+
+/// Score several groups of runs, loading each distinct run once.
+///
+/// Returns a list with the scores for each group, or None for groups
+/// containing a run that's missing from the results repository.
+#[pyfunction]
+#[pyo3(signature = (results_repo, groups, tests_by_category, expected_not_ok, threads=1, score_cache=None))]
+fn score_run_groups(
+    py: Python<'_>,
+    results_repo: PathBuf,
+    groups: Vec<Vec<String>>,
+    tests_by_category: BTreeMap<String, BTreeSet<String>>,
+    expected_not_ok: BTreeSet<String>,
+    threads: usize,
+    score_cache: Option<PathBuf>,
+) -> PyResult<Vec<Option<interop::results_cache::GroupScores>>> {
+    Ok(py
+        .detach(|| {
+            let store = score_store(score_cache)?;
+            interop::results_cache::score_run_groups(
+                &results_repo,
+                &groups,
+                &tests_by_category,
+                &expected_not_ok,
+                store.as_ref(),
+                threads,
+            )
+        })
+        .map_err(Error::from)?)
+}
+
+/// Per-test scores for a single run
+#[pyclass]
+struct RunTestScores {
+    #[pyo3(get)]
+    run_id: String,
+    scores: interop::results_cache::RunTestScores,
+}
+
+#[pymethods]
+impl RunTestScores {
+    #[getter]
+    fn tree_id(&self) -> String {
+        self.scores.tree_id.to_string()
+    }
+
+    fn __len__(&self) -> usize {
+        self.scores.scores.len()
+    }
+}
+
+fn score_store(
+    path: Option<PathBuf>,
+) -> interop::Result<Option<interop::score_store::TestScoreStore>> {
+    path.map(|path| interop::score_store::TestScoreStore::new(&path))
+        .transpose()
+}
+
+/// Get the per-test scores for a single run.
+///
+/// If `base` is provided and was computed for the same set of tests,
+/// only results that changed relative to the base run are read.
+/// If `score_cache` is provided, it's used as the path to an on-disk
+/// cache of per-test scores.
+#[pyfunction]
+#[pyo3(signature = (results_repo, run_id, tests, base=None, score_cache=None))]
+fn run_test_scores(
+    py: Python<'_>,
+    results_repo: PathBuf,
+    run_id: String,
+    tests: BTreeSet<String>,
+    base: Option<PyRef<'_, RunTestScores>>,
+    score_cache: Option<PathBuf>,
+) -> PyResult<RunTestScores> {
+    let base_scores = base.as_ref().map(|base| &base.scores);
+    let scores = py
+        .detach(|| {
+            let results_cache = interop::results_cache::get(&results_repo)?;
+            let store = score_store(score_cache)?;
+            match base_scores {
+                Some(base_scores) => results_cache.test_scores_from_base(
+                    base_scores,
+                    &run_id,
+                    &tests,
+                    store.as_ref(),
+                ),
+                None => results_cache.test_scores(&run_id, &tests, store.as_ref()),
+            }
+        })
+        .map_err(Error::from)?;
+    Ok(RunTestScores { run_id, scores })
+}
+
+#[pyfunction]
+fn score_test_scores(
+    py: Python<'_>,
+    runs: Vec<PyRef<'_, RunTestScores>>,
+    tests_by_category: BTreeMap<String, BTreeSet<String>>,
+    expected_not_ok: BTreeSet<String>,
+) -> PyResult<(
+    interop::RunScores,
+    interop::InteropScore,
+    interop::ExpectedFailureScores,
+)> {
+    let run_scores = runs
+        .iter()
+        .map(|run| &run.scores.scores)
+        .collect::<Vec<_>>();
+    Ok(py.detach(|| {
+        interop::score_test_scores(run_scores.into_iter(), &tests_by_category, &expected_not_ok)
+    }))
+}
+
+enum ArrayData {
+    U64(Vec<u64>),
+    Bool(Vec<u8>),
+}
+
+/// Read-only two dimensional array that supports the buffer protocol
+///
+/// This allows e.g. `numpy.asarray` to wrap the data without copying it.
+#[pyclass(frozen)]
+struct ArrayBuffer {
+    data: ArrayData,
+    shape: [isize; 2],
+    strides: [isize; 2],
+}
+
+impl ArrayBuffer {
+    fn new(data: ArrayData, rows: usize, columns: usize) -> ArrayBuffer {
+        let itemsize = match data {
+            ArrayData::U64(_) => std::mem::size_of::<u64>(),
+            ArrayData::Bool(_) => std::mem::size_of::<u8>(),
+        } as isize;
+        ArrayBuffer {
+            data,
+            shape: [rows as isize, columns as isize],
+            strides: [columns as isize * itemsize, itemsize],
+        }
+    }
+}
+
+#[pymethods]
+impl ArrayBuffer {
+    #[getter]
+    fn shape(&self) -> (usize, usize) {
+        (self.shape[0] as usize, self.shape[1] as usize)
+    }
+
+    fn __len__(&self) -> usize {
+        self.shape[0] as usize
+    }
+
+    unsafe fn __getbuffer__(
+        slf: Bound<'_, Self>,
+        view: *mut pyo3::ffi::Py_buffer,
+        flags: c_int,
+    ) -> PyResult<()> {
+        if view.is_null() {
+            return Err(PyBufferError::new_err("View is null"));
+        }
+        if (flags & pyo3::ffi::PyBUF_WRITABLE) == pyo3::ffi::PyBUF_WRITABLE {
+            return Err(PyBufferError::new_err("Object is not writable"));
+        }
+        let array = slf.get();
+        if (flags & pyo3::ffi::PyBUF_F_CONTIGUOUS) == pyo3::ffi::PyBUF_F_CONTIGUOUS
+            && array.shape[0] > 1
+            && array.shape[1] > 1
+        {
+            return Err(PyBufferError::new_err("Array is not Fortran contiguous"));
+        }
+        let (buf, len, itemsize, format) = match &array.data {
+            ArrayData::U64(data) => (
+                data.as_ptr() as *mut c_void,
+                std::mem::size_of_val(data.as_slice()),
+                std::mem::size_of::<u64>(),
+                c"Q",
+            ),
+            ArrayData::Bool(data) => (
+                data.as_ptr() as *mut c_void,
+                std::mem::size_of_val(data.as_slice()),
+                std::mem::size_of::<u8>(),
+                c"?",
+            ),
+        };
+
+        // The shape and strides point into the object, which the view keeps alive
+        (*view).obj = slf.clone().into_any().into_ptr();
+        (*view).buf = buf;
+        (*view).len = len as isize;
+        (*view).readonly = 1;
+        (*view).itemsize = itemsize as isize;
+        (*view).format = if (flags & pyo3::ffi::PyBUF_FORMAT) == pyo3::ffi::PyBUF_FORMAT {
+            format.as_ptr() as *mut c_char
+        } else {
+            ptr::null_mut()
+        };
+        if (flags & pyo3::ffi::PyBUF_ND) == pyo3::ffi::PyBUF_ND {
+            (*view).ndim = 2;
+            (*view).shape = array.shape.as_ptr() as *mut isize;
+        } else {
+            // Without PyBUF_ND the consumer sees a flat array of bytes
+            (*view).ndim = 1;
+            (*view).shape = ptr::null_mut();
+        }
+        (*view).strides = if (flags & pyo3::ffi::PyBUF_STRIDES) == pyo3::ffi::PyBUF_STRIDES {
+            array.strides.as_ptr() as *mut isize
+        } else {
+            ptr::null_mut()
+        };
+        (*view).suboffsets = ptr::null_mut();
+        (*view).internal = ptr::null_mut();
+        Ok(())
+    }
+
+    unsafe fn __releasebuffer__(&self, _view: *mut pyo3::ffi::Py_buffer) {}
+}
+
+/// Per-test scores for a set of runs, as arrays
+#[pyclass(frozen)]
+struct TestScoreMatrix {
+    #[pyo3(get)]
+    run_ids: Vec<String>,
+    #[pyo3(get)]
+    categories: Vec<String>,
+    #[pyo3(get)]
+    tests: Vec<String>,
+    /// runs × tests array of subtest passes
+    #[pyo3(get)]
+    passes: Py<ArrayBuffer>,
+    /// runs × tests array of subtest totals; 0 where the run has no result
+    #[pyo3(get)]
+    totals: Py<ArrayBuffer>,
+    /// categories × tests array, true where the test is in the category
+    #[pyo3(get)]
+    category_mask: Py<ArrayBuffer>,
+}
+
+/// Get the per-test passes and totals for a set of runs.
+///
+/// The arrays support the buffer protocol, so they can be wrapped by
+/// NumPy without copying.
+#[pyfunction]
+#[pyo3(signature = (results_repo, run_ids, tests_by_category, threads=1, score_cache=None))]
+fn test_score_matrix(
+    py: Python<'_>,
+    results_repo: PathBuf,
+    run_ids: Vec<String>,
+    tests_by_category: BTreeMap<String, BTreeSet<String>>,
+    threads: usize,
+    score_cache: Option<PathBuf>,
+) -> PyResult<TestScoreMatrix> {
+    let mut all_tests = BTreeSet::new();
+    for tests in tests_by_category.values() {
+        all_tests.extend(tests.iter().cloned());
+    }
+
+    let matrix = py
+        .detach(|| -> interop::Result<_> {
+            let store = score_store(score_cache)?;
+            let test_scores = interop::results_cache::load_test_scores(
+                &results_repo,
+                &run_ids,
+                &all_tests,
+                store.as_ref(),
+                threads,
+            )?;
+            Ok(interop::TestScoreMatrix::new(
+                test_scores.iter().map(|run| &run.scores),
+                &tests_by_category,
+            ))
+        })
         .map_err(Error::from)?;
-    Ok(interop::score_runs(
-        run_results.iter(),
-        &tests_by_category,
-        &expected_not_ok,
-    ))
+
+    let num_tests = matrix.tests.len();
+    let num_categories = matrix.categories.len();
+    Ok(TestScoreMatrix {
+        run_ids,
+        passes: Py::new(
+            py,
+            ArrayBuffer::new(ArrayData::U64(matrix.passes), matrix.num_runs, num_tests),
+        )?,
+        totals: Py::new(
+            py,
+            ArrayBuffer::new(ArrayData::U64(matrix.totals), matrix.num_runs, num_tests),
+        )?,
+        category_mask: Py::new(
+            py,
+            ArrayBuffer::new(
+                ArrayData::Bool(matrix.category_mask),
+                num_categories,
+                num_tests,
+            ),
+        )?,
+        categories: matrix.categories,
+        tests: matrix.tests,
+    })
+}
+
+/// Compute the Interop scores for runs given as lists of wptreport files.
+///
+/// Also returns the set of tests that had duplicate results for each run.
+#[pyfunction]
+#[pyo3(signature = (run_logs, tests_by_category, expected_not_ok, expected_failures, threads=1))]
+fn score_wptreports(
+    py: Python<'_>,
+    run_logs: Vec<Vec<PathBuf>>,
+    tests_by_category: BTreeMap<String, BTreeSet<String>>,
+    expected_not_ok: BTreeSet<String>,
+    expected_failures: interop::wptreport::ExpectedFailures,
+    threads: usize,
+) -> PyResult<(
+    interop::RunScores,
+    interop::InteropScore,
+    interop::ExpectedFailureScores,
+    Vec<BTreeSet<String>>,
+)> {
+    let mut all_tests = BTreeSet::new();
+    for tests in tests_by_category.values() {
+        all_tests.extend(tests.iter().cloned());
+    }
+
+    Ok(py
+        .detach(|| -> interop::Result<_> {
+            let runs = interop::wptreport::score_wptreports(
+                &run_logs,
+                &all_tests,
+                &expected_failures,
+                threads,
+            )?;
+            let (run_scores, interop_scores, expected_failure_scores) = interop::score_test_scores(
+                runs.iter().map(|run| &run.scores),
+                &tests_by_category,
+                &expected_not_ok,
+            );
+            Ok((
+                run_scores,
+                interop_scores,
+                expected_failure_scores,
+                runs.into_iter().map(|run| run.duplicates).collect(),
+            ))
+        })
+        .map_err(Error::from)?)
+}
+
+/// Write the results in a set of wptreport files into a results
+/// repository as the run `run_id`, returning the id of the results tree.
+#[pyfunction]
+fn import_wptreports(
+    py: Python<'_>,
+    results_repo: PathBuf,
+    run_id: String,
+    log_paths: Vec<PathBuf>,
+) -> PyResult<String> {
+    Ok(py
+        .detach(|| interop::results_cache::import_wptreports(&results_repo, &run_id, &log_paths))
+        .map_err(Error::from)?
+        .to_string())
 }
 
 type TestSet = BTreeSet<String>;
 type TestsByCategory = BTreeMap<String, TestSet>;
 
 #[pyfunction]
-#[pyo3(signature = (metadata_repo_path, labels_by_category, metadata_revision=None))]
+#[pyo3(signature = (metadata_repo_path, labels_by_category, metadata_revision=None, threads=None))]
 fn interop_tests(
+    py: Python<'_>,
     metadata_repo_path: PathBuf,
     labels_by_category: BTreeMap<String, BTreeSet<String>>,
     metadata_revision: Option<String>,
-) -> PyResult<(String, TestsByCategory, TestSet)> {
-    let mut tests_by_category = BTreeMap::new();
-    let mut all_tests = BTreeSet::new();
-    let (commit_id, metadata) =
-        interop::metadata::load_metadata(&metadata_repo_path, metadata_revision.as_deref())
-            .map_err(Error::from)?;
-    let patterns_by_label = metadata.patterns_by_label(None);
-    for (category, labels) in labels_by_category.into_iter() {
-        let mut tests = BTreeSet::new();
-        for label in labels.iter() {
-            if let Some(patterns) = patterns_by_label.get(&label.as_str()) {
-                tests.extend(patterns.iter().map(|x| x.to_string()));
-                all_tests.extend(patterns.iter().map(|x| x.to_string()));
+    threads: Option<usize>,
+) -> PyResult<(
+    String,
+    TestsByCategory,
+    TestSet,
+    BTreeMap<String, String>,
+    String,
+)> {
+    Ok(py
+        .detach(|| -> interop::Result<_> {
+            let mut tests_by_category = BTreeMap::new();
+            let mut all_tests = BTreeSet::new();
+            let (commit_id, metadata) = interop::metadata::load_metadata(
+                &metadata_repo_path,
+                metadata_revision.as_deref(),
+                threads,
+            )?;
+            let patterns_by_label = metadata.patterns_by_label(None);
+            for (category, labels) in labels_by_category.into_iter() {
+                let mut tests = BTreeSet::new();
+                for label in labels.iter() {
+                    if let Some(patterns) = patterns_by_label.get(&label.as_str()) {
+                        tests.extend(patterns.iter().map(|x| x.to_string()));
+                        all_tests.extend(patterns.iter().map(|x| x.to_string()));
+                    }
+                }
+                tests_by_category.insert(category, tests);
             }
-        }
-        tests_by_category.insert(category, tests);
-    }
-    Ok((commit_id.to_string(), tests_by_category, all_tests))
+            let (category_fingerprints, fingerprint) =
+                interop::tests_by_category_fingerprints(&tests_by_category);
+            Ok((
+                commit_id.to_string(),
+                tests_by_category,
+                all_tests,
+                category_fingerprints
+                    .into_iter()
+                    .map(|(category, fingerprint)| (category, format!("{:016x}", fingerprint)))
+                    .collect(),
+                format!("{:016x}", fingerprint),
+            ))
+        })
+        .map_err(Error::from)?)
 }
 
 fn is_regression(prev_status: TestStatus, new_status: TestStatus) -> bool {
@@ -225,25 +751,23 @@ type TestRegression = Option<String>;
 type SubtestRegression = Vec<(String, String)>;
 type Labels = Vec<String>;
 
-#[pyfunction]
-fn regressions(
-    results_repo: PathBuf,
-    metadata_repo_path: PathBuf,
-    run_ids: (String, String),
-) -> PyResult<BTreeMap<String, (TestRegression, SubtestRegression, Labels)>> {
-    let results_cache = interop::results_cache::get(&results_repo).map_err(Error::from)?;
-    let (_, metadata) =
-        interop::metadata::load_metadata(&metadata_repo_path, None).map_err(Error::from)?;
-    let base_results = results_cache
-        .results(&run_ids.0, None)
-        .map_err(Error::from)?;
-    let comparison_results = results_cache
-        .results(&run_ids.1, None)
-        .map_err(Error::from)?;
+type RegressionsByTest = BTreeMap<String, (TestRegression, SubtestRegression, Labels)>;
+
+fn find_regressions(
+    results_repo: &Path,
+    metadata_repo_path: &Path,
+    run_ids: &(String, String),
+) -> interop::Result<RegressionsByTest> {
+    let results_cache = interop::results_cache::get(results_repo)?;
+    let (_, metadata) = interop::metadata::load_metadata(metadata_repo_path, None, None)?;
+    let mut interner = interop::compact::Interner::new();
+    let base_results = results_cache.compact_results(&run_ids.0, None, &mut interner)?;
+    let comparison_results = results_cache.compact_results(&run_ids.1, None, &mut interner)?;
 
     let mut regressed = BTreeMap::new();
-    for (test, new_results) in comparison_results.iter() {
-        if let Some(prev_results) = base_results.get(test) {
+    for new_results in comparison_results.iter() {
+        if let Some(prev_results) = base_results.get_id(new_results.name) {
+            let test = interner.resolve(new_results.name);
             let test_regression = if is_regression(prev_results.status, new_results.status) {
                 Some(new_results.status.to_string())
             } else {
@@ -252,19 +776,19 @@ fn regressions(
             let mut subtest_regressions = Vec::new();
             let prev_subtest_results = BTreeMap::from_iter(
                 prev_results
-                    .subtests
-                    .iter()
-                    .map(|result| (&result.name, result.status)),
+                    .subtests()
+                    .map(|result| (result.name, result.status)),
             );
             let test_metadata = metadata.get(test);
-            for (subtest, new_subtest_result) in new_results
-                .subtests
-                .iter()
-                .map(|result| (&result.name, result.status))
-            {
-                if let Some(prev_subtest_result) = prev_subtest_results.get(&subtest) {
-                    if is_subtest_regression(*prev_subtest_result, new_subtest_result) {
-                        subtest_regressions.push((subtest.clone(), new_subtest_result.to_string()));
+            for new_subtest_result in new_results.subtests() {
+                if let Some(prev_subtest_result) =
+                    prev_subtest_results.get(&new_subtest_result.name)
+                {
+                    if is_subtest_regression(*prev_subtest_result, new_subtest_result.status) {
+                        subtest_regressions.push((
+                            interner.resolve(new_subtest_result.name).to_string(),
+                            new_subtest_result.status.to_string(),
+                        ));
                     }
                 }
             }
@@ -274,13 +798,28 @@ fn regressions(
                 } else {
                     vec![]
                 };
-                regressed.insert(test.clone(), (test_regression, subtest_regressions, labels));
+                regressed.insert(
+                    test.to_string(),
+                    (test_regression, subtest_regressions, labels),
+                );
             }
         }
     }
     Ok(regressed)
 }
 
+#[pyfunction]
+fn regressions(
+    py: Python<'_>,
+    results_repo: PathBuf,
+    metadata_repo_path: PathBuf,
+    run_ids: (String, String),
+) -> PyResult<RegressionsByTest> {
+    Ok(py
+        .detach(|| find_regressions(&results_repo, &metadata_repo_path, &run_ids))
+        .map_err(Error::from)?)
+}
+
 #[pyclass]
 struct GeckoRuns {
     #[pyo3(get)]
@@ -371,38 +910,141 @@ fn serde_json_to_py(py: Python<'_>, value: serde_json::Value) -> PyResult<Py<PyA
     out_value.into_py_any(py)
 }
 
+/// Convert a JSON-like Python value to a `serde_json::Value`.
+///
+/// Lists and dicts with string keys are converted recursively. Other
+/// containers, such as tuples, are rejected since they never compare equal
+/// to the lists in a run_info.
+fn py_to_serde_json(value: &Bound<'_, PyAny>) -> PyResult<serde_json::Value> {
+    if value.is_none() {
+        Ok(serde_json::Value::Null)
+    } else if let Ok(x) = value.cast::<PyBool>() {
+        Ok(serde_json::Value::Bool(x.is_true()))
+    } else if value.is_instance_of::<PyInt>() {
+        if let Ok(x) = value.extract::<i64>() {
+            Ok(x.into())
+        } else if let Ok(x) = value.extract::<u64>() {
+            Ok(x.into())
+        } else {
+            Err(pyo3::exceptions::PyValueError::new_err(format!(
+                "Integer {} out of range",
+                value.repr()?
+            )))
+        }
+    } else if value.is_instance_of::<PyFloat>() {
+        serde_json::Number::from_f64(value.extract::<f64>()?)
+            .map(serde_json::Value::Number)
+            .ok_or_else(|| pyo3::exceptions::PyValueError::new_err("Invalid number"))
+    } else if value.is_instance_of::<PyString>() {
+        Ok(serde_json::Value::String(value.extract::<String>()?))
+    } else if let Ok(list) = value.cast::<PyList>() {
+        list.iter()
+            .map(|item| py_to_serde_json(&item))
+            .collect::<PyResult<Vec<_>>>()
+            .map(serde_json::Value::Array)
+    } else if let Ok(dict) = value.cast::<PyDict>() {
+        dict.iter()
+            .map(|(key, item)| Ok((key.extract::<String>()?, py_to_serde_json(&item)?)))
+            .collect::<PyResult<serde_json::Map<_, _>>>()
+            .map(serde_json::Value::Object)
+    } else {
+        Err(pyo3::exceptions::PyTypeError::new_err(format!(
+            "Unsupported run_info filter value {}",
+            value.repr()?
+        )))
+    }
+}
+
+/// Iterator over `(date, commit, runs)` for the Gecko runs matching a run_info filter
+#[pyclass]
+struct GeckoRunsIter {
+    inner: Mutex<interop::results_cache::GeckoRunsIter>,
+}
+
+#[pymethods]
+impl GeckoRunsIter {
+    fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
+    }
+
+    fn __next__(&self, py: Python<'_>) -> PyResult<Option<(chrono::NaiveDate, String, GeckoRuns)>> {
+        let inner = &self.inner;
+        let next = py
+            .detach(|| {
+                inner
+                    .lock()
+                    .expect("Gecko runs iterator lock poisoned")
+                    .next()
+                    .transpose()
+            })
+            .map_err(Error::from)?;
+        Ok(next.map(|(date, commit, runs)| (date, commit, GeckoRuns::from(runs))))
+    }
+}
+
 #[pyfunction]
-#[pyo3(signature = (results_repo, branch, from_date, to_date=None))]
+#[pyo3(signature = (results_repo, branch, from_date, to_date=None, run_info_filter=None))]
 fn gecko_runs(
+    py: Python<'_>,
     results_repo: PathBuf,
     branch: String,
     from_date: chrono::NaiveDate,
     to_date: Option<chrono::NaiveDate>,
-) -> PyResult<BTreeMap<chrono::NaiveDate, BTreeMap<String, GeckoRuns>>> {
-    let results_cache =
-        interop::results_cache::GeckoResultsCache::new(&results_repo).map_err(Error::from)?;
-    let runs = results_cache
-        .get_runs(&branch, from_date, to_date)
+    run_info_filter: Option<BTreeMap<String, Bound<'_, PyAny>>>,
+) -> PyResult<GeckoRunsIter> {
+    let run_info_filter = run_info_filter
+        .unwrap_or_default()
+        .into_iter()
+        .map(|(key, value)| Ok((key, py_to_serde_json(&value)?)))
+        .collect::<PyResult<interop::results_cache::RunInfoFilter>>()?;
+    let inner = py
+        .detach(|| -> interop::Result<_> {
+            let results_cache = interop::results_cache::GeckoResultsCache::new(&results_repo)?;
+            results_cache.iter_runs(&branch, from_date, to_date, run_info_filter)
+        })
         .map_err(Error::from)?;
-    let mut rv = BTreeMap::new();
-    for (date, date_data) in runs.into_iter() {
-        let mut date_result = BTreeMap::new();
-        for (commit, commit_data) in date_data.into_iter() {
-            date_result.insert(commit, GeckoRuns::from(commit_data));
-        }
-        rv.insert(date, date_result);
-    }
-    Ok(rv)
+    Ok(GeckoRunsIter {
+        inner: Mutex::new(inner),
+    })
+}
+
+/// Set the maximum number of parsed test results kept in memory between calls.
+///
+/// The default is 100,000 entries. Each entry costs roughly 150 bytes plus
+/// roughly 100 bytes per subtest, so a full cache at the default capacity uses
+/// a few hundred MiB for typical wpt results. Setting this to zero disables
+/// the cache.
+#[pyfunction]
+fn set_results_cache_capacity(capacity: usize) {
+    interop::results_cache::set_blob_cache_capacity(capacity);
 }
 
 #[pymodule]
 #[pyo3(name = "_wpt_interop")]
 fn _wpt_interop(m: &Bound<'_, PyModule>) -> PyResult<()> {
+    m.add_class::<RunResults>()?;
+    m.add_class::<RunResultsIter>()?;
+    // Make isinstance checks agree with the type stub
+    m.py()
+        .import("collections.abc")?
+        .getattr("Mapping")?
+        .call_method1("register", (m.py().get_type::<RunResults>(),))?;
+    m.add_class::<RunTestScores>()?;
+    m.add_class::<ArrayBuffer>()?;
+    m.add_class::<TestScoreMatrix>()?;
+    m.add_class::<GeckoRunsIter>()?;
     m.add_function(wrap_pyfunction!(interop_score, m)?)?;
     m.add_function(wrap_pyfunction!(run_results, m)?)?;
     m.add_function(wrap_pyfunction!(score_runs, m)?)?;
+    m.add_function(wrap_pyfunction!(score_run_groups, m)?)?;
+    m.add_function(wrap_pyfunction!(run_test_scores, m)?)?;
+    m.add_function(wrap_pyfunction!(score_test_scores, m)?)?;
+    m.add_function(wrap_pyfunction!(test_score_matrix, m)?)?;
+    m.add_function(wrap_pyfunction!(score_wptreports, m)?)?;
+    m.add_function(wrap_pyfunction!(import_wptreports, m)?)?;
     m.add_function(wrap_pyfunction!(interop_tests, m)?)?;
     m.add_function(wrap_pyfunction!(regressions, m)?)?;
     m.add_function(wrap_pyfunction!(gecko_runs, m)?)?;
+    m.add_function(wrap_pyfunction!(set_results_cache_capacity, m)?)?;
     Ok(())
 }
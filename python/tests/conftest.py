@@ -0,0 +1,117 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from wpt_interop import runs
+
+
+class Request(NamedTuple):
+    path: str
+    status: int
+    if_none_match: Optional[str]
+
+
+class FakeWptFyi:
+    """Stand-in for the wpt.fyi runs API.
+
+    Runs are selected by time_start, newest first, like the real endpoint. Responses
+    have an ETag, unless send_etag is False, and conditional requests with a matching
+    If-None-Match get a 304."""
+
+    def __init__(self) -> None:
+        self.runs: list[dict[str, Any]] = []
+        # Field used to select runs for a date range
+        self.date_field = "time_start"
+        self.send_etag = True
+        self.requests: list[Request] = []
+        self.lock = threading.Lock()
+
+    def add_run(
+        self, browser_name: str, revision: str, time_start: str, created_at: str | None = None
+    ) -> dict[str, Any]:
+        run_id = len(self.runs) + 1
+        run = {
+            "id": run_id,
+            "browser_name": browser_name,
+            "browser_version": "1.0",
+            "os_name": "linux",
+            "os_version": "22.04",
+            "revision": revision[:10],
+            "full_revision_hash": revision,
+            "results_url": f"https://example.test/results/{run_id}.json",
+            "created_at": created_at if created_at is not None else time_start,
+            "time_start": time_start,
+            "time_end": time_start,
+            "raw_results_url": f"https://example.test/raw/{run_id}.json",
+            "labels": ["master", "experimental", browser_name],
+        }
+        self.runs.append(run)
+        return run
+
+    def query(self, params: dict[str, list[str]]) -> list[dict[str, Any]]:
+        products = set(params.get("product", []))
+        from_date = params["from"][0]
+        to_date = params["to"][0]
+        selected = [
+            run
+            for run in self.runs
+            if from_date <= run[self.date_field][:10] < to_date
+            and (not products or run["browser_name"] in products)
+        ]
+        if params.get("aligned") == ["true"]:
+            by_revision: dict[str, set[str]] = {}
+            for run in selected:
+                by_revision.setdefault(run["full_revision_hash"], set()).add(run["browser_name"])
+            selected = [
+                run for run in selected if by_revision[run["full_revision_hash"]] == products
+            ]
+        selected.sort(key=lambda run: run["time_start"], reverse=True)
+        max_count = min(int(params.get("max-count", ["100"])[0]), runs.MAX_RUNS_PER_REQUEST)
+        return selected[:max_count]
+
+    def range_requests(self) -> int:
+        return len([request for request in self.requests if "max-count" in request.path])
+
+    def day_requests(self) -> int:
+        return len(self.requests) - self.range_requests()
+
+
+@pytest.fixture
+def wptfyi_server(monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeWptFyi]:
+    fake = FakeWptFyi()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            body = json.dumps(fake.query(parse_qs(url.query))).encode()
+            etag = f'"{hashlib.sha256(body).hexdigest()}"'
+            if_none_match = self.headers.get("If-None-Match")
+            status = 304 if fake.send_etag and if_none_match == etag else 200
+            with fake.lock:
+                fake.requests.append(Request(self.path, status, if_none_match))
+            self.send_response(status)
+            if fake.send_etag:
+                self.send_header("ETag", etag)
+            if status == 200:
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.end_headers()
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(runs, "RUNS_URL", f"http://127.0.0.1:{server.server_port}/api/runs")
+    yield fake
+    server.shutdown()
+    server.server_close()
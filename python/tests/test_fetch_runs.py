@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from wpt_interop import runs
+from wpt_interop.repo import run_store_path
+
+from conftest import FakeWptFyi
+
+PRODUCTS = ["chrome", "firefox"]
+FROM_DATE = datetime(2024, 3, 1)
+NUM_DAYS = 60
+TO_DATE = FROM_DATE + timedelta(days=NUM_DAYS)
+
+
+def add_runs(server: FakeWptFyi) -> None:
+    for day in range(NUM_DAYS):
+        date = (FROM_DATE + timedelta(days=day)).strftime("%Y-%m-%d")
+        for hour in [2, 14]:
+            revision = f"{day:04d}{hour:02d}".ljust(40, "0")
+            server.add_run("chrome", revision, f"{date}T{hour:02d}:00:00Z")
+            server.add_run("firefox", revision, f"{date}T{hour + 1:02d}:00:00Z")
+    # A revision whose runs are on either side of midnight
+    server.add_run("chrome", "f" * 40, "2024-03-10T23:30:00Z")
+    server.add_run("firefox", "f" * 40, "2024-03-11T00:30:00Z")
+
+
+def fetch(
+    tmp_path: Path, name: str, aligned: bool, max_per_day: int | None = None
+) -> list[tuple[str, list[str]]]:
+    run_cache = runs.RunCache(
+        PRODUCTS, "experimental", aligned, max_per_day, path=str(tmp_path / f"{name}.sqlite")
+    )
+    result = runs.fetch_runs_wptfyi(
+        PRODUCTS,
+        "experimental",
+        FROM_DATE,
+        TO_DATE,
+        aligned=aligned,
+        max_per_day=max_per_day,
+        run_cache=run_cache,
+    )
+    return [(revision_runs.revision, revision_runs.run_ids()) for revision_runs in result]
+
+
+def fetch_per_day(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, aligned: bool
+) -> list[tuple[str, list[str]]]:
+    with monkeypatch.context() as m:
+        m.setattr(runs, "RANGE_FETCH_DAYS", 1)
+        return fetch(tmp_path, "per-day", aligned)
+
+
+def test_range_fetch_matches_per_day(
+    wptfyi_server: FakeWptFyi, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    add_runs(wptfyi_server)
+    expected = fetch_per_day(tmp_path, monkeypatch, False)
+    assert wptfyi_server.day_requests() == NUM_DAYS
+    wptfyi_server.requests.clear()
+
+    assert fetch(tmp_path, "range", False) == expected
+    # 60 days are fetched as ranges of 31 and 29 days
+    assert wptfyi_server.range_requests() == 2
+    assert wptfyi_server.day_requests() == 0
+    assert len(expected) == 2 * NUM_DAYS + 1
+
+
+def test_range_fetch_truncated(
+    wptfyi_server: FakeWptFyi, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    add_runs(wptfyi_server)
+    monkeypatch.setattr(runs, "MAX_RUNS_PER_REQUEST", 10)
+    expected = fetch_per_day(tmp_path, monkeypatch, False)
+    wptfyi_server.requests.clear()
+
+    # Each range hits the limit, so all the days are fetched separately
+    assert fetch(tmp_path, "range", False) == expected
+    assert wptfyi_server.range_requests() == 2
+    assert wptfyi_server.day_requests() == NUM_DAYS
+
+
+def test_range_fetch_run_outside_range(
+    wptfyi_server: FakeWptFyi, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    add_runs(wptfyi_server)
+    # Select runs by created_at, so a run can start before the requested range
+    wptfyi_server.date_field = "created_at"
+    wptfyi_server.add_run(
+        "chrome", "e" * 40, "2024-02-29T23:00:00Z", created_at="2024-03-01T01:00:00Z"
+    )
+    expected = fetch_per_day(tmp_path, monkeypatch, False)
+    wptfyi_server.requests.clear()
+
+    # The first range is fetched again by day, rather than dropping the run
+    assert fetch(tmp_path, "range", False) == expected
+    assert "e" * 40 in [revision for revision, _ in expected]
+    assert wptfyi_server.range_requests() == 2
+    assert wptfyi_server.day_requests() == 31
+
+
+def test_aligned_range_fetch(wptfyi_server: FakeWptFyi, tmp_path: Path) -> None:
+    add_runs(wptfyi_server)
+    # A revision with a run for only one of the products
+    wptfyi_server.add_run("chrome", "d" * 40, "2024-03-05T08:00:00Z")
+    # With a per-day limit each day is fetched separately, and aligned by the server
+    expected = fetch(tmp_path, "per-day", True, max_per_day=100)
+    assert len(wptfyi_server.requests) == NUM_DAYS
+    assert all("aligned=true" in request.path for request in wptfyi_server.requests)
+    wptfyi_server.requests.clear()
+
+    result = fetch(tmp_path, "range", True)
+    # Aligning each day on the client gives the same runs from range requests
+    assert result == expected
+    assert wptfyi_server.range_requests() == 2
+    assert wptfyi_server.day_requests() == 0
+    assert not any("aligned=true" in request.path for request in wptfyi_server.requests)
+    assert len(result) == 2 * NUM_DAYS
+    revisions = [revision for revision, _ in result]
+    assert "d" * 40 not in revisions
+    assert "f" * 40 not in revisions
+
+
+def test_run_store_in_results_cache(wptfyi_server: FakeWptFyi, tmp_path: Path) -> None:
+    add_runs(wptfyi_server)
+    store_path = run_store_path(str(tmp_path / "results-analysis-cache.git"))
+
+    expected = runs.fetch_runs_wptfyi(
+        PRODUCTS, "experimental", FROM_DATE, TO_DATE, aligned=False, run_store_path=store_path
+    )
+    assert Path(store_path).exists()
+    wptfyi_server.requests.clear()
+
+    cached = runs.fetch_runs_wptfyi(
+        PRODUCTS, "experimental", FROM_DATE, TO_DATE, aligned=False, run_store_path=store_path
+    )
+    assert wptfyi_server.requests == []
+    assert [item.run_ids() for item in cached] == [item.run_ids() for item in expected]
+
+
+def test_run_store_overwrite_unloaded_day(tmp_path: Path) -> None:
+    store_path = str(tmp_path / "runs.sqlite")
+    date = datetime(2024, 3, 1)
+    old_runs = [{"id": 1, "full_revision_hash": "a" * 40}]
+    new_runs = [{"id": 2, "full_revision_hash": "b" * 40}]
+    with runs.RunCache(PRODUCTS, "experimental", path=store_path) as cache:
+        cache[date] = old_runs
+
+    # Write the day without reading it first
+    with runs.RunCache(PRODUCTS, "experimental", path=store_path) as cache:
+        cache[date] = new_runs
+        assert cache[date] == new_runs
+        assert cache.dates_for_revision("b" * 40) == ["2024-03-01"]
+        assert cache.dates_for_revision("a" * 40) == []
+
+    with runs.RunCache(PRODUCTS, "experimental", path=store_path) as cache:
+        assert cache[date] == new_runs
@@ -0,0 +1,130 @@
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from wpt_interop import interop_score, runs
+from wpt_interop.runs import RevisionRuns, RunsByRevision, WptFyiRun
+
+from conftest import FakeWptFyi
+
+PRODUCTS = ["chrome", "firefox"]
+CHANNEL = "experimental"
+
+
+def date_range() -> tuple[datetime, datetime]:
+    # Days inside the freshness cutoff, so cached days are revalidated
+    now = datetime.now()
+    today = datetime(now.year, now.month, now.day)
+    return today - timedelta(days=2), today
+
+
+def dates() -> set[str]:
+    from_date, _ = date_range()
+    return {(from_date + timedelta(days=day)).strftime("%Y-%m-%d") for day in range(2)}
+
+
+def add_runs(server: FakeWptFyi) -> None:
+    for date in sorted(dates()):
+        revision = date.replace("-", "").ljust(40, "0")
+        server.add_run("chrome", revision, f"{date}T01:00:00Z")
+        server.add_run("firefox", revision, f"{date}T02:00:00Z")
+
+
+def update(
+    stored: RunsByRevision, store_path: Path
+) -> tuple[RunsByRevision, interop_score.RunCache]:
+    """Fetch runs the way update_configuration does, given the runs already scored"""
+    from_date, to_date = date_range()
+    run_cache = interop_score.RunCache(stored, str(store_path), PRODUCTS, CHANNEL)
+    fetched = runs.fetch_runs_wptfyi(
+        PRODUCTS, CHANNEL, from_date, to_date, aligned=False, run_cache=run_cache
+    )
+    return fetched, run_cache
+
+
+def revalidated(server: FakeWptFyi, tmp_path: Path) -> RunsByRevision:
+    """Fetch the runs, then revalidate them once so that validators are stored"""
+    store_path = tmp_path / "runs.sqlite"
+    stored, _ = update(RunsByRevision([]), store_path)
+    update(stored, store_path)
+    server.requests.clear()
+    return stored
+
+
+def test_not_modified(wptfyi_server: FakeWptFyi, tmp_path: Path) -> None:
+    add_runs(wptfyi_server)
+    stored = revalidated(wptfyi_server, tmp_path)
+
+    fetched, run_cache = update(stored, tmp_path / "runs.sqlite")
+    assert [request.status for request in wptfyi_server.requests] == [304, 304]
+    assert all(request.if_none_match is not None for request in wptfyi_server.requests)
+    assert run_cache.cache_data.unchanged == dates()
+    assert interop_score.updated_runs(stored, fetched, run_cache.cache_data.unchanged) == {}
+
+
+def test_changed_etag(wptfyi_server: FakeWptFyi, tmp_path: Path) -> None:
+    add_runs(wptfyi_server)
+    stored = revalidated(wptfyi_server, tmp_path)
+    changed_date = min(dates())
+    new_run = wptfyi_server.add_run("chrome", "f" * 40, f"{changed_date}T05:00:00Z")
+
+    fetched, run_cache = update(stored, tmp_path / "runs.sqlite")
+    assert sorted(request.status for request in wptfyi_server.requests) == [200, 304]
+    assert run_cache.cache_data.unchanged == dates() - {changed_date}
+    updated = interop_score.updated_runs(stored, fetched, run_cache.cache_data.unchanged)
+    assert {revision: [run.run_id for run in runs] for revision, runs in updated.items()} == {
+        "f" * 40: [str(new_run["id"])]
+    }
+
+    # Once the new run is scored, the new ETag is used
+    wptfyi_server.requests.clear()
+    update(fetched, tmp_path / "runs.sqlite")
+    assert [request.status for request in wptfyi_server.requests] == [304, 304]
+
+
+def test_no_validators(wptfyi_server: FakeWptFyi, tmp_path: Path) -> None:
+    wptfyi_server.send_etag = False
+    add_runs(wptfyi_server)
+    stored = revalidated(wptfyi_server, tmp_path)
+
+    fetched, run_cache = update(stored, tmp_path / "runs.sqlite")
+    assert [request.status for request in wptfyi_server.requests] == [200, 200]
+    assert all(request.if_none_match is None for request in wptfyi_server.requests)
+    # The responses match the cache, so the days are still unchanged
+    assert run_cache.cache_data.unchanged == dates()
+    assert interop_score.updated_runs(stored, fetched, run_cache.cache_data.unchanged) == {}
+
+
+def test_unscored_runs(wptfyi_server: FakeWptFyi, tmp_path: Path) -> None:
+    add_runs(wptfyi_server)
+    stored = revalidated(wptfyi_server, tmp_path)
+    missing = list(stored)[0]
+    partial = RunsByRevision([item for item in stored if item.revision != missing.revision])
+
+    # The validators for the day with the unscored runs can't be used
+    fetched, run_cache = update(partial, tmp_path / "runs.sqlite")
+    conditional = [request.if_none_match is not None for request in wptfyi_server.requests]
+    assert sorted(conditional) == [False, True]
+    updated = interop_score.updated_runs(partial, fetched, run_cache.cache_data.unchanged)
+    assert list(updated.keys()) == [missing.revision]
+
+
+def test_stored_runs_unchanged(wptfyi_server: FakeWptFyi, tmp_path: Path) -> None:
+    wptfyi_server.send_etag = False
+    add_runs(wptfyi_server)
+    # A second revision on one day, so the response order differs from the cache order
+    wptfyi_server.add_run("chrome", "e" * 40, f"{min(dates())}T08:00:00Z")
+    fetched, _ = update(RunsByRevision([]), tmp_path / "runs.sqlite")
+    # Runs as they're loaded from the interop scores repository
+    stored = RunsByRevision(
+        RevisionRuns(
+            revision_runs.revision,
+            [WptFyiRun.from_json(json.loads(json.dumps(run.to_json()))) for run in revision_runs],
+        )
+        for revision_runs in fetched
+    )
+    wptfyi_server.requests.clear()
+
+    _, run_cache = update(stored, tmp_path / "runs.sqlite")
+    assert [request.status for request in wptfyi_server.requests] == [200, 200]
+    assert run_cache.cache_data.unchanged == dates()
@@ -0,0 +1,54 @@
+import json
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+
+import pytest
+
+from wpt_interop import _wpt_interop
+
+TESTS = ["/a/test1.html", "/a/test2.html", "/b/test3.html"]
+
+
+@pytest.fixture
+def run_results(tmp_path: Path) -> _wpt_interop.RunResults:
+    report_path = tmp_path / "wptreport.json"
+    results = [
+        {
+            "test": test_id,
+            "status": "OK",
+            "subtests": [{"name": f"subtest {idx}", "status": "PASS"}],
+        }
+        for idx, test_id in enumerate(TESTS)
+    ]
+    with open(report_path, "w") as f:
+        json.dump({"results": results}, f)
+    repo_path = str(tmp_path / "results")
+    _wpt_interop.import_wptreports(repo_path, "1", [str(report_path)])
+    [run] = _wpt_interop.run_results(repo_path, ["1"], set(TESTS))
+    return run
+
+
+def test_mapping(run_results: _wpt_interop.RunResults) -> None:
+    assert isinstance(run_results, Mapping)
+    assert len(run_results) == len(TESTS)
+    assert list(run_results) == TESTS
+    assert "/a/test1.html" in run_results
+    assert "/missing.html" not in run_results
+    assert run_results.get("/missing.html") is None
+    assert run_results["/b/test3.html"]["subtests"][0]["name"] == "subtest 2"
+    with pytest.raises(KeyError):
+        run_results["/missing.html"]
+
+
+def test_lazy_iterators(run_results: _wpt_interop.RunResults) -> None:
+    for iterator in [run_results.keys(), run_results.values(), run_results.items()]:
+        assert isinstance(iterator, Iterator)
+
+    assert list(run_results.keys()) == TESTS
+    assert [results["status"] for results in run_results.values()] == ["OK"] * len(TESTS)
+    items = run_results.items()
+    test_id, results = next(items)
+    assert test_id == TESTS[0]
+    assert results["subtests"][0]["name"] == "subtest 0"
+    assert [test_id for test_id, _ in items] == TESTS[1:]
+    assert next(items, None) is None
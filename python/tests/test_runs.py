@@ -0,0 +1,120 @@
+from datetime import datetime
+
+import pytest
+
+from wpt_interop.runs import (
+    GeckoRun,
+    RevisionRuns,
+    Run,
+    RunsByRevision,
+    WptFyiRun,
+    format_datetime,
+)
+
+WPT_FYI_RUN = {
+    "id": 5678,
+    "browser_name": "chrome",
+    "browser_version": "130.0",
+    "os_name": "linux",
+    "os_version": "22.04",
+    "revision": "0123456789",
+    "full_revision_hash": "0123456789" * 4,
+    "results_url": "https://example.test/results.json",
+    "created_at": "2024-03-01T02:03:04.5Z",
+    "time_start": "2024-03-01T01:00:00Z",
+    "time_end": "2024-03-01T02:00:00.123456Z",
+    "raw_results_url": "https://example.test/raw.json",
+    "labels": ["master", "experimental"],
+    "has_screenshots": True,
+}
+
+
+def test_wptfyi_run_to_json() -> None:
+    run = WptFyiRun.from_json(WPT_FYI_RUN)
+    assert run.start_date == "2024-03-01"
+    # Only the fields the run stores are written, with the id as a string and
+    # the times in isoformat
+    expected = {
+        "id": "5678",
+        "browser_name": "chrome",
+        "browser_version": "130.0",
+        "os_name": "linux",
+        "os_version": "22.04",
+        "revision": "0123456789",
+        "full_revision_hash": "0123456789" * 4,
+        "results_url": "https://example.test/results.json",
+        "created_at": "2024-03-01T02:03:04.500000+00:00",
+        "time_start": "2024-03-01T01:00:00+00:00",
+        "time_end": "2024-03-01T02:00:00.123456+00:00",
+        "raw_results_url": "https://example.test/raw.json",
+        "labels": ["master", "experimental"],
+    }
+    assert run.to_json() == expected
+    assert WptFyiRun.from_json(run.to_json()).to_json() == expected
+
+
+def test_gecko_run_to_json() -> None:
+    data = {
+        "id": "abc",
+        "browser_name": "firefox",
+        "browser_version": "20240301000000",
+        "os_name": "linux",
+        "os_version": "22.04",
+        "revision": "0123456789" * 4,
+        "full_revision_hash": "0123456789" * 4,
+        "created_at": "2024-03-01T01:00:00",
+        "time_start": "2024-03-01T01:00:00",
+        "run_info": {"os": "linux", "debug": False},
+    }
+    assert GeckoRun.from_json(data).to_json() == data
+
+
+def test_format_datetime() -> None:
+    for value in [
+        "2024-03-01T01:00:00",
+        "2024-03-01T01:00:00+00:00",
+        "2024-03-01T01:00:00.123456-05:30",
+        "2024-03-01T01:00:00.000000+00:00",
+        "2024-03-01T01:00:00-00:00",
+        "2024-03-01T01:00:00.5Z",
+        "2024-03-01 01:00:00",
+    ]:
+        assert format_datetime(value) == datetime.fromisoformat(value).isoformat()
+
+
+def make_run(run_id: str, revision: str, time_start: str) -> Run:
+    return Run(
+        run_id, "chrome", "1.0", "linux", "22.04", revision[:10], revision, time_start, time_start
+    )
+
+
+def test_runs_by_revision_order() -> None:
+    runs = RunsByRevision(
+        [
+            RevisionRuns("b", [make_run("2", "b", "2024-03-02T10:00:00")]),
+            RevisionRuns("a", [make_run("1", "a", "2024-03-01T10:00:00")]),
+        ]
+    )
+    runs.add_run(make_run("3", "c", "2024-03-02T09:00:00"))
+    assert [item.revision for item in runs] == ["a", "c", "b"]
+    assert runs.dates() == ["2024-03-01", "2024-03-02"]
+    assert [item.revision for item in runs.by_date()["2024-03-02"]] == ["c", "b"]
+    between = runs.between(datetime(2024, 3, 2), datetime(2024, 3, 3))
+    assert [item.revision for item in between] == ["c", "b"]
+
+
+def test_runs_by_revision_merge() -> None:
+    # Runs for one revision on two days are merged into a single entry, which
+    # moves to the date of its earliest run
+    runs = RunsByRevision([RevisionRuns("a", [make_run("1", "a", "2024-03-02T01:00:00")])])
+    runs.add(RevisionRuns("b", [make_run("2", "b", "2024-03-01T12:00:00")]))
+    runs.add(RevisionRuns("a", [make_run("3", "a", "2024-03-01T23:00:00")]))
+    assert len(runs) == 2
+    assert [item.revision for item in runs] == ["b", "a"]
+    assert runs["a"].run_ids() == ["1", "3"]
+    assert runs.dates() == ["2024-03-01"]
+
+
+def test_runs_by_revision_empty() -> None:
+    with pytest.raises(ValueError):
+        RunsByRevision([RevisionRuns("a", [])])
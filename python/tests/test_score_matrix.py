@@ -0,0 +1,53 @@
+import hashlib
+import json
+from pathlib import Path
+
+from wpt_interop import _wpt_interop
+
+RESULTS = [
+    [
+        {"test": "/a/1.html", "status": "PASS", "subtests": []},
+        {
+            "test": "/a/2.html",
+            "status": "OK",
+            "subtests": [
+                {"name": "first", "status": "PASS"},
+                {"name": "second", "status": "FAIL"},
+            ],
+        },
+    ],
+    [
+        {"test": "/a/1.html", "status": "FAIL", "subtests": []},
+        {"test": "/b/3.html", "status": "PASS", "subtests": []},
+    ],
+]
+
+
+def test_score_matrix(tmp_path: Path) -> None:
+    repo_path = str(tmp_path / "results")
+    run_ids = []
+    for idx, results in enumerate(RESULTS):
+        report_path = tmp_path / f"wptreport-{idx}.json"
+        with open(report_path, "w") as f:
+            json.dump({"results": results}, f)
+        _wpt_interop.import_wptreports(repo_path, str(idx), [str(report_path)])
+        run_ids.append(str(idx))
+
+    matrix = _wpt_interop.test_score_matrix(
+        repo_path,
+        run_ids,
+        {"a": {"/a/1.html", "/a/2.html"}, "b": {"/b/3.html", "/a/2.html"}},
+    )
+    assert matrix.run_ids == run_ids
+    assert matrix.categories == ["a", "b"]
+    assert matrix.tests == ["/a/1.html", "/a/2.html", "/b/3.html"]
+
+    passes = memoryview(matrix.passes)
+    assert passes.format == "Q"
+    assert passes.shape == (2, 3)
+    assert passes.tolist() == [[1, 1, 0], [0, 0, 1]]
+    assert memoryview(matrix.totals).tolist() == [[1, 2, 0], [1, 0, 1]]
+    assert memoryview(matrix.category_mask).tolist() == [[True, True, False], [False, True, True]]
+
+    # A simple (not N-dimensional) buffer request gets the raw bytes
+    assert hashlib.sha256(matrix.passes).digest() == hashlib.sha256(passes.tobytes()).digest()
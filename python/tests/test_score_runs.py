@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from wpt_interop import _wpt_interop
+
+NUM_TESTS = 20_000
+NUM_RUNS = 4
+
+
+def write_wptreport(path: Path, seed: int) -> None:
+    results = []
+    for idx in range(NUM_TESTS):
+        subtests = [
+            {"name": f"subtest {i}", "status": "PASS" if (idx + i + seed) % 4 else "FAIL"}
+            for i in range((idx + seed) % 5)
+        ]
+        results.append(
+            {
+                "test": f"/dir{idx % 200}/test{idx}.html",
+                "status": "OK" if subtests else "PASS",
+                "subtests": subtests,
+            }
+        )
+    with open(path, "w") as f:
+        json.dump({"results": results}, f)
+
+
+@pytest.fixture(scope="module")
+def results_repo(tmp_path_factory: pytest.TempPathFactory) -> tuple[str, list[str], set[str]]:
+    base = tmp_path_factory.mktemp("score_runs")
+    repo_path = str(base / "results")
+    run_ids = []
+    for seed in range(NUM_RUNS):
+        report_path = base / f"wptreport-{seed}.json"
+        write_wptreport(report_path, seed)
+        run_id = str(seed)
+        _wpt_interop.import_wptreports(repo_path, run_id, [str(report_path)])
+        run_ids.append(run_id)
+    tests = {f"/dir{idx % 200}/test{idx}.html" for idx in range(NUM_TESTS)}
+    return repo_path, run_ids, tests
+
+
+@pytest.fixture
+def no_results_cache() -> Iterator[None]:
+    # Make sure each call actually reads the results
+    _wpt_interop.set_results_cache_capacity(0)
+    yield
+    _wpt_interop.set_results_cache_capacity(100_000)
+
+
+def score(results_repo: tuple[str, list[str], set[str]]) -> None:
+    repo_path, run_ids, tests = results_repo
+    _wpt_interop.score_runs(repo_path, run_ids, {"category": tests}, set(), threads=1)
+
+
+def time_concurrent(results_repo: tuple[str, list[str], set[str]], num_threads: int) -> float:
+    barrier = threading.Barrier(num_threads + 1)
+
+    def run() -> None:
+        barrier.wait()
+        score(results_repo)
+
+    threads = [threading.Thread(target=run) for _ in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="Needs at least two CPUs")
+@pytest.mark.usefixtures("no_results_cache")
+def test_concurrent_score_runs_overlap(results_repo: tuple[str, list[str], set[str]]) -> None:
+    # With the GIL held, two calls on separate threads take about twice as
+    # long as one; when it's released they run in parallel
+    single = min(time_concurrent(results_repo, 1) for _ in range(3))
+    concurrent = min(time_concurrent(results_repo, 2) for _ in range(3))
+    assert concurrent < 1.6 * single, (single, concurrent)